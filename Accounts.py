@@ -0,0 +1,354 @@
+'''
+Multi-account tracking
+
+Tracks several accounts at once, for instance every account of a household. Each account is a folder laid
+out like a single account run, with its own statements and, optionally, its own rules:
+
+    Accounts/
+    ├── Rules/                       (rules shared by the accounts that don't have their own)
+    ├── Output/                      (consolidated report, created automatically)
+    ├── Alice/
+    │   ├── Bank_Monthly_Movements/
+    │   ├── Rules/                   (optional)
+    │   └── Output/                  (output of the account, created automatically)
+    └── Bob/
+        └── ...
+
+Accounts are parsed, categorized and aggregated in parallel, one process per account. They are then merged
+into a consolidated report where transfers between tracked accounts are netted out: the money leaving one
+account and arriving at another isn't spent nor earned by the household.
+'''
+
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Statement_Reader import read_statement_folder, Default_max_cache_bytes
+from Deduplication import drop_duplicate_movements
+from Reconciliation import reconcile_balances
+from Money import amounts_to_cents, to_cents, is_exact
+from Exports import export_output
+from Categorizer import load_rules, categorize_movements, monthly_totals, tally_monthly_totals, build_output_dic, month_bounds
+
+
+
+############################################### Variables ###############################################
+
+# Movements that may be transfers between accounts, matched against both the description and the subcategory.
+# Bizum payments are described as transfers too ("Transferencia Bizum emitida") but go to other people
+Transfer_pattern = r'\b(?:Transferencia|Traspaso)\b(?!\s+Bizum)'
+
+# Days a transfer may take to arrive at the other account
+Transfer_days = 3
+
+
+########################################## Function definitions ##########################################
+
+def find_accounts (Accounts_path):
+
+    """
+    This function lists the accounts of a folder: every subfolder holding a "Bank_Monthly_Movements" folder.
+
+    Parameters
+    ----------
+    Accounts_path : str
+
+    Returns
+    -------
+    list str
+        Paths to the account folders, sorted by name
+    """
+
+    Accounts = []
+    for entry in os.scandir(Accounts_path):
+        if (entry.is_dir() and os.path.isdir(os.path.join(entry.path, 'Bank_Monthly_Movements'))):
+            Accounts.append(entry.path)
+
+    if not Accounts:
+        raise FileNotFoundError(f'No accounts found in {Accounts_path}, each one needs a "Bank_Monthly_Movements" folder')
+
+    return sorted(Accounts)
+
+
+
+def rules_folder (Account_path):
+
+    """
+    This function finds the rules of an account: its own "Rules" folder, or the one shared by every account.
+
+    Parameters
+    ----------
+    Account_path : str
+
+    Returns
+    -------
+    str
+    """
+
+    Own_rules = os.path.join(Account_path, 'Rules')
+    if os.path.isfile(os.path.join(Own_rules, 'Movement_Rules.csv')):
+        return Own_rules
+
+    return os.path.join(os.path.dirname(Account_path), 'Rules')
+
+
+
+def track_account (Account_path, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Exact=False, Compact=False,
+                   Reconcile=False):
+
+    """
+    This function runs the whole pipeline on one account and writes its "Output/Tracked_expenses.xlsx".
+    It is the job of each worker process.
+
+    Parameters
+    ----------
+    Account_path : str
+        Folder of the account
+    Use_cache, Max_cache_bytes :
+        See Statement_Reader.read_statement_folder()
+    Exact : Bool
+        Work with integer cents
+    Compact : Bool
+        Store text columns as categoricals
+    Reconcile : Bool
+        Check the running balance of the account
+
+    Returns
+    -------
+    dict
+        {'Name': folder name of the account, 'Movements': categorized movements, newest first,
+         'Monthly': monthly totals of the account, 'Breaks': breaks of its balance chain, see Reconciliation.py,
+         empty unless reconciled}
+    """
+
+    # Accounts are already spread over the cores, statements are parsed one after the other
+    Movements_df = read_statement_folder(os.path.join(Account_path, 'Bank_Monthly_Movements'), Use_cache=Use_cache,
+                                         Max_cache_bytes=Max_cache_bytes, Workers=1, Compact=Compact)
+    Movements_df, _ = drop_duplicate_movements(Movements_df)
+
+    if (Exact):
+        Movements_df = amounts_to_cents(Movements_df)
+
+    Breaks_df = reconcile_balances(Movements_df) if Reconcile else pd.DataFrame()
+
+    Rules_path = rules_folder(Account_path)
+    Rule_table = load_rules(os.path.join(Rules_path, 'Movement_Rules.csv'), os.path.join(Rules_path, 'Recurring_Rules.csv'))
+
+    Movements_df = categorize_movements(Movements_df, Rule_table)
+    Monthly_df = monthly_totals(Movements_df)
+
+    Output_path = os.path.join(Account_path, 'Output')
+    os.makedirs(Output_path, exist_ok=True)
+    export_output(pd.DataFrame.from_dict(build_output_dic(Monthly_df)), Output_path, 'xlsx')
+
+    return {'Name': os.path.basename(Account_path), 'Movements': Movements_df, 'Monthly': Monthly_df, 'Breaks': Breaks_df}
+
+
+
+def track_accounts (Accounts_path, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Exact=False, Compact=False,
+                    Reconcile=False, Workers=None):
+
+    """
+    This function tracks every account of a folder, in a pool of processes.
+
+    Parameters
+    ----------
+    Accounts_path : str
+        Folder holding the accounts
+    Use_cache, Max_cache_bytes, Exact, Compact, Reconcile :
+        See track_account()
+    Workers : int
+        Number of processes, defaults to one per core
+
+    Returns
+    -------
+    list dict
+        Result of track_account() for each account, sorted by name
+    """
+
+    Accounts = find_accounts(Accounts_path)
+    Tracker = partial(track_account, Use_cache=Use_cache, Max_cache_bytes=Max_cache_bytes, Exact=Exact, Compact=Compact,
+                      Reconcile=Reconcile)
+
+    # Spawning processes isn't worth it for a single account
+    if (len(Accounts) == 1 or Workers == 1):
+        return [Tracker(path) for path in Accounts]
+
+    Workers = min(Workers or os.cpu_count() or 1, len(Accounts))
+    with ProcessPoolExecutor(max_workers=Workers) as executor:
+        return list(executor.map(Tracker, Accounts))
+
+
+
+def movement_cents (Movements_df):
+
+    """
+    This function returns the amounts of a dataframe of movements in integer cents.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+
+    Returns
+    -------
+    ndarray int64
+    """
+
+    Amounts = Movements_df['IMPORTE (€)'].to_numpy()
+
+    return Amounts.astype(np.int64) if is_exact(Movements_df) else to_cents(Amounts)
+
+
+
+def match_internal_transfers (Account_results, Max_days=Transfer_days):
+
+    """
+    This function pairs the transfers between tracked accounts: a transfer leaving one account and one
+    arriving at another with the same amount, at most Max_days apart. Every movement is paired at most
+    once, closest dates first.
+
+    Parameters
+    ----------
+    Account_results : list dict
+        Results of track_accounts()
+    Max_days : int
+        Days a transfer may take to arrive
+
+    Returns
+    -------
+    dataframe
+        One row per transfer: 'Amount' in €, then 'Account', 'Row' (position in the account's movements)
+        and 'Date' of the outgoing ('... out') and incoming ('... in') movement
+    """
+
+    Candidates = []
+    for result in Account_results:
+        Movements_df = result['Movements']
+        Mask = (Movements_df['DESCRIPCIÓN'].astype(str).str.contains(Transfer_pattern, case=False)
+                | Movements_df['SUBCATEGORÍA'].astype(str).str.contains(Transfer_pattern, case=False)).to_numpy()
+
+        Candidates.append(pd.DataFrame({'Account': result['Name'],
+                                        'Row': np.flatnonzero(Mask),
+                                        'Date': pd.to_datetime(Movements_df['F. VALOR']).to_numpy()[Mask],
+                                        'Cents': movement_cents(Movements_df)[Mask]}))
+
+    Candidates_df = pd.concat(Candidates, ignore_index=True)
+
+    Outgoing_df = Candidates_df[Candidates_df['Cents'] < 0].assign(Cents=lambda df: -df['Cents'])
+    Incoming_df = Candidates_df[Candidates_df['Cents'] > 0]
+
+    Pairs_df = Outgoing_df.merge(Incoming_df, on='Cents', suffixes=(' out', ' in'))
+    Gap = (Pairs_df['Date in'] - Pairs_df['Date out']).abs()
+    Pairs_df = Pairs_df[(Pairs_df['Account out'] != Pairs_df['Account in']) & (Gap <= pd.Timedelta(days=Max_days))]
+
+    # Keep the closest match of every movement
+    Pairs_df = (Pairs_df
+                .assign(Gap=Gap)
+                .sort_values(['Gap', 'Date out'], kind='stable')
+                .drop_duplicates(['Account out', 'Row out'])
+                .drop_duplicates(['Account in', 'Row in'])
+                .sort_values('Date out', ignore_index=True))
+
+    Pairs_df.insert(0, 'Amount', Pairs_df.pop('Cents') / 100)
+
+    return Pairs_df[['Amount', 'Account out', 'Row out', 'Date out', 'Account in', 'Row in', 'Date in']]
+
+
+
+def consolidate_accounts (Account_results, Transfers_df):
+
+    """
+    This function merges the accounts into a single history without the transfers between them, and
+    computes its monthly totals. Transfers are dropped from the category sums, and the balance of each month
+    is corrected for the transfers whose two sides fall in different months.
+
+    The balance of a month in an account is its newest balance minus its oldest one, which leaves out the
+    amount of its oldest movement. A transfer that is the oldest movement of its month in its account is
+    therefore not part of the balance, and isn't netted out of it either.
+
+    Parameters
+    ----------
+    Account_results : list dict
+        Results of track_accounts()
+    Transfers_df : dataframe
+        Transfers returned by match_internal_transfers()
+
+    Returns
+    -------
+    dataframe
+        Movements of every account without the internal transfers, newest first, with an 'Account' column
+    dataframe
+        Consolidated monthly totals, in the layout of Categorizer.monthly_totals()
+    """
+
+    Kept = []
+    Transfer_flows = []
+    Balances = []
+    Last_days = []
+
+    for result in Account_results:
+        Movements_df = result['Movements']
+
+        Rows = np.concatenate([Transfers_df.loc[Transfers_df['Account out'] == result['Name'], 'Row out'].to_numpy(),
+                               Transfers_df.loc[Transfers_df['Account in'] == result['Name'], 'Row in'].to_numpy()])
+        Transfer_mask = np.zeros(len(Movements_df), dtype=bool)
+        Transfer_mask[Rows.astype(np.int64)] = True
+
+        Kept.append(Movements_df[~Transfer_mask].assign(Account=result['Name']))
+
+        # Only the transfers within the balance of their month are netted out of it
+        _, _, Stops = month_bounds(Movements_df)
+        Balance_mask = Transfer_mask.copy()
+        Balance_mask[Stops - 1] = False
+
+        Transfer_flows.append(pd.Series(movement_cents(Movements_df)[Balance_mask],
+                                        index=Movements_df['Month'].array[Balance_mask]))
+
+        Balances.append(pd.Series(to_cents(result['Monthly'][("Balance", "/")].to_numpy()), index=result['Monthly'].index))
+        Last_days.append(result['Monthly'][("Month", "/")])
+
+    Movements_df = pd.concat(Kept, ignore_index=True)
+    Movements_df = Movements_df.sort_values('F. VALOR', ascending=False, kind='stable', ignore_index=True)
+
+    # Money in flight between accounts at the end of a month isn't a household expense
+    Months = pd.PeriodIndex(sorted(set().union(*(balance.index for balance in Balances))), freq='M', name='Month')
+    Balance = sum(balance.reindex(Months, fill_value=0) for balance in Balances)
+    Transfer_flow = pd.concat(Transfer_flows).groupby(level=0).sum().reindex(Months, fill_value=0)
+    Balance = Balance - Transfer_flow
+
+    Last_day_month = pd.concat(Last_days).groupby(level=0).max().reindex(Months)
+
+    Sums_df = (Movements_df
+               .assign(Cents=movement_cents(Movements_df))
+               .groupby(['Month', 'Category', 'Subcategory'], observed=True)['Cents']
+               .sum()
+               .unstack(['Category', 'Subcategory'], fill_value=0))
+
+    return Movements_df, tally_monthly_totals(Sums_df, Balance, Last_day_month, Exact=True)
+
+
+
+def print_transfer_report (Account_results, Transfers_df):
+
+    """
+    This function prints into the cmd the movements of each account, the breaks of their balance chains and
+    the transfers netted out.
+
+    Parameters
+    ----------
+    Account_results : list dict
+        Results of track_accounts()
+    Transfers_df : dataframe
+        Transfers returned by match_internal_transfers()
+    """
+
+    print(f'\n\n*************************************\n        TRACKED ACCOUNTS\n*************************************\n')
+    for result in Account_results:
+        Breaks = f', {len(result["Breaks"])} break(s) in the balance chain' if len(result['Breaks']) else ''
+        print(f'    * {result["Name"]}:  {len(result["Movements"])} movements, {len(result["Monthly"])} months{Breaks}')
+
+    if not Transfers_df.empty:
+        print(f'\n    Internal transfers netted out: {len(Transfers_df)} ({Transfers_df["Amount"].sum():.2f} €)')
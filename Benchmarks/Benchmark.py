@@ -0,0 +1,198 @@
+'''
+Benchmark suite of the tracker
+
+Times each stage of the pipeline separately on synthetic statements of increasing size, so that a regression
+in any of them can be measured on the same datasets:
+
+    - Ingestion: parsing every statement of the folder, without and with the parsed statement cache
+    - Month splitting: month period key and row range of each month
+    - Categorization: tagging every movement with its (Category, Subcategory)
+    - Aggregation: monthly totals and 'Output_dic'
+    - Output writing: "Tracked_expenses.xlsx"
+    - Chart rendering: monthly donut charts and the expenses vs time chart, written as .png in parallel
+
+Usage:
+    python Benchmarks/Benchmark.py --sizes 1000 10000 100000 --repeat 3 --json Output/Benchmark.json
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+# Charts are rendered off screen
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+# Modules of the tracker live in the parent folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Generate_Statements import generate_movements, write_statement_folder
+from Statement_Reader import read_statement_folder
+from Deduplication import drop_duplicate_movements
+from Categorizer import load_rules, categorize_movements, month_bounds, monthly_totals, build_output_dic
+from Plots import render_charts
+from Exports import export_output
+
+
+
+############################################### Variables ###############################################
+
+Repository_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+Rules_path = os.path.join(Repository_path, 'Rules', 'Movement_Rules.csv')
+Recurring_rules_path = os.path.join(Repository_path, 'Rules', 'Recurring_Rules.csv')
+
+
+########################################## Function definitions ##########################################
+
+def time_stage (Function, Repeat):
+
+    """
+    This function runs a stage several times and keeps the fastest run, the one least disturbed by the
+    rest of the system.
+
+    Parameters
+    ----------
+    Function : callable
+        Stage to time, called without arguments
+    Repeat : int
+        Number of runs
+
+    Returns
+    -------
+    float
+        Fastest wall time in seconds
+    object
+        Result of the last run
+    """
+
+    Best = float('inf')
+    for _ in range(Repeat):
+        Start = time.perf_counter()
+        Result = Function()
+        Best = min(Best, time.perf_counter() - Start)
+
+    return Best, Result
+
+
+
+def benchmark_size (Rows, Repeat, Work_folder, Rows_per_file, Skip_charts):
+
+    """
+    This function generates a synthetic dataset and times every stage of the pipeline on it.
+
+    Parameters
+    ----------
+    Rows : int
+        Number of movements of the dataset
+    Repeat : int
+        Number of runs of each stage
+    Work_folder : str
+        Folder where the statements and outputs are written
+    Rows_per_file : int
+        Maximum number of movements per statement
+    Skip_charts : Bool
+        Don't time chart rendering
+
+    Returns
+    -------
+    dict
+        {'rows', 'months', 'statements', stage: seconds}
+    """
+
+    Statements_folder = os.path.join(Work_folder, f'Statements_{Rows}')
+    Paths = write_statement_folder(generate_movements(Rows), Statements_folder, Rows_per_file=Rows_per_file)
+    Rule_table = load_rules(Rules_path, Recurring_rules_path)
+
+    Results = {'rows': Rows, 'statements': len(Paths)}
+
+    def ingest_cold ():
+        shutil.rmtree(os.path.join(Statements_folder, '.cache'), ignore_errors=True)
+        return drop_duplicate_movements(read_statement_folder(Statements_folder, Use_cache=False))[0]
+
+    Results['ingestion'], Movements_df = time_stage(ingest_cold, Repeat)
+
+    # Warm up the cache once, then time reading from it
+    read_statement_folder(Statements_folder, Use_cache=True)
+    Results['ingestion_cached'], _ = time_stage(lambda: read_statement_folder(Statements_folder, Use_cache=True), Repeat)
+
+    Results['categorization'], Categorized_df = time_stage(lambda: categorize_movements(Movements_df, Rule_table), Repeat)
+
+    def split_months ():
+        Months_df = pd.DataFrame({'Month': pd.to_datetime(Movements_df['F. VALOR']).dt.to_period('M')})
+        return month_bounds(Months_df)
+
+    Results['month_splitting'], (Months, _, _) = time_stage(split_months, Repeat)
+    Results['months'] = len(Months)
+
+    def aggregate ():
+        Monthly_df = monthly_totals(Categorized_df)
+        return build_output_dic(Monthly_df)
+
+    Results['aggregation'], Output_dic = time_stage(aggregate, Repeat)
+    Output_df = pd.DataFrame.from_dict(Output_dic)
+
+    Results['output_writing'], _ = time_stage(lambda: export_output(Output_df, Work_folder, 'xlsx', Name=f'Tracked_expenses_{Rows}'), Repeat)
+
+    if not Skip_charts:
+        Charts_folder = os.path.join(Work_folder, f'Charts_{Rows}')
+        Results['chart_rendering'], _ = time_stage(lambda: render_charts(Output_dic, Charts_folder), Repeat)
+
+    return Results
+
+
+
+def print_results (Results):
+
+    """
+    This function prints the timings of every dataset as a table into the cmd.
+
+    Parameters
+    ----------
+    Results : list dict
+        Timings returned by benchmark_size()
+    """
+
+    Stages = ['ingestion', 'ingestion_cached', 'month_splitting', 'categorization', 'aggregation',
+              'output_writing', 'chart_rendering']
+
+    print(f'\n{"rows":>10} {"months":>7}' + ''.join(f' {stage:>17}' for stage in Stages))
+    for result in Results:
+        print(f'{result["rows"]:>10} {result["months"]:>7}'
+              + ''.join(f' {result[stage]:>16.4f}s' if stage in result else f' {"-":>17}' for stage in Stages))
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Time each stage of the tracker on synthetic statements')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='number of movements of each dataset')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each stage, the fastest one is kept')
+    parser.add_argument('--rows-per-file', type=int, default=100000, help='maximum number of movements per statement')
+    parser.add_argument('--skip-charts', action='store_true', help="don't time chart rendering")
+    parser.add_argument('--json', help='also write the results into this .json file')
+    parser.add_argument('--keep', help='folder to keep the datasets in, a temporary one is used otherwise')
+    args = parser.parse_args()
+
+    Work_folder = args.keep or tempfile.mkdtemp(prefix='finance_tracking_benchmark_')
+    os.makedirs(Work_folder, exist_ok=True)
+
+    try:
+        Results = []
+        for Rows in args.sizes:
+            Results.append(benchmark_size(Rows, args.repeat, Work_folder, args.rows_per_file, args.skip_charts))
+            print_results(Results[-1:])
+
+        print_results(Results)
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as file:
+                json.dump(Results, file, indent=4)
+
+    finally:
+        if not args.keep:
+            shutil.rmtree(Work_folder, ignore_errors=True)
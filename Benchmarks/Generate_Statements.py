@@ -0,0 +1,211 @@
+'''
+Generator of synthetic ING statements
+
+Writes realistic 'Movimientos' sheets: same preamble, columns and concept strings as the ING exports the
+tracker reads, with monthly payments (salary, gym, subscriptions, psychologist...) and a random mix of daily
+expenses. Sizes go from a thousand to millions of movements, split into several statements like a real
+archive of exports (a sheet can't hold more than 1048576 rows).
+
+Usage:
+    python Benchmarks/Generate_Statements.py --rows 100000 --output Synthetic/Bank_Monthly_Movements
+'''
+
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+
+############################################### Variables ###############################################
+
+Columns = ['F. VALOR', 'CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'COMENTARIO', 'IMAGEN', 'IMPORTE (€)', 'SALDO (€)']
+
+# Movements paid every month: (CATEGORÍA, SUBCATEGORÍA, DESCRIPCIÓN, amount €, day of the month)
+Monthly_movements = [
+    ('Nómina y otras prestaciones', 'Nómina o Pensión', 'Nomina recibida FUNDACION IMDEA NANOCIENCIA', 2150.00, 28),
+    ('Deporte y ocio', 'Gimnasio', 'Recibo ALTAFIT GRUPO DE GESTION S.L', -34.90, 2),
+    ('Compras', 'Suscripciones', 'Pago en CHATGPT SUBSCRIPTION', -20.00, 5),
+    ('Otros gastos', 'Gasto Bizum', 'Transferencia Bizum emitida', -15.00, 10),
+    ('Efectivo', 'Cajeros', 'Cajeros', -140.00, 15),
+    ('Transporte', 'Transporte público', 'Pago en METRO DE MADRID', -20.00, 1),
+]
+
+# Everyday movements: (CATEGORÍA, SUBCATEGORÍA, DESCRIPCIÓN, mean amount €, relative frequency)
+Daily_movements = [
+    ('Restauración', 'Cafeterías y restaurantes', 'Pago en CAFET. IMDEA NANOCIENCIA MADRID ES', -6.5, 12),
+    ('Restauración', 'Cafeterías y restaurantes', 'Pago en LA ESTACION DE MAJADAHONDMAJADAHONDA ES', -11.0, 4),
+    ('Restauración', 'Cafeterías y restaurantes', 'Pago en DELIKIA VINCIOS ES', -9.0, 2),
+    ('Restauración', 'Cafeterías y restaurantes', 'Pago en UBER *EATS', -22.0, 3),
+    ('Restauración', 'Cafeterías y restaurantes', 'Pago en BAR EL TIO PEPE', -14.0, 6),
+    ('Alimentación', 'Supermercados y alimentación', 'Pago en MERCADONA', -38.0, 10),
+    ('Alimentación', 'Supermercados y alimentación', 'Pago en LIDL', -27.0, 5),
+    ('Vehículo y transporte', 'Taxi y Carsharing', 'Pago en UBER *TRIP', -12.0, 4),
+    ('Vehículo y transporte', 'Gasolina y combustible', 'Pago en REPSOL', -45.0, 2),
+    ('Compras', 'Ropa y complementos', 'Pago en ZARA', -35.0, 2),
+    ('Compras', 'Regalos y juguetes', 'Pago en JUGUETTOS', -25.0, 1),
+    ('Ocio y viajes', 'Cine, teatro y espectáculos', 'Pago en CINESA', -9.5, 1),
+    ('Salud y bienestar', 'Farmacia, herbolario y nutrición', 'Pago en FARMACIA GARCIA', -12.0, 2),
+    ('Salud y bienestar', 'Dentista, médico', 'Pago en CLINICA DENTAL SONRISAS', -60.0, 1),
+    ('Otros gastos', 'Gasto Bizum', 'Transferencia Bizum emitida', -18.0, 3),
+    ('Otros ingresos', 'Ingreso Bizum', 'Ingreso Bizum', 15.0, 3),
+    ('Efectivo', 'Cajeros', 'Cajeros', -50.0, 1),
+    ('Otros gastos', 'Otros', 'Pago en AMAZON EU SARL', -30.0, 3),
+]
+
+# Maximum number of rows in an Excel sheet, minus the preamble and header
+Max_rows_per_sheet = 1048576 - 6
+
+
+########################################## Function definitions ##########################################
+
+def generate_movements (Rows, Start_date='2020-01-01', Movements_per_day=3, Seed=0):
+
+    """
+    This function generates a synthetic history of movements, fully vectorized so that millions of rows
+    only take a few seconds.
+
+    Parameters
+    ----------
+    Rows : int
+        Approximate number of movements
+    Start_date : str
+        Value date of the first movement
+    Movements_per_day : float
+        Average number of everyday movements per day, sets how many months the history spans
+    Seed : int
+        Seed of the random generator, the same arguments always generate the same history
+
+    Returns
+    -------
+    dataframe
+        Movements in the ING layout, newest first
+    """
+
+    rng = np.random.default_rng(Seed)
+
+    Days = max(int(Rows / (Movements_per_day + len(Monthly_movements) / 30)), 1)
+    Start = pd.Timestamp(Start_date)
+    Months = pd.period_range(Start, Start + pd.Timedelta(days=Days - 1), freq='M')
+
+    # Fixed monthly movements
+    Monthly_df = pd.DataFrame(
+        [(month.to_timestamp() + pd.Timedelta(days=day - 1), category, subcategory, description, amount)
+         for month in Months
+         for category, subcategory, description, amount, day in Monthly_movements],
+        columns=['F. VALOR', 'CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'IMPORTE (€)'])
+
+    # Random everyday movements, amounts follow a gamma distribution around their mean
+    Daily_rows = max(Rows - len(Monthly_df), 0)
+    Catalog = pd.DataFrame(Daily_movements, columns=['CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'Mean', 'Frequency'])
+    Picks = rng.choice(len(Catalog), size=Daily_rows, p=Catalog['Frequency'] / Catalog['Frequency'].sum())
+
+    Daily_df = Catalog.iloc[Picks, :3].reset_index(drop=True)
+    Daily_df['F. VALOR'] = Start + pd.to_timedelta(rng.integers(0, Days, Daily_rows), unit='D')
+    Daily_df['IMPORTE (€)'] = Catalog['Mean'].to_numpy()[Picks] * rng.gamma(4.0, 0.25, Daily_rows)
+
+    # Amounts are stated in cents
+    Daily_df['IMPORTE (€)'] = np.round(Daily_df['IMPORTE (€)'], 2)
+
+    Movements_df = pd.concat([Monthly_df, Daily_df], ignore_index=True)
+    Movements_df = Movements_df[Movements_df['F. VALOR'] < Start + pd.Timedelta(days=Days)]
+    Movements_df = Movements_df.sort_values('F. VALOR', kind='stable', ignore_index=True)
+
+    # Running balance, computed in cents so that it is exact
+    Cents = np.rint(Movements_df['IMPORTE (€)'].to_numpy() * 100).astype(np.int64)
+    Movements_df['SALDO (€)'] = (300000 + np.cumsum(Cents)) / 100
+
+    Movements_df['COMENTARIO'] = ''
+    Movements_df['IMAGEN'] = ''
+
+    # ING exports list the newest movement first
+    return Movements_df[Columns].iloc[::-1].reset_index(drop=True)
+
+
+
+def write_statement (Movements_df, Statement_path):
+
+    """
+    This function writes movements as an ING statement: a 'Movimientos' sheet with the 5 row preamble
+    followed by the header and the movements. The workbook is streamed to disk row by row.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Movements in the ING layout, newest first
+    Statement_path : str
+        Path to the .xlsx to write
+    """
+
+    from openpyxl import Workbook
+
+    if len(Movements_df) > Max_rows_per_sheet:
+        raise ValueError(f'A statement can hold at most {Max_rows_per_sheet} movements')
+
+    Workbook_out = Workbook(write_only=True)
+    Sheet = Workbook_out.create_sheet('Movimientos')
+
+    # Preamble of the ING exports
+    Sheet.append(['Movimientos de la Cuenta'])
+    Sheet.append(['Número de cuenta:', 'ES00 0000 0000 0000 0000 0000'])
+    Sheet.append(['Titular:', 'SYNTHETIC'])
+    Sheet.append(['Fecha exportación:', pd.Timestamp.today().strftime('%d/%m/%Y')])
+    Sheet.append([])
+    Sheet.append(Columns)
+
+    Dates = Movements_df['F. VALOR'].dt.to_pydatetime()
+    Values = Movements_df[Columns[1:]].itertuples(index=False, name=None)
+    for date, values in zip(Dates, Values):
+        Sheet.append((date,) + values)
+
+    Workbook_out.save(Statement_path)
+
+
+
+def write_statement_folder (Movements_df, Folder_path, Rows_per_file=100000):
+
+    """
+    This function splits a history into consecutive statements and writes them into a folder, the way an
+    archive of monthly exports looks like.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Movements in the ING layout, newest first
+    Folder_path : str
+    Rows_per_file : int
+        Maximum number of movements per statement
+
+    Returns
+    -------
+    list str
+        Paths to the statements written
+    """
+
+    os.makedirs(Folder_path, exist_ok=True)
+    Rows_per_file = min(Rows_per_file, Max_rows_per_sheet)
+
+    Paths = []
+    for number, start in enumerate(range(0, len(Movements_df), Rows_per_file)):
+        Path = os.path.join(Folder_path, f'Movements_{number:04d}.xlsx')
+        write_statement(Movements_df.iloc[start:start + Rows_per_file], Path)
+        Paths.append(Path)
+
+    return Paths
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Write synthetic ING statements')
+    parser.add_argument('--rows', type=int, default=10000, help='number of movements')
+    parser.add_argument('--output', default=os.path.join('Synthetic', 'Bank_Monthly_Movements'), help='folder to write the statements into')
+    parser.add_argument('--rows-per-file', type=int, default=100000, help='maximum number of movements per statement')
+    parser.add_argument('--start', default='2020-01-01', help='value date of the first movement')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    Movements_df = generate_movements(args.rows, Start_date=args.start, Seed=args.seed)
+    Paths = write_statement_folder(Movements_df, args.output, Rows_per_file=args.rows_per_file)
+    print(f'Wrote {len(Movements_df)} movements into {len(Paths)} statements in {args.output}')
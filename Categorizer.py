@@ -0,0 +1,439 @@
+'''
+Categorization engine for the bank movements read by Finance_Tracker.py
+
+Instead of slicing the statement month by month and scanning it once per concept, every movement
+is tagged with its (Category, Subcategory) pair in a single vectorized pass. Monthly totals are then
+obtained with one groupby over a month period key, and the rows of 'Output_dic' are built from there.
+
+Movements are expected newest first, which is the order ING exports them in.
+'''
+
+import pandas as pd
+import numpy as np
+
+from Money import from_cents, is_exact
+from Recurring_Payments import load_recurring_rules, compile_recurring_rules, match_recurring_payments
+from Pattern_Matching import Match_kinds, compile_pattern_rules, match_pattern_rules
+
+
+
+############################################### Variables ###############################################
+
+# Columns of the tracked output, in the order they are written and plotted.
+# Plots rely on this order: the first column holds dates and the last four hold incomes and computed values
+Output_columns = [
+    ("Month", "/"),
+    ("Savings", "/"),
+    ("Eating Out Work", "/"),
+    ("Uber To Work", "/"),
+    ("Recreational", "Uber Eats"),
+    ("Recreational", "Bars And Restaurants"),
+    ("Recreational", "Bizum"),
+    ("Recreational", "Bazar"),
+    ("Recreational", "Clothing"),
+    ("Recreational", "Concerts And Movies"),
+    ("Subscriptions", "Psychologist"),
+    ("Subscriptions", "Dystopia"),
+    ("Subscriptions", "ChatGPT"),
+    ("Subscriptions", "Gym"),
+    ("Subscriptions", "Public Transport"),
+    ("Health", "/"),
+    ("Unaccounted", "Withdrawals"),
+    ("Unaccounted", "Unknown"),
+    ("Income", "Salary"),
+    ("Income", "Bizums"),
+    ("Total Sum Acc", "/"),
+    ("Balance", "/")
+]
+
+# Columns that are summed into "Total Sum Acc"
+Expense_columns = [
+    ("Eating Out Work", "/"),
+    ("Uber To Work", "/"),
+    ("Recreational", "Uber Eats"),
+    ("Recreational", "Bars And Restaurants"),
+    ("Recreational", "Bizum"),
+    ("Recreational", "Bazar"),
+    ("Recreational", "Clothing"),
+    ("Recreational", "Concerts And Movies"),
+    ("Subscriptions", "Psychologist"),
+    ("Subscriptions", "Dystopia"),
+    ("Subscriptions", "ChatGPT"),
+    ("Subscriptions", "Gym"),
+    ("Subscriptions", "Public Transport"),
+    ("Health", "/"),
+    ("Unaccounted", "Withdrawals")
+]
+
+# Columns of the statement a concept rule can be matched against. 'ANY' matches both
+Rule_columns = ['DESCRIPCIÓN', 'SUBCATEGORÍA']
+
+# Concept rules live in Rules/Movement_Rules.csv, a movement matched by its description takes precedence over
+# one matched by its subcategory. This way specific merchants ("Pago en UBER *EATS") are taken out of broader
+# subcategories ("Cafeterías y restaurantes")
+
+# Within a column, exact concepts take precedence over patterns (prefixes, substrings...), see Pattern_Matching.py
+
+# Payments that can only be told apart by their amount (the psychologist, Dystopia) are described in
+# Rules/Recurring_Rules.csv, they take precedence over any concept rule
+
+
+########################################## Function definitions ##########################################
+
+def load_rules (Rules_path, Recurring_rules_path=None):
+
+    """
+    This function reads the table of concept rules and compiles it into dictionary lookups, so that
+    tagging a movement costs one hash probe per column no matter how many rules there are.
+    The recurring rules, see Recurring_Payments.py, are compiled along with them.
+
+    The table is a .csv with the columns:
+        - Concept: string as stated in the statement
+        - Column: 'DESCRIPCIÓN', 'SUBCATEGORÍA' or 'ANY' for both
+        - Category, Subcategory: target the movement is tagged with
+        - Sign: '-' to only match payments, '+' to only match incomes, empty to match both
+        - Match: how the concept is compared, one of the 'Match_kinds' of Pattern_Matching.py. Empty means
+          'exact', tables without this column only hold exact concepts
+
+    When several rules match the same concept the first one in the table wins, exact rules before patterns.
+
+    Parameters
+    ----------
+    Rules_path : str
+        Path to the .csv rule table
+    Recurring_rules_path : str
+        Path to the .csv table of recurring rules, None if there are none
+
+    Returns
+    -------
+    dict
+        Compiled rule table:
+        {'Targets': [(Category, Subcategory)],
+         'Lookups': {column: {sign: {concept: target index}, 'Patterns': compiled pattern rules or None}},
+         'Recurring': {column: (MultiIndex of (concept, cents), target indexes)}}
+    """
+
+    Rules_df = pd.read_csv(Rules_path, dtype=str, keep_default_na=False, encoding='utf-8')
+    if 'Match' not in Rules_df.columns:
+        Rules_df['Match'] = ''
+
+    Targets = []
+    Target_codes = {}
+    Lookups = {column: {'-': {}, '+': {}} for column in Rule_columns}
+    Pattern_rules = {column: [] for column in Rule_columns}
+
+    for rule in Rules_df.itertuples(index=False):
+
+        if (rule.Column != 'ANY' and rule.Column not in Rule_columns):
+            raise ValueError(f'Unknown column "{rule.Column}" for rule "{rule.Concept}" in {Rules_path}')
+
+        if (rule.Sign not in ('', '-', '+')):
+            raise ValueError(f'Unknown sign "{rule.Sign}" for rule "{rule.Concept}" in {Rules_path}')
+
+        Match = rule.Match or 'exact'
+        if (Match not in Match_kinds):
+            raise ValueError(f'Unknown match "{rule.Match}" for rule "{rule.Concept}" in {Rules_path}, expected one of {Match_kinds}')
+
+        # Number each target the first time it shows up
+        Target = (rule.Category, rule.Subcategory)
+        if Target not in Target_codes:
+            Target_codes[Target] = len(Targets)
+            Targets.append(Target)
+
+        # Register the concept on every column and sign the rule applies to
+        for column in Rule_columns:
+            if (rule.Column not in (column, 'ANY')):
+                continue
+
+            if (Match != 'exact'):
+                Pattern_rules[column].append((Match, rule.Concept, rule.Sign, Target_codes[Target]))
+                continue
+
+            for sign in ('-', '+'):
+                if (rule.Sign in (sign, '')):
+                    Lookups[column][sign].setdefault(rule.Concept, Target_codes[Target])
+
+    # Patterns of each column are compiled into a single automaton
+    for column in Rule_columns:
+        Lookups[column]['Patterns'] = compile_pattern_rules(Pattern_rules[column]) if Pattern_rules[column] else None
+
+    # Recurring rules share the target numbering
+    Recurring_rules = load_recurring_rules(Recurring_rules_path) if Recurring_rules_path else []
+    for _, _, _, Target in Recurring_rules:
+        if Target not in Target_codes:
+            Target_codes[Target] = len(Targets)
+            Targets.append(Target)
+
+    return {'Targets': Targets, 'Lookups': Lookups, 'Recurring': compile_recurring_rules(Recurring_rules, Target_codes)}
+
+
+
+def lookup_rule_targets (Column_series, Lookup, Debit_mask):
+
+    """
+    This function finds the target index of every element in a column of the statement.
+    The column is turned into a categorical so that the rule dictionaries are only probed once
+    per distinct value instead of once per movement. Values without an exact rule are then matched against
+    the pattern rules, also once per distinct value.
+
+    Parameters
+    ----------
+    Column_series : series
+        'DESCRIPCIÓN' or 'SUBCATEGORÍA' column of the statement
+    Lookup : dict
+        {sign: {concept: target index}, 'Patterns': pattern rules} as compiled by load_rules()
+    Debit_mask : ndarray bool
+        True for payments (negative amounts), False for incomes
+
+    Returns
+    -------
+    ndarray int
+        Target index for each movement, -1 when no rule matches
+    """
+
+    Column_categorical = Column_series.astype('category')
+    Values = Column_categorical.cat.categories
+
+    # One extra -1 at the end so that missing values (code -1) don't match anything
+    Debit_targets = np.array([Lookup['-'].get(value, -1) for value in Values] + [-1], dtype=np.int64)
+    Credit_targets = np.array([Lookup['+'].get(value, -1) for value in Values] + [-1], dtype=np.int64)
+
+    # Exact concepts win, patterns only fill the values left untagged
+    if Lookup.get('Patterns') is not None:
+        for index in np.flatnonzero((Debit_targets[:-1] < 0) | (Credit_targets[:-1] < 0)):
+            Debit_pattern, Credit_pattern = match_pattern_rules(Lookup['Patterns'], Values[index])
+            if (Debit_targets[index] < 0):
+                Debit_targets[index] = Debit_pattern
+            if (Credit_targets[index] < 0):
+                Credit_targets[index] = Credit_pattern
+
+    Value_codes = Column_categorical.cat.codes.to_numpy()
+    return np.where(Debit_mask, Debit_targets[Value_codes], Credit_targets[Value_codes])
+
+
+
+def categorize_movements (Movements_df, Rule_table):
+
+    """
+    This function tags every movement with the (Category, Subcategory) it belongs to in one vectorized
+    pass. Movements that don't match any rule are left untagged (NaN).
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements, as read from the statement
+    Rule_table : dict
+        Rules compiled by load_rules()
+
+    Returns
+    -------
+    dataframe
+        Copy of Movements_df with the extra columns 'Category', 'Subcategory' and 'Month'
+    """
+
+    # Shallow copy, the statement columns are shared and only the new ones are allocated
+    Movements_df = Movements_df.copy(deep=False)
+    Targets = Rule_table['Targets']
+    Debit_mask = (Movements_df['IMPORTE (€)'] < 0).to_numpy()
+
+    # Match descriptions first and fill the rest with the subcategory match
+    Description_codes = lookup_rule_targets(Movements_df['DESCRIPCIÓN'], Rule_table['Lookups']['DESCRIPCIÓN'], Debit_mask)
+    Subcategory_codes = lookup_rule_targets(Movements_df['SUBCATEGORÍA'], Rule_table['Lookups']['SUBCATEGORÍA'], Debit_mask)
+    Codes = np.where(Description_codes >= 0, Description_codes, Subcategory_codes)
+
+    # Recurring rules overwrite whatever the concept rules found
+    Recurring_codes = match_recurring_payments(Movements_df, Rule_table['Recurring'])
+    Codes = np.where(Recurring_codes >= 0, Recurring_codes, Codes)
+
+    # Split the target code into two categorical columns, code -1 stands for untagged movements
+    Categories = list(dict.fromkeys(target[0] for target in Targets))
+    Subcategories = list(dict.fromkeys(target[1] for target in Targets))
+    Category_lut = np.array([Categories.index(target[0]) for target in Targets] + [-1])
+    Subcategory_lut = np.array([Subcategories.index(target[1]) for target in Targets] + [-1])
+
+    Movements_df['Category'] = pd.Categorical.from_codes(Category_lut[Codes], Categories)
+    Movements_df['Subcategory'] = pd.Categorical.from_codes(Subcategory_lut[Codes], Subcategories)
+
+    # Month period key used to group movements
+    Movements_df['Month'] = pd.to_datetime(Movements_df['F. VALOR']).dt.to_period('M')
+
+    return Movements_df
+
+
+
+def month_bounds (Movements_df):
+
+    """
+    This function finds the rows each month spans. Movements are sorted by date, so every month is a
+    contiguous block of rows and can be viewed as a range of positions instead of being copied out with a
+    boolean mask.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements tagged by categorize_movements(), newest first
+
+    Returns
+    -------
+    PeriodIndex
+        Months, newest first
+    ndarray int
+        Position of the first row of each month
+    ndarray int
+        Position after the last row of each month, so that month i spans Movements_df.iloc[Starts[i]:Stops[i]]
+    """
+
+    Month_ordinals = Movements_df['Month'].array.asi8
+
+    # A new block starts wherever the month changes
+    Changes = np.ones(len(Month_ordinals), dtype=bool)
+    Changes[1:] = Month_ordinals[1:] != Month_ordinals[:-1]
+
+    Starts = np.flatnonzero(Changes)
+    Stops = np.append(Starts[1:], len(Month_ordinals))
+    Months = pd.PeriodIndex(Movements_df['Month'].iloc[Starts], name='Month')
+
+    if Months.has_duplicates:
+        raise ValueError('Movements must be sorted by date to split them into months')
+
+    return Months, Starts, Stops
+
+
+
+def month_range (Start=None, End=None):
+
+    """
+    This function widens a range of value dates to the whole months it touches, so that reports over a
+    range never hold part of a month.
+
+    Parameters
+    ----------
+    Start, End : str
+        First and last value dates, 'YYYY-MM-DD'. None leaves that side open
+
+    Returns
+    -------
+    Timestamp
+        First day of the month of Start, None if open
+    Timestamp
+        Last day of the month of End, None if open
+    """
+
+    First_day = pd.Period(Start, 'M').start_time if Start is not None else None
+    Last_day = pd.Period(End, 'M').end_time.normalize() if End is not None else None
+
+    return First_day, Last_day
+
+
+
+def monthly_totals (Movements_df):
+
+    """
+    This function computes the tracked values for each month out of a categorized dataframe.
+    Category sums come from a single groupby, balances from the first and last movement of each month.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements tagged by categorize_movements(), newest first. Amounts may be floats or integer
+        cents (exact mode)
+
+    Returns
+    -------
+    dataframe
+        One row per month (oldest first) and one column for each of the 'Output_columns', in euros
+    """
+
+    # In exact mode amounts are integer cents and every sum below stays an integer
+    Exact = is_exact(Movements_df)
+    Zero = 0 if Exact else 0.0
+
+    # Sum every (Category, Subcategory) pair of every month at once
+    Sums_df = (Movements_df
+               .groupby(['Month', 'Category', 'Subcategory'], observed=True)['IMPORTE (€)']
+               .sum()
+               .unstack(['Category', 'Subcategory'], fill_value=Zero))
+
+    # Movements are sorted newest first, so the first one of each month closes it
+    Months, Starts, Stops = month_bounds(Movements_df)
+    Balances = Movements_df['SALDO (€)'].to_numpy()
+    Dates = pd.to_datetime(Movements_df['F. VALOR']).to_numpy()
+
+    Balance = pd.Series(Balances[Starts] - Balances[Stops - 1], index=Months)
+    Last_day_month = pd.Series(Dates[Starts], index=Months)
+
+    return tally_monthly_totals(Sums_df, Balance, Last_day_month, Exact)
+
+
+
+def tally_monthly_totals (Sums_df, Balance, Last_day_month, Exact):
+
+    """
+    This function lays out the monthly sums of each (Category, Subcategory) as the tracked values: the
+    'Output_columns' in order, with the unaccounted expenses and totals computed from the balance.
+
+    Parameters
+    ----------
+    Sums_df : dataframe
+        Sum of each month (index) and (Category, Subcategory) pair (columns)
+    Balance : series
+        Balance of each month
+    Last_day_month : series
+        Date of the newest movement of each month
+    Exact : Bool
+        Sums and balances are integer cents
+
+    Returns
+    -------
+    dataframe
+        One row per month (oldest first) and one column for each of the 'Output_columns', in euros
+    """
+
+    Zero = 0 if Exact else 0.0
+
+    Monthly_df = pd.DataFrame(Zero, index=Balance.index, columns=pd.MultiIndex.from_tuples(Output_columns[1:]))
+
+    # Copy the sums, months or categories without movements are worth 0
+    Sums_df = Sums_df.reindex(Balance.index, fill_value=Zero)
+    for column in Output_columns[2:-2]:
+        if column in Sums_df.columns:
+            Monthly_df[column] = Sums_df[column]
+
+    # Tally up
+    Expenses_Accounted = Monthly_df[Expense_columns].sum(axis=1)
+    Expenses_Total = Balance - Monthly_df[("Income", "Salary")] - Monthly_df[("Income", "Bizums")]
+
+    Monthly_df[("Unaccounted", "Unknown")] = Expenses_Total - Expenses_Accounted
+    Monthly_df[("Total Sum Acc", "/")] = Expenses_Accounted
+    Monthly_df[("Balance", "/")] = Balance
+
+    # Aggregation is over, the output holds euros
+    if (Exact):
+        Monthly_df = from_cents(Monthly_df)
+    else:
+        Monthly_df = Monthly_df.astype(float)
+
+    Monthly_df.insert(0, ("Month", "/"), Last_day_month)
+
+    return Monthly_df.sort_index()
+
+
+
+def build_output_dic (Monthly_df):
+
+    """
+    This function converts the monthly totals into the 'Output_dic' structure used to store and plot
+    the results, a dict mapping each (Category, Subcategory) header to a list with one value per month.
+
+    Parameters
+    ----------
+    Monthly_df : dataframe
+        Monthly totals as returned by monthly_totals()
+
+    Returns
+    -------
+    dict
+        {(Category, Subcategory): [values]}
+    """
+
+    return {column: Monthly_df[column].tolist() for column in Output_columns}
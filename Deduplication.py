@@ -0,0 +1,82 @@
+'''
+Removal of the movements repeated across bank statements
+
+Statements exported with overlapping date ranges list the same movements twice, which breaks both the
+category totals and the balance computations. A movement is identified by its canonical key: value date,
+amount, description and running balance. The running balance makes the key unique within an account,
+two identical payments made the same day still leave different balances behind.
+'''
+
+import pandas as pd
+
+
+
+############################################### Variables ###############################################
+
+Key_columns = ['F. VALOR', 'IMPORTE (€)', 'DESCRIPCIÓN', 'SALDO (€)']
+
+
+########################################## Function definitions ##########################################
+
+def drop_duplicate_movements (Movements_df):
+
+    """
+    This function drops the movements that were already read from another statement, in a single hash
+    based pass over the merged movements. Only repetitions across statements are dropped: if a statement
+    lists the same key twice, both movements are kept, and another statement listing it twice too only
+    has its two copies dropped.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Merged movements, with the 'Source' column naming the statement each one comes from
+
+    Returns
+    -------
+    dataframe
+        Movements without repetitions, in the same order
+    dataframe
+        Overlaps resolved, one row per pair of statements: 'Source', 'Duplicate_of', 'Movements',
+        'First date' and 'Last date'. Empty if nothing was repeated
+    """
+
+    # Number the repetitions of each key inside each statement, so that the n-th copy in one statement
+    # is only matched against the n-th copy in the others
+    Occurrence = Movements_df.groupby(Key_columns + ['Source'], sort=False, dropna=False, observed=True).cumcount()
+    Keyed_df = Movements_df[Key_columns + ['Source']].assign(Occurrence=Occurrence)
+
+    Duplicate_mask = Keyed_df.duplicated(subset=Key_columns + ['Occurrence'], keep='first')
+
+    Report_columns = ['Source', 'Duplicate_of', 'Movements', 'First date', 'Last date']
+    if not Duplicate_mask.any():
+        return Movements_df, pd.DataFrame(columns=Report_columns)
+
+    # Name the statement whose copy was kept
+    Kept_source = Keyed_df.groupby(Key_columns + ['Occurrence'], sort=False, dropna=False, observed=True)['Source'].transform('first')
+
+    Dropped_df = Keyed_df[Duplicate_mask].assign(Duplicate_of=Kept_source[Duplicate_mask])
+    Report_df = (Dropped_df
+                 .groupby(['Source', 'Duplicate_of'], sort=True, observed=True)
+                 .agg(**{'Movements': ('F. VALOR', 'size'),
+                         'First date': ('F. VALOR', 'min'),
+                         'Last date': ('F. VALOR', 'max')})
+                 .reset_index())
+
+    return Movements_df[~Duplicate_mask.to_numpy()].reset_index(drop=True), Report_df[Report_columns]
+
+
+
+def print_overlap_report (Report_df):
+
+    """
+    This function prints the overlaps resolved by drop_duplicate_movements() into the cmd.
+
+    Parameters
+    ----------
+    Report_df : dataframe
+        Report returned by drop_duplicate_movements()
+    """
+
+    for row in Report_df.itertuples(index=False):
+        print(f'Dropped {row.Movements} movements of {row.Source} already read from {row.Duplicate_of} '
+              f'({row[3]:%d/%m/%Y} - {row[4]:%d/%m/%Y})')
@@ -0,0 +1,156 @@
+'''
+Export of the tracked output
+
+The tracked output is written as Excel, the format "Tracked_expenses.xlsx" has always had, and can also be
+exported as Parquet, CSV or Arrow IPC for tools that load the history faster from those. Every format keeps
+the two level (Category, Subcategory) columns:
+    - Excel and CSV: two header rows, like pandas writes them
+    - Parquet and Arrow IPC: pandas metadata, the columns come back as a MultiIndex with pd.read_parquet()
+      or pyarrow's Table.to_pandas()
+
+Rows are streamed in blocks, so memory use doesn't grow with the length of the history: Excel is written
+with openpyxl's write only mode and the Arrow based formats one record batch at a time.
+Parquet and Arrow IPC need pyarrow.
+'''
+
+import os
+import importlib.util
+
+import pandas as pd
+
+
+
+############################################### Variables ###############################################
+
+# Extension of each output format
+Export_formats = {'xlsx': 'xlsx', 'parquet': 'parquet', 'csv': 'csv', 'arrow': 'arrow'}
+
+# Rows written at once
+Block_rows = 10000
+
+
+########################################## Function definitions ##########################################
+
+def write_excel (Output_df, Output_path):
+
+    """
+    This function streams the tracked output into an Excel workbook. The layout is the one of
+    DataFrame.to_excel(), so Tracked_Output.load_tracked_output() reads it back: a header row with the
+    categories, one with the subcategories, an empty row for the index name and then one row per month.
+    Categories are repeated on every column instead of merged, write only workbooks can't merge cells.
+
+    Parameters
+    ----------
+    Output_df : dataframe
+        Tracked output, columns being (Category, Subcategory) tuples
+    Output_path : str
+        Path to the .xlsx
+    """
+
+    from openpyxl import Workbook
+
+    Workbook_out = Workbook(write_only=True)
+    Sheet = Workbook_out.create_sheet('Sheet1')
+
+    Columns = list(Output_df.columns)
+    Sheet.append([None] + [column[0] for column in Columns])
+    Sheet.append([None] + [column[1] for column in Columns])
+    Sheet.append([])
+
+    for start in range(0, len(Output_df), Block_rows):
+        Block_df = Output_df.iloc[start:start + Block_rows].astype(object)
+        Block_df = Block_df.where(pd.notna(Block_df), None)
+
+        for index, row in zip(Block_df.index, Block_df.itertuples(index=False, name=None)):
+            Sheet.append([index] + [value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row])
+
+    Workbook_out.save(Output_path)
+
+
+
+def write_csv (Output_df, Output_path):
+
+    """
+    This function writes the tracked output as .csv, with a header row for categories and another one for
+    subcategories. It is read back with pd.read_csv(path, header=[0, 1], index_col=0).
+
+    Parameters
+    ----------
+    Output_df : dataframe
+    Output_path : str
+    """
+
+    Output_df.to_csv(Output_path, chunksize=Block_rows, encoding='utf-8')
+
+
+
+def write_arrow (Output_df, Output_path, Format):
+
+    """
+    This function writes the tracked output as Parquet or Arrow IPC, one record batch per block of rows.
+
+    Parameters
+    ----------
+    Output_df : dataframe
+    Output_path : str
+    Format : str
+        'parquet' or 'arrow'
+    """
+
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError(f'Exporting as {Format} needs pyarrow, install it with "pip install pyarrow"')
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    Writer = None
+    try:
+        for start in range(0, max(len(Output_df), 1), Block_rows):
+
+            # The index is stored as a column, blocks don't share a range index
+            Table = pa.Table.from_pandas(Output_df.iloc[start:start + Block_rows], preserve_index=True)
+
+            if Writer is None:
+                Writer = pq.ParquetWriter(Output_path, Table.schema) if Format == 'parquet' else pa.ipc.new_file(Output_path, Table.schema)
+            Writer.write_table(Table)
+
+    finally:
+        if Writer is not None:
+            Writer.close()
+
+
+
+def export_output (Output_df, Output_folder, Format, Name='Tracked_expenses'):
+
+    """
+    This function writes the tracked output into "<Output_folder>/<Name>.<extension>".
+
+    Parameters
+    ----------
+    Output_df : dataframe
+        Tracked output, columns being (Category, Subcategory) tuples
+    Output_folder : str
+    Format : str
+        One of the 'Export_formats'
+    Name : str
+        File name, without extension
+
+    Returns
+    -------
+    str
+        Path to the file written
+    """
+
+    if Format not in Export_formats:
+        raise ValueError(f'Unknown output format "{Format}", expected one of {list(Export_formats)}')
+
+    Output_path = os.path.join(Output_folder, f'{Name}.{Export_formats[Format]}')
+
+    if (Format == 'xlsx'):
+        write_excel(Output_df, Output_path)
+    elif (Format == 'csv'):
+        write_csv(Output_df, Output_path)
+    else:
+        write_arrow(Output_df, Output_path, Format)
+
+    return Output_path
@@ -34,589 +34,548 @@ The spendings are grouped into the following categories:
 '''
 
 import os
+import argparse
+import time
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
 from datetime import datetime
+from Statement_Reader import read_statement_folder
+from Deduplication import drop_duplicate_movements, print_overlap_report
+from Reconciliation import reconcile_balances, print_reconciliation_report
+from Money import amounts_to_cents, from_cents
+from Categorizer import load_rules, categorize_movements, month_bounds, monthly_totals, build_output_dic
+from Recurring_Payments import detect_recurring_payments, print_recurring_report
+from Spending_Windows import spending_windows, Window_kinds
+from Projection import project_budget, print_projection_report
+from Plots import build_palette, plot_month_pie, plot_expenses_vs_time, show_charts, close_charts, render_charts, Time_resolutions
+from Profiling import new_profile, profile_stage, record_month, write_profile
+from Accounts import track_accounts, match_internal_transfers, consolidate_accounts, print_transfer_report
+from Exports import export_output
+from Watcher import watch_statements
+from Transaction_Store import open_store, store_movements, load_movements, store_monthly_totals
+from History_Store import write_history, load_history
+from Tracked_Output import load_tracked_output, first_open_month, select_open_movements, merge_tracked_output
 
 
 
 ############################################### Variables ###############################################
-# Modify the following flags to set different visualizations of the computed data
+# Modify the following flags to set the default behaviour, each of them can also be set from the command line
+# (run "python Finance_Tracker.py --help")
 
 Print_to_cmd = False
 Print_Pie_Graphs = False
 Print_expenses_vs_time = True
-Log_On_Excel = False
-
-
-########################################## Function definitions ##########################################
 
-def accumulate_movements (Concept, df):
-    
-    """
-    This function looks for movements with a certain type of concept (str) and returns the 
-    accumulated expenses for all movements found. It doesn't require that the concept be 
-    specified on a certain column
-
-    Parameters
-    ----------
-    Concept : str
-        Concept of the movement as stated in the df
-    df : dataframe
-        Dataframe where this information should be searched at
-    Returns
-    -------
-    float
-        Sum of all movements under the same Concept.
-    """
+# Resolution of the expenses vs time chart: 'month', 'quarter', 'year', 'lttb' (months downsampled keeping the
+# shape of the curves) or 'auto' (the finest level that fits). It never draws more than Time_chart_points points
+Time_chart_resolution = 'auto'
+Time_chart_points = 120
+Log_On_Excel = False
 
-    # Create a boolean series indicating matches for the subcategory we are interested in
-    # Don't ask the user to specify the columns, simply search in both columns
-    Indexing_Series_subcat = df['SUBCATEGORÍA'] == Concept
-    Indexing_Series_decrip = df['DESCRIPCIÓN'] == Concept
+# Also export the tracked output as 'parquet', 'csv' and/or 'arrow' (Arrow IPC) into "Output/Tracked_expenses.<format>"
+Export_formats = []
+Detect_Recurring = False
 
-    # Then use only the one that contains any instances of the concept 
-    if (Indexing_Series_subcat.any()):
+# Check that every balance is the previous one plus the movement's amount, and report missing, repeated or
+# misplaced movements
+Reconcile_Balances = True
 
-        # Trim out any rows that do not contain any instances
-        filtered_df = df[Indexing_Series_subcat]
-    
-        # Return all expenses for the specified instance
-        return filtered_df['IMPORTE (€)'].sum()
+# Write the spending per category over other windows than calendar months into "Output/Spending_<kind>.xlsx":
+# 'weekly', 'monthly', 'rolling' (Window_days long, one per day) or 'pay-period' (from one salary to the next)
+Spending_window = None
+Window_days = 30
 
-    elif (Indexing_Series_decrip.any()):
-        filtered_df = df[Indexing_Series_decrip]
-        # Return all expenses for the specified instance
-        return filtered_df['IMPORTE (€)'].sum()
+# Simulate the months ahead by drawing tracked months at random, report how likely the balance objective is met
+# and write the percentile bands of every category into "Output/Projection.xlsx"
+Project_Budget = False
+Projection_horizon = 24
+Projection_paths = 100000
 
-    else:
-        return 0.0
+# Render the donut chart of every month and the expenses vs time chart into "Output/Charts" as image files,
+# drawn in parallel without a display
+Render_Charts = False
+Chart_format = 'png'
+Render_Workers = None
 
+# Only recompute the months that aren't closed yet in "Output/Tracked_expenses.xlsx" and append new ones
+Incremental_Update = False
 
+# Store amounts as integer cents instead of floats, results are converted back into euros for the output
+Exact_Money = False
 
-def find_movement (Amount, Concept, df):
+# Store text columns as categoricals to cut memory use on long, multi-account histories
+Compact_Memory = False
 
-    """
-    This function search for a movement of a specified Amount under a certain Concept.
-    There is no need for the user to specify the column the Concept is located at
+# Keep a Parquet copy of each parsed statement in "Bank_Monthly_Movements/.cache" to skip parsing unchanged files
+Use_Cache = True
+Cache_size_limit_MB = 256
 
-    Parameters
-    ----------
-    Amount : float
-        Amount of € (signed) to look for in the df of bank movements.
-    Concept : str
-        Concept of the movement as stated in the df
-    df : dataframe
-        Dataframe where this information should be searched at
+# Keep the categorized movements in the SQLite database "Output/Movements.sqlite" and compute monthly totals
+# there. Once stored, the output can be rebuilt from the database without reading the statements again
+Use_Store = False
 
-    Returns
-    -------
-    list floats
-        List of all matching movements.
-    """
+# Keep the categorized movements and monthly totals as Arrow IPC files in "Output/History". Later runs and other
+# processes map them into memory instead of reading the statements again
+Keep_History = False
 
-    Indexing_Series_subcat = df['SUBCATEGORÍA'] == Concept
-    Indexing_Series_decrip = df['DESCRIPCIÓN'] == Concept
+# Keep running and update the outputs whenever a statement is added to "Bank_Monthly_Movements"
+Watch_Folder = False
 
-    # Then use only the one that contains any instances of the concept 
-    if (Indexing_Series_subcat.any()):
-        # Trim out any rows that do not contain any instances
-        filtered_df = df[Indexing_Series_subcat]
+# Statements are parsed in parallel, one process per core unless a number is given here
+Ingestion_Workers = None
 
-        # Filter out the df from all movements that don't match the amount
-        Indexing_Series_Amount = filtered_df['IMPORTE (€)'] == Amount
-        filtered_df = filtered_df[Indexing_Series_Amount]
+# Write the wall time, rows and peak memory of each stage and month into "Output/Profile.json",
+# and optionally a cProfile dump of the run into "Output/Profile.prof"
+Profile_Run = False
+Profile_cProfile = False
 
-        # Cast to list in case there are more than one movement matching
-        return filtered_df['IMPORTE (€)'].tolist()
-
-    elif (Indexing_Series_decrip.any()):
-        filtered_df = df[Indexing_Series_decrip]
-        # Filter out the df from all movements that don't match the amount
-        Indexing_Series_Amount = filtered_df['IMPORTE (€)'] == Amount
-        filtered_df = filtered_df[Indexing_Series_Amount]
-
-        # Cast to list in case there are more than one movement matching
-        return filtered_df['IMPORTE (€)'].tolist()
-
-    else:
-        return [0.0]
 
+########################################## Function definitions ##########################################
 
+def parse_arguments (argv=None):
 
-def Index_by_month(Timestamp, month, year):
-    
     """
-    This function takes a Timestamp and check wether it matches a certain month and year.
-    It is meant to be used with the 'apply()' method in pandas to generate and indexing mask
-    that extracts data for only one month. 
+    This function reads the command line options, the flags above are used as defaults.
 
     Parameters
     ----------
-    Timestamp : ??
-        The element on each row
-
-    month : int
-
-    year :  int
+    argv : list str
+        Command line arguments, defaults to sys.argv
 
-    Returns 
+    Returns
     -------
-    Bool
-        True for a matching element, False if not.    
+    Namespace
+        Options of the run
     """
 
-    # Check if the Timestamp type variable has a matching month and year
-    if (Timestamp.month == month and Timestamp.year == year):
-        return True
-    
-    else:
-        return False
-
-
-####################################################### MAIN CODE ###########################################################
-
-
-
-################################# Dynamicaly read files on subfolder "Bank_Monthly_Movements" ###############################
-
-# Folder structure this code expects:
-#
-# Current Directory
-# └── Bank_Monthly_Movements/
-# │   ├── Movements.xls
-# │   │
-# │   └── ...
-
-# Construct path
-current_directory = os.getcwd()
-Bank_Monthly_Movements_path = os.path.join(current_directory, 'Bank_Monthly_Movements')
-Movements_path = os.path.join(Bank_Monthly_Movements_path, 'Movements.xls')
-
-# Read file into dataframe
-Movements_df = pd.read_excel(Movements_path, header=5, sheet_name='Movimientos')
-
-# Cast the numerical values to floats
-Movements_df['IMPORTE (€)'] = Movements_df['IMPORTE (€)'].astype(float)
-Movements_df['SALDO (€)'] = Movements_df['SALDO (€)'].astype(float)
-
-
-Output_dic = {
-        ("Month", "/"): [],
-        ("Savings", "/"): [],
-        ("Eating Out Work", "/"): [],
-        ("Uber To Work", "/"): [],
-        ("Recreational", "Uber Eats"): [],
-        ("Recreational", "Bars And Restaurants"): [],
-        ("Recreational", "Bizum"): [],
-        ("Recreational", "Bazar"): [],
-        ("Recreational", "Clothing"): [],
-        ("Recreational", "Concerts And Movies"): [],
-        ("Subscriptions", "Psychologist"): [],
-        ("Subscriptions", "Dystopia"): [],
-        ("Subscriptions", "ChatGPT"): [],
-        ("Subscriptions", "Gym"): [],
-        ("Subscriptions", "Public Transport"): [],
-        ("Health", "/"): [],
-        ("Unaccounted", "Withdrawals"): [],
-        ("Unaccounted", "Unknown"): [],
-        ("Income", "Salary"): [],
-        ("Income", "Bizums"): [],
-        ("Total Sum Acc", "/"): [],
-        ("Balance", "/"): []
-    }
-'''
-This snippet is just in case I implement a way to programmatically read different bank ls files
-and update the Tracked_expenses accordingly
-
-# Check whether the output file exists
-Output_path = os.path.join(current_directory, 'Output')
-Tracked_expenses_path = 'Tracked_expenses.xlsx'
-Tracked_expenses_path = os.path.join(Output_path, Tracked_expenses_path)
-
-if not os.path.exists(Tracked_expenses_path):
-
-    # If not create empty dict
-    Output_dic = {
-        ("Month", "/"): [],
-        ("Savings", "/"): [],
-        ("Eating Out Work", "/"): [],
-        ("Uber To Work", "/"): [],
-        ("Recreational", "Uber Eats"): [],
-        ("Recreational", "Bars And Restaurants"): [],
-        ("Recreational", "Bizum"): [],
-        ("Recreational", "Bazar"): [],
-        ("Subscriptions", "Psychologist"): [],
-        ("Subscriptions", "Dystopia"): [],
-        ("Subscriptions", "ChatGPT"): [],
-        ("Subscriptions", "Gym"): [],
-        ("Subscriptions", "Public Transport"): [],
-        ("Unaccounted", "Withdrawals"): [],
-        ("Unaccounted", "Unknown"): [],
-        ("Income", "Salary"): [],
-        ("Income", "Bizums"): [],
-        ("Total Sum Acc", "/"): [],
-        ("Balance", "/"): []
-    }
-
-# If it does exist read it into a dict to append new data
-else:
-    Output_df = pd.read_excel(Tracked_expenses_path, header=[0, 1], index_col=0)
-    Output_dic = Output_df.to_dict(orient='list')
-'''
-
-######################################## Accumulate and find payments for each month ########################################
+    parser = argparse.ArgumentParser(description='Track the spendings of an ING account from its exported movements')
+
+    parser.add_argument('--folder', default=os.getcwd(),
+                        help='folder holding "Bank_Monthly_Movements", "Rules" and "Output" (default: current directory)')
+    parser.add_argument('--accounts',
+                        help='folder holding one subfolder per account, tracked in parallel and consolidated into its "Output"')
+
+    # Reports
+    parser.add_argument('--print', dest='print_to_cmd', action=argparse.BooleanOptionalAction, default=Print_to_cmd,
+                        help='print the expenses of each month')
+    parser.add_argument('--pie', action=argparse.BooleanOptionalAction, default=Print_Pie_Graphs,
+                        help='draw a donut chart of the expenses of each month')
+    parser.add_argument('--time-chart', action=argparse.BooleanOptionalAction, default=Print_expenses_vs_time,
+                        help='draw the evolution of expenses over time')
+    parser.add_argument('--chart-resolution', default=Time_chart_resolution, choices=Time_resolutions,
+                        help='resolution of the expenses vs time chart')
+    parser.add_argument('--chart-points', type=int, default=Time_chart_points,
+                        help='points drawn at most by the expenses vs time chart')
+    parser.add_argument('--excel', action=argparse.BooleanOptionalAction, default=Log_On_Excel,
+                        help='write "Output/Tracked_expenses.xlsx"')
+    parser.add_argument('--export', action='append', default=list(Export_formats), choices=['parquet', 'csv', 'arrow'],
+                        help='also export the tracked output in this format, can be repeated')
+    parser.add_argument('--reconcile', action=argparse.BooleanOptionalAction, default=Reconcile_Balances,
+                        help='check the running balance of the movements and report its breaks')
+    parser.add_argument('--detect-recurring', action=argparse.BooleanOptionalAction, default=Detect_Recurring,
+                        help='list recurring payments that no rule tracks yet')
+    parser.add_argument('--windows', default=Spending_window, choices=Window_kinds,
+                        help='write the spending over each window of this kind into "Output/Spending_<kind>.xlsx"')
+    parser.add_argument('--window-days', type=int, default=Window_days,
+                        help='length of the rolling windows')
+    parser.add_argument('--project', action=argparse.BooleanOptionalAction, default=Project_Budget,
+                        help='project the months ahead against the balance objective into "Output/Projection.xlsx"')
+    parser.add_argument('--horizon', type=int, default=Projection_horizon,
+                        help='months ahead of the projection')
+    parser.add_argument('--paths', type=int, default=Projection_paths,
+                        help='paths simulated by the projection')
+    parser.add_argument('--show', action=argparse.BooleanOptionalAction, default=True,
+                        help='display the charts once they are drawn')
+    parser.add_argument('--headless', action='store_true',
+                        help="don't draw nor display any chart, for batch jobs (same as --no-pie --no-time-chart --no-show)")
+
+    parser.add_argument('--render', action=argparse.BooleanOptionalAction, default=Render_Charts,
+                        help='render every chart into image files in "Output/Charts"')
+    parser.add_argument('--chart-format', default=Chart_format, choices=['png', 'svg', 'pdf'],
+                        help='format of the rendered charts')
+    parser.add_argument('--render-workers', type=int, default=Render_Workers,
+                        help='processes used to render charts (default: one per core)')
+
+    # Processing
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=Incremental_Update,
+                        help='only recompute the months that are still open in "Output/Tracked_expenses.xlsx"')
+    parser.add_argument('--exact', action=argparse.BooleanOptionalAction, default=Exact_Money,
+                        help='store amounts as integer cents')
+    parser.add_argument('--compact', action=argparse.BooleanOptionalAction, default=Compact_Memory,
+                        help='store text columns as categoricals to use less memory')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=Use_Cache,
+                        help='reuse the parsed copy of statements that have not changed')
+    parser.add_argument('--cache-size-mb', type=int, default=Cache_size_limit_MB,
+                        help='size cap of the parsed statement cache')
+    parser.add_argument('--store', action=argparse.BooleanOptionalAction, default=Use_Store,
+                        help='keep the categorized movements in "Output/Movements.sqlite" and aggregate them there')
+    parser.add_argument('--from-store', action='store_true',
+                        help="rebuild the output from the movements stored by a previous --store run, statements aren't read")
+    parser.add_argument('--start', help='first value date (YYYY-MM-DD) of the report, only with --store, --from-store or '
+                                        '--from-history. The report covers every month the range touches, whole')
+    parser.add_argument('--end', help='last value date (YYYY-MM-DD) of the report, only with --store, --from-store or '
+                                      '--from-history. The report covers every month the range touches, whole')
+    parser.add_argument('--history', action=argparse.BooleanOptionalAction, default=Keep_History,
+                        help='keep the categorized movements and monthly totals in "Output/History" as Arrow IPC files')
+    parser.add_argument('--from-history', action='store_true',
+                        help="map the history written by a previous --history run into memory, statements aren't read")
+    parser.add_argument('--watch', action=argparse.BooleanOptionalAction, default=Watch_Folder,
+                        help='keep running and update the outputs as statements are added, replaced or removed')
+    parser.add_argument('--workers', type=int, default=Ingestion_Workers,
+                        help='processes used to parse statements (default: one per core)')
+
+    # Profiling
+    parser.add_argument('--profile', action=argparse.BooleanOptionalAction, default=Profile_Run,
+                        help='write the metrics of each stage into "Output/Profile.json"')
+    parser.add_argument('--cprofile', action=argparse.BooleanOptionalAction, default=Profile_cProfile,
+                        help='also dump a cProfile of the run into "Output/Profile.prof"')
+
+    Options = parser.parse_args(argv)
+
+    if (Options.from_store):
+        Options.store = True
+
+    if (Options.accounts and (Options.store or Options.incremental)):
+        parser.error('--accounts can\'t be combined with --store, --from-store nor --incremental')
+
+    if (Options.watch and (Options.accounts or Options.store or Options.incremental)):
+        parser.error('--watch can\'t be combined with --accounts, --store, --from-store nor --incremental')
+
+    if (Options.from_history and (Options.accounts or Options.store or Options.incremental or Options.watch)):
+        parser.error('--from-history can\'t be combined with --accounts, --store, --from-store, --incremental nor --watch')
+
+    if (Options.history and (Options.incremental or Options.watch)):
+        parser.error('--history can\'t be combined with --incremental nor --watch, the history has to hold every month')
+
+    if (Options.incremental and (Options.windows or Options.detect_recurring)):
+        parser.error('--windows and --detect-recurring can\'t be combined with --incremental, they need every month and not only the re-read ones')
+
+    if ((Options.start or Options.end) and not (Options.store or Options.from_history)):
+        parser.error('--start and --end need --store, --from-store or --from-history')
+
+    if (Options.headless):
+        Options.pie = Options.time_chart = Options.show = False
+
+    # A cProfile dump is part of the profile
+    if (Options.cprofile):
+        Options.profile = True
+
+    return Options
 
-# Get the column series storing dates for each movement
-Dates_df = Movements_df['F. VALOR'] 
 
-# Find how many months/years we need to split the df into
-First_month = Dates_df.tolist()[-1].month
-First_year = Dates_df.tolist()[-1].year
-Last_month = Dates_df.tolist()[0].month
-Last_year = Dates_df.tolist()[0].year
 
-# Construct a list of dates to iterate through, with structure : [int month, int year ]
-Dates = []
-if (Last_year > First_year):
-    for year in range(First_year, Last_year+1):
-
-        if (year == First_year):
-            for month in range(First_month, 12+1):
-                Dates.append([month, year])
-
-        elif (year == Last_year):
-            for month in range(1, Last_month+1):
-                Dates.append([month, year])
-
-        else:
-            for month in range(1, 12+1):
-                Dates.append([month, year])
-
-elif (Last_year == First_year):
-    for month in range(First_month, Last_month+1):
-        Dates.append([month, First_year])
-
-# Iterate through them and store them on a list
-for date in Dates:
-    month, year = date[0], date[1]
-
-    # Apply the funciton to each element and pass month as an additional argument
-    Indexing_df = Dates_df.apply(Index_by_month, args=(month, year))
-
-    # Create a dataframe for each month with each indexing series
-    Month_df = Movements_df[Indexing_df] 
-
-    # Payments through Bizum and Withdrawals:
-    # This payments have to be individualy serached in the list of movements
-    Dystopia = sum( find_movement (Amount = -15.00, Concept = 'Transferencia Bizum emitida', df = Month_df) )
-
-    # Psychologist is 70€/visit and paid in cash so we look for multiples of said extraction
-    Psychologist_payments = []
-    for i in range (1, 6): 
-        Psychologist_payments.append(find_movement (Amount = -70.0 * i, Concept = 'Cajeros', df = Month_df))
-
-    # And sum them into one single amnount
-    Psychologist = 0.0
-    for payments in Psychologist_payments:
-
-        # Psychologist_payments is a list of lists, these lists hold all of the instances found for each multiple of 
-        # 70 between 1 and 4 so the list might be empty:
-        if not payments == []:
-            for instance in payments:
-                Psychologist += instance
-
-    # Find all instances of movements for each category and add them into one single value
-    Eating_Out_Work = ( accumulate_movements('Pago en CAFET. IMDEA NANOCIENCIA MADRID ES', Month_df) 
-                       + accumulate_movements('Pago en LA ESTACION DE MAJADAHONDMAJADAHONDA ES', Month_df)
-                       + accumulate_movements('Pago en DELIKIA VINCIOS ES', Month_df))
-    
-    Uber_Trip = accumulate_movements('Taxi y Carsharing', Month_df)
-    
-    Uber_Eats = accumulate_movements('Pago en UBER *EATS', Month_df)
-    
-    Bizum = accumulate_movements('Gasto Bizum', Month_df)
-    
-    Restaurants_Bars = (accumulate_movements('Cafeterías y restaurantes', Month_df)
-                        - Eating_Out_Work - Uber_Eats)
-    
-    Clothing = accumulate_movements('Ropa y complementos', Month_df)
-
-    Concerts_Movies = accumulate_movements('Cine, teatro y espectáculos', Month_df)
-    
-    Withdrawals = (accumulate_movements('Cajeros', Month_df) - Psychologist)
-
-    Bazar = ( accumulate_movements('Gasolina y combustible', Month_df) 
-             + accumulate_movements('Supermercados y alimentación', Month_df) 
-             + accumulate_movements('Regalos y juguetes', Month_df) )
-    
-    ChatGPT = accumulate_movements('Pago en CHATGPT SUBSCRIPTION', Month_df)
-    
-    Gym = ( accumulate_movements('Recibo ALTAFIT GRUPO DE GESTION S.L', Month_df) 
-           + accumulate_movements('Pago en ALTAFIT MAJADAHONDA MAJADAHONDA ES', Month_df) )
-    
-    Public_Transport = accumulate_movements('Transporte público', Month_df)
-
-    Health = ( accumulate_movements('Farmacia, herbolario y nutrición', Month_df) 
-              + accumulate_movements('Dentista, médico', Month_df) )
-
-    Salary = accumulate_movements('Nomina recibida FUNDACION IMDEA NANOCIENCIA', Month_df)
-
-    Bizum_received = accumulate_movements('Ingreso Bizum', Month_df)
-
-    # Tally up
-    Expenses_Accounted = ( Eating_Out_Work + Uber_Trip + Uber_Eats + Bizum + Restaurants_Bars + Bazar + Clothing +
-                       + Concerts_Movies + ChatGPT + Gym + Psychologist  + Public_Transport + Dystopia + Health + Withdrawals )
-
-    Balance = Month_df['SALDO (€)'].tolist()[0] - Month_df['SALDO (€)'].tolist()[-1]
-    Expenses_Total = Balance - Salary - Bizum_received
-    Expenses_Unaccounted = Expenses_Total - Expenses_Accounted
-
-    # Last day of the month to store data
-    last_day_month = Month_df['F. VALOR'].tolist()[-1]
-
-    ################################################## Sort and store results #############################################
-
-    # Append data to dict
-    Output_dic[("Month", "/")].append(last_day_month)
-    Output_dic[("Savings", "/")].append(0.0)
-    Output_dic[("Eating Out Work", "/")].append(Eating_Out_Work)
-    Output_dic[("Uber To Work", "/")].append(Uber_Trip)
-    Output_dic[("Recreational", "Uber Eats")].append(Uber_Eats)
-    Output_dic[("Recreational", "Bars And Restaurants")].append(Restaurants_Bars)
-    Output_dic[("Recreational", "Bizum")].append(Bizum)
-    Output_dic[("Recreational", "Bazar")].append(Bazar)
-    Output_dic[("Recreational", "Clothing")].append(Clothing)
-    Output_dic[("Recreational", "Concerts And Movies")].append(Concerts_Movies)
-    Output_dic[("Subscriptions", "Psychologist")].append(Psychologist)
-    Output_dic[("Subscriptions", "Dystopia")].append(Dystopia)
-    Output_dic[("Subscriptions", "ChatGPT")].append(ChatGPT)
-    Output_dic[("Subscriptions", "Gym")].append(Gym)
-    Output_dic[("Subscriptions", "Public Transport")].append(Public_Transport)
-    Output_dic[("Health", "/")].append(Health)
-    Output_dic[("Unaccounted", "Withdrawals")].append(Withdrawals)
-    Output_dic[("Unaccounted", "Unknown")].append(Expenses_Unaccounted)
-    Output_dic[("Income", "Salary")].append(Salary)
-    Output_dic[("Income", "Bizums")].append(Bizum_received)
-    Output_dic[("Total Sum Acc", "/")].append(Expenses_Accounted)
-    Output_dic[("Balance", "/")].append(Balance)
-
-    Output_df = pd.DataFrame.from_dict(Output_dic)
-
-
-    
-    ############################################# Visualize results #############################################
-
-    # Print into cmd
-    if (Print_to_cmd):
-        print(f'\n\n*************************************\n        ACCUMULATED EXPENSES\n')
-        print(f'              {month}/{year}\n*************************************\n')
-        print(f'    * Savings:  {0:.2f} €')
-        print(f'    * Eating out (Work):  {Eating_Out_Work:.2f} €')
-        print(f'    * Uber Trips:  {Uber_Trip:.2f} €')
-        print(f'    * Uber Eats:  {Uber_Eats:.2f} €')
-        print(f'    * Bars and Restaurants:  {Restaurants_Bars:.2f} €')
-        print(f'    * Bizum:  {Bizum:.2f} €')
-        print(f'    * Bazar:  {Bazar:.2f} €')
-        print(f'    * Clothing:  {Clothing:.2f} €')
-        print(f'    * Concerts and movies:  {Concerts_Movies:.2f} €')
-        print(f'    * Psychologist:  {Psychologist:.2f} €')
-        print(f'    * Dystopia:  {Dystopia:.2f} €')
-        print(f'    * ChatGPT:  {ChatGPT:.2f} €')
-        print(f'    * Gym:  {Gym:.2f} €')
-        print(f'    * Health:  {Health:.2f} €')
-        print(f'    * Public Transport:  {Public_Transport:.2f} €')
-        print(f'    * Withdrawals:  {Withdrawals:.2f} €')
-        print(f'\n--------------------------------------\n')
-        print(f'    * Total sum:  {Expenses_Total:.2f} €')
-        print(f'    * Balance:  {Balance:.2f} €')
-        print(f'\n--------------------------------------\n')
-        print(f'    * Unaccounted movements:  {Expenses_Unaccounted:.2f} €')
-        print(f'\n*************************************\n\n')
-
-    # Graph results
-
-    # Pie Chart
-    # Get labels for each pie slize from the df headers
-    labels = Output_df.columns.tolist()
-
-    # This chart shouldn't show computed values like dates, Incomes, Computations, etc... 
-    labels = labels[1:-4]
-
-    # Labels come from a multindex tuple and therefore look like this ("Category", "Subcategory"), 
-    # for aesthetic purposes only subcategories are shown, if there are no subcategories the category is shown
-    labels_curated = []
-    colors = np.empty(0)
-    subcategory_colormap_size = 1
-
-    for header in labels:
-
-        if (header[1] == "/"):
-            labels_curated.append(header[0])
-        
-        else:
-            labels_curated.append(header[1])
-
-    # Get sizes for pie slizes from the row content of the df
-    sizes = Output_df.iloc[-1].tolist()
-
-    # This chart shouldn't show computed values like dates, incomes, Balance, Total sum, etc... 
-    sizes = sizes[1:-4]
-
-    # Pie chart can't take negative values
-    for i in range(0, len(sizes)):
-        sizes[i] = abs(sizes[i])
-
-    ########################################## Construct colormap by categories ##########################################
-
-    # Construct color maps for each 'Category' of tracked data
-    # The "colormap" argument in pie() takes an ndarray indicating color.
-    # We want to use a specific gradient for each category, thus we compile a list counting how many subcategories per
-    # category
-    subcat_count = np.empty(0)
-    count = 1
-    previous_cat = "start"
-
-    # 'labels' is a list storing tuples, It's first element contains a columns category. To count how many subcategories 
-    # are per category we iterate over the list and count how many times every category is repeated, check "Tracking_dic" structure
-    for index in range(0, len(labels)):
-        
-        # Reads the category header at the current index
-        current_cat = labels[index][0]
-
-        # At the start we can't compare categories and thus simply start the counter
-        if (previous_cat == "start"):
-            count = 1
-            previous_cat = current_cat
-
-        # If we find a successive category we add it to the count
-        elif (current_cat == previous_cat):
-            count += 1
-            previous_cat = current_cat
-
-        # If we find a different category we log the amount of subcategories
-        elif (current_cat != previous_cat):
-            subcat_count = np.append(subcat_count, count)
-            previous_cat = current_cat
-            count = 1
-
-    # Since logging counts is done upon comparison at the second step we need one last log at the end
-    # (I need to test if this hack works for all cases)
-    subcat_count = np.append(subcat_count, count)
-    
-
-    # A handpicked list of 'sequential' colormaps that don't clash with pie slice neighbours
-    cmap_1 = plt.get_cmap('Oranges')
-    cmap_2 = plt.get_cmap('Blues')
-    cmap_3 = plt.get_cmap('Reds')
-    cmap_4 = plt.get_cmap('Greens')
-    cmap_5 = plt.get_cmap('Purples')
-    cmap_6 = plt.get_cmap('Reds')
-    cmap_7 = plt.get_cmap('Greys')
-    cmaps = [cmap_1, cmap_2, cmap_3, cmap_4, cmap_5, cmap_6, cmap_7]
-
-
-    # For each category create a set of colors in the same gradients
-    # Create as many colors are there are subcategories
-    colors = np.empty([1, 4])
-    for i in range(0, len(subcat_count)):
-
-        # Get cmap object from list of cmaps and create an ndarray storing
-        # colors for each "slice" representing the subcategories in the category
-        cmap = cmaps[i]
-        color = cmap( np.linspace(0.2, 0.7, int(subcat_count[i])) )
-
-        # Deal with starting case when there's nothing to stack
-        if (i==0):        
-            # Store first colormap
-            colors = color
-
-        # Continue as normal for the rest of indexes
-        else:    
-            # Concatenate both arrays
-            colors = np.vstack((colors, color))
-
-    # Create a pie chart
-    if (Print_Pie_Graphs):
-
-        fig, ax = plt.subplots()
-
-        # Explode wedges that are small enough, so that their labes don't clash with each other
-        explode_wedges = []
-        for size in sizes:
-            if (size != 0):
-                explode_wedges.append( 10 / size )
-            
-            else:
-                explode_wedges.append(0)
-
-        ax.pie(sizes, labels=labels_curated, colors=colors, autopct='%1.1f%%', shadow=False, pctdistance=0.6, labeldistance=1.1, explode=explode_wedges)
-        
-        # Add a circle in the center to make a 'donut' instead of a 'pie'
-        my_circle=plt.Circle( (0,0), 0.75, color='white')
-        p=plt.gcf()
-        p.gca().add_artist(my_circle)
+####################################################### MAIN CODE ###########################################################
 
-        ax.set_title(label = f'Expenses distribution\nMonth : {month}/{year}')
+def main (argv=None):
 
+    """
+    This function runs the tracker: reads the statements, categorizes the movements and reports the monthly
+    expenses as requested by the command line options.
 
+    Parameters
+    ----------
+    argv : list str
+        Command line arguments, defaults to sys.argv
+    """
 
-# Write compiled data into the Output excel sheet
-if (Log_On_Excel):
+    Options = parse_arguments(argv)
+
+    ################################# Dynamicaly read files on subfolder "Bank_Monthly_Movements" ###############################
+
+    # Folder structure this code expects:
+    #
+    # Current Directory
+    # └── Bank_Monthly_Movements/
+    # │   ├── Movements.xls
+    # │   ├── Movements_2.csv  (any number of .xls/.xlsx, .csv, .ofx or CAMT .xml exports, overlapping dates are fine)
+    # │   ├── .cache/          (parsed statements, created automatically)
+    # │   │
+    # │   └── ...
+    # └── Rules/
+    # │   ├── Movement_Rules.csv
+    # │   └── Recurring_Rules.csv
+
+    # Construct path
+    current_directory = Options.folder
+    Bank_Monthly_Movements_path = os.path.join(current_directory, 'Bank_Monthly_Movements')
     Output_path = os.path.join(current_directory, 'Output')
+
+    # Several accounts are consolidated into the output of their folder
+    if (Options.accounts):
+        Output_path = os.path.join(Options.accounts, 'Output')
+        os.makedirs(Output_path, exist_ok=True)
+
+    # Stay in memory and keep the outputs up to date as statements arrive
+    if (Options.watch):
+        Rules_folder = os.path.join(current_directory, 'Rules')
+        Rule_table = load_rules(os.path.join(Rules_folder, 'Movement_Rules.csv'), os.path.join(Rules_folder, 'Recurring_Rules.csv'))
+        watch_statements(Bank_Monthly_Movements_path, Rule_table, Output_path, Use_cache=Options.cache,
+                         Max_cache_bytes=Options.cache_size_mb * 1024 * 1024, Exact=Options.exact, Compact=Options.compact,
+                         Reconcile=Options.reconcile, Excel=Options.excel, Export_formats=Options.export,
+                         Render=Options.render, Chart_format=Options.chart_format)
+        return
+
+    # Record the metrics of each stage when profiling
+    Profile = new_profile(Options.profile, os.path.join(Output_path, 'Profile.prof') if Options.cprofile else None)
+
+    # Check whether the output file exists
     Tracked_expenses_path = 'Tracked_expenses.xlsx'
     Tracked_expenses_path = os.path.join(Output_path, Tracked_expenses_path)
-    Output_df.to_excel(Tracked_expenses_path)
-
-
-# Create a graph showing evolution of explenses over time
-if (Print_expenses_vs_time):
-    
-    fig, ax = plt.subplots()
-
-    # Extract expenses from dict into list to iterate later while referencing them
-    # Convert dictionary items to a list
-    items_list = list(Output_dic.items())
-    Expenses = []
-
-    # Sum all expenses iteratively to construct fill curves
-    dates = Output_dic[("Month", "/")]
-    acc_expense = np.zeros( shape = len( dates ) )
-    # Skip dates, incomes, sum and balance
-    for _, expense in items_list[1:-4]:
-
-        # Cast to array to sum element wise
-        curr_expense = np.array(expense)
-        acc_expense = curr_expense + acc_expense
-        Expenses.append(acc_expense)
-
-    # Compare expanses to income
-    Income = np.array(Output_dic[("Income", "Salary")]) + np.array(Output_dic[("Income", "Bizums")])
-    plt.plot(dates, Income, color='k', label="Income")
-    
-    # Emphasize zero crossing
-    plt.plot(dates, np.zeros(shape=len(dates)), color='red', alpha=0.5)
+    Tracked_df = None
+
+    # The store keeps the categorized movements of previous runs
+    Store = None
+    if (Options.store):
+        Store = open_store(os.path.join(Output_path, 'Movements.sqlite'))
+
+    if (Options.accounts):
+        # Every account is read, categorized and aggregated in its own process, writing its own output
+        with profile_stage(Profile, 'accounts') as stage:
+            Account_results = track_accounts(Options.accounts, Use_cache=Options.cache,
+                                             Max_cache_bytes=Options.cache_size_mb * 1024 * 1024,
+                                             Exact=Options.exact, Compact=Options.compact, Reconcile=Options.reconcile,
+                                             Workers=Options.workers)
+            stage['rows'] = sum(len(result['Movements']) for result in Account_results)
+
+        with profile_stage(Profile, 'transfer_matching') as stage:
+            Transfers_df = match_internal_transfers(Account_results)
+            stage['rows'] = len(Transfers_df)
+        print_transfer_report(Account_results, Transfers_df)
+
+    elif (Options.from_store):
+        with profile_stage(Profile, 'store_reading') as stage:
+            Movements_df = load_movements(Store, Options.start, Options.end, Exact=Options.exact)
+            stage['rows'] = len(Movements_df)
+
+    elif (Options.from_history):
+        # Monthly totals are read along with the movements, nothing is aggregated again
+        with profile_stage(Profile, 'history_reading') as stage:
+            Movements_df, Monthly_df = load_history(os.path.join(Output_path, 'History'), Options.start, Options.end,
+                                                    Exact=Options.exact)
+            stage['rows'] = len(Movements_df)
 
-    # Set a balance objective for +200€ savings +350€ rents +100€ dinner at home
-    balance_objective = [200 + 350 + 100]*len(dates)
-    plt.plot(dates, balance_objective, color='blue', alpha=0.5)
-
-    # Start to fill from the income line downwards to signify the progressive drain of income
-    Balances = [Income]
-    for expense in Expenses:
-        Balances.append(Income + expense)
+    else:
+        # Read every statement in the folder into a single dataframe, newest movement first.
+        # Numerical values are already cast to floats
+        with profile_stage(Profile, 'ingestion') as stage:
+            Movements_df = read_statement_folder(Bank_Monthly_Movements_path, Use_cache=Options.cache,
+                                                 Max_cache_bytes=Options.cache_size_mb * 1024 * 1024, Workers=Options.workers,
+                                                 Compact=Options.compact)
+            stage['rows'] = len(Movements_df)
+
+        # Statements exported with overlapping dates repeat movements, keep only one copy of each
+        with profile_stage(Profile, 'deduplication') as stage:
+            Movements_df, Overlap_report = drop_duplicate_movements(Movements_df)
+            stage['rows'] = len(Movements_df)
+        print_overlap_report(Overlap_report)
+
+        with profile_stage(Profile, 'layout') as stage:
+
+            # Work with integer cents so that amounts are matched and summed exactly
+            if (Options.exact):
+                Movements_df = amounts_to_cents(Movements_df)
+
+            stage['rows'] = len(Movements_df)
+
+        # Missing, repeated or misplaced movements would end up in "Unaccounted/Unknown"
+        if (Options.reconcile):
+            with profile_stage(Profile, 'reconciliation') as stage:
+                Reconciliation_report = reconcile_balances(Movements_df)
+                stage['rows'] = len(Movements_df)
+            print_reconciliation_report(Reconciliation_report)
+
+
+
+        # If the output file exists, only movements from the months that are still open have to be computed again
+        if (Options.incremental):
+            with profile_stage(Profile, 'incremental_selection') as stage:
+                Tracked_df = load_tracked_output(Tracked_expenses_path)
+                Movements_df = select_open_movements(Movements_df, first_open_month(Tracked_df))
+                stage['rows'] = len(Movements_df)
+
+        ######################################## Categorize and accumulate payments for each month ########################################
+
+        # Compile the concept rules, each category is defined on the rule table instead of being hard-coded
+        Rules_path = os.path.join(current_directory, 'Rules', 'Movement_Rules.csv')
+        Recurring_rules_path = os.path.join(current_directory, 'Rules', 'Recurring_Rules.csv')
+        with profile_stage(Profile, 'rule_compilation'):
+            Rule_table = load_rules(Rules_path, Recurring_rules_path)
+
+        # Tag every movement with its (Category, Subcategory) in a single pass, then sum them by month
+        with profile_stage(Profile, 'categorization') as stage:
+            Movements_df = categorize_movements(Movements_df, Rule_table)
+            stage['rows'] = len(Movements_df)
+
+        # Replace the stored copy of these movements
+        if (Options.store):
+            with profile_stage(Profile, 'store_writing') as stage:
+                stage['rows'] = store_movements(Store, Movements_df)
+
+    if (not Options.from_history):
+        with profile_stage(Profile, 'aggregation') as stage:
+            if (Options.accounts):
+                Movements_df, Monthly_df = consolidate_accounts(Account_results, Transfers_df)
+            elif (Options.store):
+                Monthly_df = store_monthly_totals(Store, Options.start, Options.end)
+            else:
+                Monthly_df = monthly_totals(Movements_df)
+            stage['rows'] = len(Movements_df)
+
+    if (Store is not None):
+        Store.close()
+
+    # Replace the history, a report reading the previous one keeps its copy
+    if (Options.history and not Options.from_history):
+        with profile_stage(Profile, 'history_writing') as stage:
+            stage['rows'] = write_history(Movements_df, Monthly_df, os.path.join(Output_path, 'History'))
+
+    # Movements of each month, for the per month metrics
+    Month_rows = {}
+    if (Options.profile and not Movements_df.empty):
+        Months, Starts, Stops = month_bounds(Movements_df)
+        Month_rows = dict(zip(Months, Stops - Starts))
+
+    # List payments repeated every month that no rule tracks yet
+    if (Options.detect_recurring):
+        with profile_stage(Profile, 'recurring_detection') as stage:
+            Recurring_df = detect_recurring_payments(Movements_df)
+            if (Options.exact):
+                Recurring_df['IMPORTE (€)'] = from_cents(Recurring_df['IMPORTE (€)'])
+            stage['rows'] = len(Movements_df)
+        print_recurring_report(Recurring_df)
+
+    # Spending over any other window, out of the running sum of each category
+    if (Options.windows):
+        with profile_stage(Profile, 'window_queries') as stage:
+            Windows_df = spending_windows(Movements_df, Options.windows, Options.window_days)
+            Windows_df.to_excel(os.path.join(Output_path, f'Spending_{Options.windows}.xlsx'))
+            stage['rows'] = len(Windows_df)
+
+    # Closed months are kept as they were tracked
+    Monthly_df = merge_tracked_output(Tracked_df, Monthly_df)
+
+    # Sort and store results
+    Output_dic = build_output_dic(Monthly_df)
+    Output_df = pd.DataFrame.from_dict(Output_dic)
 
-    # Fill between each line
-    for i in range(0, len(Balances)-1):
+    # Months ahead, drawn out of the tracked ones
+    if (Options.project and not Output_df.empty):
+        with profile_stage(Profile, 'projection') as stage:
+            Projection_df = project_budget(Output_dic, Options.horizon, Options.paths)
+            Projection_df.to_excel(os.path.join(Output_path, 'Projection.xlsx'))
+            stage['rows'] = Options.paths
+        print_projection_report(Projection_df)
+
+    # Labels and colors of the charts, building them is what imports matplotlib
+    if (Options.pie or Options.time_chart or Options.render):
+        labels_curated, colors = build_palette(Output_df.columns)
+
+    # Iterate through each month to visualize it
+    for index, month_key in enumerate(Monthly_df.index):
+        month, year = month_key.month, month_key.year
+        Month_start = time.perf_counter()
+
+        # Read back this month's values
+        Eating_Out_Work = Output_dic[("Eating Out Work", "/")][index]
+        Uber_Trip = Output_dic[("Uber To Work", "/")][index]
+        Uber_Eats = Output_dic[("Recreational", "Uber Eats")][index]
+        Restaurants_Bars = Output_dic[("Recreational", "Bars And Restaurants")][index]
+        Bizum = Output_dic[("Recreational", "Bizum")][index]
+        Bazar = Output_dic[("Recreational", "Bazar")][index]
+        Clothing = Output_dic[("Recreational", "Clothing")][index]
+        Concerts_Movies = Output_dic[("Recreational", "Concerts And Movies")][index]
+        Psychologist = Output_dic[("Subscriptions", "Psychologist")][index]
+        Dystopia = Output_dic[("Subscriptions", "Dystopia")][index]
+        ChatGPT = Output_dic[("Subscriptions", "ChatGPT")][index]
+        Gym = Output_dic[("Subscriptions", "Gym")][index]
+        Public_Transport = Output_dic[("Subscriptions", "Public Transport")][index]
+        Health = Output_dic[("Health", "/")][index]
+        Withdrawals = Output_dic[("Unaccounted", "Withdrawals")][index]
+        Expenses_Unaccounted = Output_dic[("Unaccounted", "Unknown")][index]
+        Salary = Output_dic[("Income", "Salary")][index]
+        Bizum_received = Output_dic[("Income", "Bizums")][index]
+        Balance = Output_dic[("Balance", "/")][index]
+        Expenses_Total = Balance - Salary - Bizum_received
+
+
+        ############################################# Visualize results #############################################
+
+        # Print into cmd
+        if (Options.print_to_cmd):
+            print(f'\n\n*************************************\n        ACCUMULATED EXPENSES\n')
+            print(f'              {month}/{year}\n*************************************\n')
+            print(f'    * Savings:  {0:.2f} €')
+            print(f'    * Eating out (Work):  {Eating_Out_Work:.2f} €')
+            print(f'    * Uber Trips:  {Uber_Trip:.2f} €')
+            print(f'    * Uber Eats:  {Uber_Eats:.2f} €')
+            print(f'    * Bars and Restaurants:  {Restaurants_Bars:.2f} €')
+            print(f'    * Bizum:  {Bizum:.2f} €')
+            print(f'    * Bazar:  {Bazar:.2f} €')
+            print(f'    * Clothing:  {Clothing:.2f} €')
+            print(f'    * Concerts and movies:  {Concerts_Movies:.2f} €')
+            print(f'    * Psychologist:  {Psychologist:.2f} €')
+            print(f'    * Dystopia:  {Dystopia:.2f} €')
+            print(f'    * ChatGPT:  {ChatGPT:.2f} €')
+            print(f'    * Gym:  {Gym:.2f} €')
+            print(f'    * Health:  {Health:.2f} €')
+            print(f'    * Public Transport:  {Public_Transport:.2f} €')
+            print(f'    * Withdrawals:  {Withdrawals:.2f} €')
+            print(f'\n--------------------------------------\n')
+            print(f'    * Total sum:  {Expenses_Total:.2f} €')
+            print(f'    * Balance:  {Balance:.2f} €')
+            print(f'\n--------------------------------------\n')
+            print(f'    * Unaccounted movements:  {Expenses_Unaccounted:.2f} €')
+            print(f'\n*************************************\n\n')
+
+        # Create a pie chart
+        if (Options.pie):
+            Figure = plot_month_pie(Output_df.iloc[index].tolist(), labels_curated, colors, month, year)
+
+            # Charts that won't be displayed are freed as soon as they are drawn
+            if (not Options.show):
+                close_charts(Figure)
+
+        record_month(Profile, month_key, Month_rows.get(month_key, 0), time.perf_counter() - Month_start)
+
+
+
+    # Write compiled data into the Output excel sheet
+    if (Options.excel):
+        with profile_stage(Profile, 'output_writing') as stage:
+            export_output(Output_df, Output_path, 'xlsx')
+            stage['rows'] = len(Output_df)
+
+    # Same table in the other formats
+    for Format in Options.export:
+        with profile_stage(Profile, f'{Format}_export') as stage:
+            export_output(Output_df, Output_path, Format)
+            stage['rows'] = len(Output_df)
+
+
+    # Create a graph showing evolution of explenses over time
+    if (Options.time_chart):
+        with profile_stage(Profile, 'expenses_vs_time_chart') as stage:
+            plot_expenses_vs_time(Output_dic, labels_curated, colors, Options.chart_resolution, Options.chart_points)
+            stage['rows'] = len(Output_df)
+
+    # Write every chart into image files
+    if (Options.render):
+        with profile_stage(Profile, 'chart_rendering') as stage:
+            render_charts(Output_dic, os.path.join(Output_path, 'Charts'), Format=Options.chart_format,
+                          Workers=Options.render_workers, Palette=(labels_curated, colors),
+                          Resolution=Options.chart_resolution, Max_points=Options.chart_points)
+            stage['rows'] = len(Output_df)
+
+    # Report before showing the plots, the run is over by then
+    write_profile(Profile, os.path.join(Output_path, 'Profile.json'))
+
+    # Display the plot, batch jobs skip it and exit without a display
+    if (Options.pie or Options.time_chart):
+        if (Options.show):
+            show_charts()
+        else:
+            close_charts()
 
-        # Dates are shared as a horizontal axis for all curves
-        plt.fill_between( dates , Balances[i], Balances[i+1], color=colors[i], label=labels_curated[i])
 
-    plt.xticks(dates)
-    plt.xlabel('Months')
-    plt.ylabel('Balance [€]')
-    plt.legend()
 
-# Display the plot
-plt.show()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+'''
+Memory-mapped history
+
+The categorized movements and the monthly totals of a run can be kept in "Output/History" as Arrow IPC
+files. They are written uncompressed and in a single record batch, so later runs and separate reporting
+processes open them with a memory map instead of parsing statements: numeric and date columns are read in
+place, without being copied, and every process reading the history shares the same page cached copy of it.
+
+Months are stored as the timestamp of their first day, Arrow files written by pandas can't be read back as
+periods by a process that hasn't converted any period itself. Files are replaced atomically: a process that
+has the history mapped keeps reading the version it opened while a new run writes the next one.
+Needs pyarrow.
+'''
+
+import os
+import importlib.util
+
+import pandas as pd
+
+from Money import amounts_to_cents, from_cents, is_exact, Money_columns
+from Statement_Cache import write_atomically
+from Categorizer import month_range
+
+
+
+############################################### Variables ###############################################
+
+# File of each table in the history folder
+History_files = {'Movements': 'Movements.arrow', 'Monthly': 'Monthly.arrow'}
+
+
+########################################## Function definitions ##########################################
+
+def require_pyarrow ():
+
+    """
+    This function raises a readable error when pyarrow isn't installed.
+    """
+
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError('The history is stored as Arrow IPC and needs pyarrow, install it with "pip install pyarrow"')
+
+
+
+def write_table (Table_df, Table_path):
+
+    """
+    This function writes a dataframe into an Arrow IPC file, replacing the previous one atomically.
+
+    Parameters
+    ----------
+    Table_df : dataframe
+    Table_path : str
+    """
+
+    import pyarrow as pa
+
+    # A single record batch, columns with several chunks would have to be copied to be read back
+    Table = pa.Table.from_pandas(Table_df, preserve_index=True)
+
+    def write (Temporary_path):
+        with pa.OSFile(Temporary_path, 'wb') as sink, pa.ipc.new_file(sink, Table.schema) as writer:
+            writer.write_table(Table, max_chunksize=max(Table.num_rows, 1))
+
+    # Temporary files are named after the process, concurrent writers (the watcher and a manual run) never
+    # write into the same one
+    write_atomically(Table_path, write)
+
+
+
+def write_history (Movements_df, Monthly_df, History_path):
+
+    """
+    This function keeps the categorized movements and the monthly totals of a run in the history folder.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Categorized movements, newest first. Amounts in exact mode are written in euros
+    Monthly_df : dataframe
+        Monthly totals, see Categorizer.monthly_totals()
+    History_path : str
+        History folder, created if needed
+
+    Returns
+    -------
+    int
+        Movements written
+    """
+
+    require_pyarrow()
+    os.makedirs(History_path, exist_ok=True)
+
+    # The history is read by other tools too, it is always kept in euros
+    if is_exact(Movements_df):
+        Movements_df = Movements_df.assign(**{column: from_cents(Movements_df[column].to_numpy()) for column in Money_columns})
+
+    # The month of each movement is derived from its value date when reading
+    write_table(Movements_df.drop(columns='Month').reset_index(drop=True), os.path.join(History_path, History_files['Movements']))
+    write_table(Monthly_df.set_axis(Monthly_df.index.to_timestamp()), os.path.join(History_path, History_files['Monthly']))
+
+    return len(Movements_df)
+
+
+
+def open_history (History_path):
+
+    """
+    This function maps the history into memory, nothing is read from disk until it is accessed.
+
+    Parameters
+    ----------
+    History_path : str
+        History folder
+
+    Returns
+    -------
+    dict
+        {'Movements': Table, 'Monthly': Table}, pyarrow tables backed by the memory maps
+    """
+
+    require_pyarrow()
+    import pyarrow as pa
+
+    Tables = {}
+    for name, file_name in History_files.items():
+        Table_path = os.path.join(History_path, file_name)
+        if not os.path.isfile(Table_path):
+            raise FileNotFoundError(f'No history found in {History_path}, write it first with --history')
+
+        Tables[name] = pa.ipc.open_file(pa.memory_map(Table_path, 'r')).read_all()
+
+    return Tables
+
+
+
+def load_history (History_path, Start=None, End=None, Exact=False):
+
+    """
+    This function reads the history back into dataframes. Numeric and date columns stay in the memory map,
+    they are read only and aren't copied unless they are modified.
+
+    Parameters
+    ----------
+    History_path : str
+        History folder
+    Start, End : str
+        First and last value dates, 'YYYY-MM-DD'. Movements and monthly totals are read for every month the
+        range touches, whole, see Categorizer.month_range(). None leaves that side open
+    Exact : Bool
+        Return amounts and balances as integer cents instead of euros, this copies those two columns
+
+    Returns
+    -------
+    dataframe
+        Movements in the layout of Categorizer.categorize_movements(), newest first
+    dataframe
+        Monthly totals in the layout of Categorizer.monthly_totals()
+    """
+
+    Tables = open_history(History_path)
+
+    # One block per column, so that each of them is a view on the map
+    Movements_df = Tables['Movements'].to_pandas(split_blocks=True)
+    Monthly_df = Tables['Monthly'].to_pandas(split_blocks=True)
+
+    Movements_df['Month'] = Movements_df['F. VALOR'].dt.to_period('M')
+    Monthly_df.index = Monthly_df.index.to_period('M')
+
+    # Movements are sorted by date, a range is a slice of them
+    if (Start is not None or End is not None):
+        First_day, Last_day = month_range(Start, End)
+        Dates = Movements_df['F. VALOR'].to_numpy()[::-1]
+        First = Dates.searchsorted(First_day.to_datetime64(), 'left') if First_day is not None else 0
+        Last = Dates.searchsorted(Last_day.to_datetime64(), 'right') if Last_day is not None else len(Dates)
+        Movements_df = Movements_df.iloc[len(Dates) - Last:len(Dates) - First]
+
+        Monthly_df = Monthly_df.loc[pd.Period(Start, 'M') if Start is not None else None:
+                                    pd.Period(End, 'M') if End is not None else None]
+
+    if (Exact):
+        Movements_df = amounts_to_cents(Movements_df)
+
+    return Movements_df.reset_index(drop=True), Monthly_df
@@ -0,0 +1,110 @@
+'''
+Exact money mode
+
+Amounts and balances are read as floats, which can't represent most cent values exactly: matching a payment
+by its exact amount relies on float equality and sums slowly drift. In exact mode 'IMPORTE (€)' and
+'SALDO (€)' hold integer cents (int64) instead, every aggregation is done in integer arithmetic and values are
+only converted back into euros when the monthly totals are produced.
+'''
+
+import numpy as np
+import pandas as pd
+
+
+
+############################################### Variables ###############################################
+
+Cents_per_euro = 100
+
+Money_columns = ['IMPORTE (€)', 'SALDO (€)']
+
+
+########################################## Function definitions ##########################################
+
+def to_cents (Euros):
+
+    """
+    This function converts amounts in euros into integer cents, rounding to the nearest cent.
+
+    Parameters
+    ----------
+    Euros : float, list or array
+
+    Returns
+    -------
+    int64 or ndarray int64
+    """
+
+    Cents = np.rint(np.asarray(Euros, dtype=float) * Cents_per_euro).astype(np.int64)
+
+    if Cents.ndim == 0:
+        return Cents.item()
+
+    return Cents
+
+
+
+def from_cents (Cents):
+
+    """
+    This function converts integer cents back into euros.
+
+    Parameters
+    ----------
+    Cents : int, array or series
+
+    Returns
+    -------
+    float, array or series
+    """
+
+    return Cents / Cents_per_euro
+
+
+
+def amounts_to_cents (Movements_df):
+
+    """
+    This function switches a dataframe of movements into exact mode.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements with amounts and balances in euros
+
+    Returns
+    -------
+    dataframe
+        Movements_df with amounts and balances in int64 cents. The other columns are shared with
+        Movements_df, not copied
+    """
+
+    # Only the money columns are replaced, the others keep pointing at the same data
+    Movements_df = Movements_df.copy(deep=False)
+
+    for column in Money_columns:
+        if Movements_df[column].isna().any():
+            raise ValueError(f'Column "{column}" has empty values, they can\'t be stored as cents')
+
+        Movements_df[column] = to_cents(Movements_df[column].to_numpy())
+
+    return Movements_df
+
+
+
+def is_exact (Movements_df):
+
+    """
+    This function checks wether a dataframe of movements is in exact mode.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+
+    Returns
+    -------
+    Bool
+        True if amounts are stored as integer cents.
+    """
+
+    return pd.api.types.is_integer_dtype(Movements_df['IMPORTE (€)'])
@@ -0,0 +1,218 @@
+'''
+Multi-pattern matching of statement concepts
+
+Merchants show up with many spellings ("Pago en LA ESTACION DE MAJADAHONDMAJADAHONDA ES", "Pago en LA
+ESTACION DE MAJADAHONDA ES"...), so besides exact concepts the rule table accepts patterns: a prefix, a
+substring, or the whole concept compared without case nor accents.
+
+Every pattern of a column is compiled into a single Aho-Corasick automaton, which finds all the patterns a
+text contains in one pass over it, no matter how many patterns there are. Texts are normalized (case and
+accents folded, whitespace collapsed) before matching, and the result of each distinct text is memoized so
+that a concept repeated over millions of movements is only matched once.
+'''
+
+import unicodedata
+from collections import deque
+
+
+
+############################################### Variables ###############################################
+
+# Ways a rule can match a concept. 'exact' compares strings as they are stated, every other kind compares
+# normalized strings
+Match_kinds = ['exact', 'normalized', 'prefix', 'substring']
+
+
+########################################## Function definitions ##########################################
+
+def normalize_text (Text):
+
+    """
+    This function folds case and accents and collapses whitespace, so that "Cafeterías  y Restaurantes"
+    and "cafeterias y restaurantes" compare equal.
+
+    Parameters
+    ----------
+    Text : str
+
+    Returns
+    -------
+    str
+    """
+
+    Decomposed = unicodedata.normalize('NFKD', str(Text))
+    Stripped = ''.join(char for char in Decomposed if not unicodedata.combining(char))
+
+    return ' '.join(Stripped.casefold().split())
+
+
+
+def build_automaton (Patterns):
+
+    """
+    This function compiles patterns into an Aho-Corasick automaton: a trie of the patterns where every
+    node also links to the longest suffix of it that is a node too, to carry on matching after a mismatch
+    without going back over the text.
+
+    Parameters
+    ----------
+    Patterns : list str
+        Non empty patterns, matched as they are
+
+    Returns
+    -------
+    dict
+        {'Goto': transitions of each node, 'Fail': suffix link of each node,
+         'Output': patterns ending at each node, 'Lengths': length of each pattern}
+    """
+
+    Goto = [{}]
+    Output = [[]]
+
+    # Trie of the patterns
+    for pattern_id, pattern in enumerate(Patterns):
+        if not pattern:
+            raise ValueError('Patterns can\'t be empty')
+
+        state = 0
+        for char in pattern:
+            if char not in Goto[state]:
+                Goto[state][char] = len(Goto)
+                Goto.append({})
+                Output.append([])
+            state = Goto[state][char]
+
+        Output[state].append(pattern_id)
+
+    # Suffix links, breadth first so that shorter nodes are linked before longer ones
+    Fail = [0] * len(Goto)
+    Queue = deque(Goto[0].values())
+
+    while Queue:
+        state = Queue.popleft()
+
+        for char, next_state in Goto[state].items():
+            Queue.append(next_state)
+
+            fallback = Fail[state]
+            while fallback and char not in Goto[fallback]:
+                fallback = Fail[fallback]
+
+            Fail[next_state] = Goto[fallback].get(char, 0)
+            Output[next_state] = Output[next_state] + Output[Fail[next_state]]
+
+    return {'Goto': Goto, 'Fail': Fail, 'Output': Output, 'Lengths': [len(pattern) for pattern in Patterns]}
+
+
+
+def find_patterns (Automaton, Text):
+
+    """
+    This function finds every occurrence of the patterns of an automaton in a text.
+
+    Parameters
+    ----------
+    Automaton : dict
+        Automaton returned by build_automaton()
+    Text : str
+
+    Returns
+    -------
+    list tuples
+        [(pattern index, start position)]
+    """
+
+    Goto, Fail, Output, Lengths = Automaton['Goto'], Automaton['Fail'], Automaton['Output'], Automaton['Lengths']
+
+    Found = []
+    state = 0
+    for position, char in enumerate(Text):
+
+        while state and char not in Goto[state]:
+            state = Fail[state]
+        state = Goto[state].get(char, 0)
+
+        for pattern_id in Output[state]:
+            Found.append((pattern_id, position - Lengths[pattern_id] + 1))
+
+    return Found
+
+
+
+def compile_pattern_rules (Pattern_rules):
+
+    """
+    This function compiles the pattern rules of a column into an automaton.
+
+    Parameters
+    ----------
+    Pattern_rules : list tuples
+        [(match kind, concept, sign, target index)] in table order, sign being '-', '+' or '' for both
+
+    Returns
+    -------
+    dict
+        {'Automaton': automaton of the normalized concepts, 'Rules': [(order, match kind, sign, target index)]
+         for each pattern, 'Memo': {text: (payment target, income target)}}
+    """
+
+    Pattern_ids = {}
+    Rules = []
+
+    for order, (kind, concept, sign, target) in enumerate(Pattern_rules):
+        pattern = normalize_text(concept)
+
+        if pattern not in Pattern_ids:
+            Pattern_ids[pattern] = len(Rules)
+            Rules.append([])
+
+        Rules[Pattern_ids[pattern]].append((order, kind, sign, target))
+
+    return {'Automaton': build_automaton(list(Pattern_ids)), 'Rules': Rules, 'Memo': {}}
+
+
+
+def match_pattern_rules (Compiled_patterns, Text):
+
+    """
+    This function finds the pattern rule a text matches, for payments and for incomes. When several rules
+    match, the first one in the table wins.
+
+    Parameters
+    ----------
+    Compiled_patterns : dict
+        Pattern rules returned by compile_pattern_rules()
+    Text : str
+
+    Returns
+    -------
+    tuple int
+        (target of a payment, target of an income), -1 when no rule matches
+    """
+
+    Memo = Compiled_patterns['Memo']
+    if Text in Memo:
+        return Memo[Text]
+
+    Normalized = normalize_text(Text)
+    Best = {'-': None, '+': None}
+
+    for pattern_id, start in find_patterns(Compiled_patterns['Automaton'], Normalized):
+        length = Compiled_patterns['Automaton']['Lengths'][pattern_id]
+
+        for order, kind, sign, target in Compiled_patterns['Rules'][pattern_id]:
+
+            # Substrings match anywhere, prefixes at the start and normalized concepts the whole text
+            if (kind == 'prefix' and start != 0):
+                continue
+            if (kind == 'normalized' and (start != 0 or length != len(Normalized))):
+                continue
+
+            for rule_sign in ('-', '+'):
+                if (sign in (rule_sign, '') and (Best[rule_sign] is None or order < Best[rule_sign][0])):
+                    Best[rule_sign] = (order, target)
+
+    Result = tuple(-1 if Best[sign] is None else Best[sign][1] for sign in ('-', '+'))
+    Memo[Text] = Result
+
+    return Result
@@ -0,0 +1,604 @@
+'''
+Charts of the tracked expenses: a donut chart with the distribution of each month's expenses and a chart
+showing the evolution of expenses over time.
+
+matplotlib takes a while to import, so it is only imported once a chart is actually drawn.
+
+Charts can also be rendered into image files instead of being shown, in a pool of processes drawing with
+the non interactive Agg backend, to produce the archive of every month in one go.
+
+The expenses vs time chart draws a bounded number of points whatever the length of the history: months are
+averaged into quarters or years, or thinned out with Largest-Triangle-Three-Buckets (LTTB) downsampling,
+which keeps the points that shape the curves.
+'''
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+
+############################################### Variables ###############################################
+
+# Resolutions of the expenses vs time chart. 'auto' picks the finest of month, quarter and year that fits in
+# the points allowed, 'lttb' downsamples the months. Any level still above the points allowed is downsampled
+Time_resolutions = ['auto', 'month', 'quarter', 'year', 'lttb']
+
+# Points drawn at most by the expenses vs time chart
+Max_time_points = 120
+
+# Below this many points every one of them gets a tick
+Max_time_ticks = 24
+
+# Balance objective of each month: +200€ savings +350€ rents +100€ dinner at home
+Balance_objective = 200 + 350 + 100
+
+
+########################################## Function definitions ##########################################
+
+def build_palette (Columns):
+
+    """
+    This function builds the labels and colors of the charts out of the tracked columns. Every category
+    gets its own gradient and each of its subcategories a shade of it.
+
+    Parameters
+    ----------
+    Columns : list tuples
+        (Category, Subcategory) headers of the tracked output, dates first and the four computed
+        values (incomes, sum and balance) last
+
+    Returns
+    -------
+    list str
+        Label of each charted column
+    ndarray
+        RGBA color of each charted column
+    """
+
+    import matplotlib.pyplot as plt
+
+    # This chart shouldn't show computed values like dates, Incomes, Computations, etc...
+    labels = list(Columns)[1:-4]
+
+    # Labels come from a multindex tuple and therefore look like this ("Category", "Subcategory"),
+    # for aesthetic purposes only subcategories are shown, if there are no subcategories the category is shown
+    labels_curated = []
+
+    for header in labels:
+
+        if (header[1] == "/"):
+            labels_curated.append(header[0])
+
+        else:
+            labels_curated.append(header[1])
+
+    ########################################## Construct colormap by categories ##########################################
+
+    # Construct color maps for each 'Category' of tracked data
+    # The "colormap" argument in pie() takes an ndarray indicating color.
+    # We want to use a specific gradient for each category, thus we compile a list counting how many subcategories per
+    # category
+    subcat_count = np.empty(0)
+    count = 1
+    previous_cat = "start"
+
+    # 'labels' is a list storing tuples, It's first element contains a columns category. To count how many subcategories
+    # are per category we iterate over the list and count how many times every category is repeated, check "Tracking_dic" structure
+    for index in range(0, len(labels)):
+
+        # Reads the category header at the current index
+        current_cat = labels[index][0]
+
+        # At the start we can't compare categories and thus simply start the counter
+        if (previous_cat == "start"):
+            count = 1
+            previous_cat = current_cat
+
+        # If we find a successive category we add it to the count
+        elif (current_cat == previous_cat):
+            count += 1
+            previous_cat = current_cat
+
+        # If we find a different category we log the amount of subcategories
+        elif (current_cat != previous_cat):
+            subcat_count = np.append(subcat_count, count)
+            previous_cat = current_cat
+            count = 1
+
+    # Since logging counts is done upon comparison at the second step we need one last log at the end
+    # (I need to test if this hack works for all cases)
+    subcat_count = np.append(subcat_count, count)
+
+
+    # A handpicked list of 'sequential' colormaps that don't clash with pie slice neighbours
+    cmap_1 = plt.get_cmap('Oranges')
+    cmap_2 = plt.get_cmap('Blues')
+    cmap_3 = plt.get_cmap('Reds')
+    cmap_4 = plt.get_cmap('Greens')
+    cmap_5 = plt.get_cmap('Purples')
+    cmap_6 = plt.get_cmap('Reds')
+    cmap_7 = plt.get_cmap('Greys')
+    cmaps = [cmap_1, cmap_2, cmap_3, cmap_4, cmap_5, cmap_6, cmap_7]
+
+
+    # For each category create a set of colors in the same gradients
+    # Create as many colors are there are subcategories
+    colors = np.empty([1, 4])
+    for i in range(0, len(subcat_count)):
+
+        # Get cmap object from list of cmaps and create an ndarray storing
+        # colors for each "slice" representing the subcategories in the category
+        cmap = cmaps[i]
+        color = cmap( np.linspace(0.2, 0.7, int(subcat_count[i])) )
+
+        # Deal with starting case when there's nothing to stack
+        if (i==0):
+            # Store first colormap
+            colors = color
+
+        # Continue as normal for the rest of indexes
+        else:
+            # Concatenate both arrays
+            colors = np.vstack((colors, color))
+
+    return labels_curated, colors
+
+
+
+def plot_month_pie (Row, labels_curated, colors, month, year):
+
+    """
+    This function draws the donut chart with the distribution of one month's expenses.
+
+    Parameters
+    ----------
+    Row : list
+        Values of the tracked output for the month, in column order
+    labels_curated, colors :
+        Palette returned by build_palette()
+    month, year : int
+
+    Returns
+    -------
+    Figure
+    """
+
+    import matplotlib.pyplot as plt
+
+    # This chart shouldn't show computed values like dates, incomes, Balance, Total sum, etc...
+    sizes = list(Row)[1:-4]
+
+    # Pie chart can't take negative values
+    for i in range(0, len(sizes)):
+        sizes[i] = abs(sizes[i])
+
+    fig, ax = plt.subplots()
+
+    # Explode wedges that are small enough, so that their labes don't clash with each other
+    explode_wedges = []
+    for size in sizes:
+        if (size != 0):
+            explode_wedges.append( 10 / size )
+
+        else:
+            explode_wedges.append(0)
+
+    ax.pie(sizes, labels=labels_curated, colors=colors, autopct='%1.1f%%', shadow=False, pctdistance=0.6, labeldistance=1.1, explode=explode_wedges)
+
+    # Add a circle in the center to make a 'donut' instead of a 'pie'
+    my_circle=plt.Circle( (0,0), 0.75, color='white')
+    ax.add_artist(my_circle)
+
+    ax.set_title(label = f'Expenses distribution\nMonth : {month}/{year}')
+
+    return fig
+
+
+
+def stack_expenses (Output_dic):
+
+    """
+    This function stacks the expenses of every category downwards from the incomes, all of them at once.
+
+    Parameters
+    ----------
+    Output_dic : dict
+        {(Category, Subcategory): [values]} with one value per month
+
+    Returns
+    -------
+    ndarray datetime64
+        Date of each month
+    ndarray
+        Curves of the chart, one row per curve and one column per month: the incomes first, then the incomes
+        minus the expenses of every category up to each one
+    """
+
+    Columns = list(Output_dic.keys())
+    Dates = pd.to_datetime(pd.Series(Output_dic[("Month", "/")])).to_numpy()
+
+    # Skip dates, incomes, sum and balance
+    Expenses = np.array([Output_dic[column] for column in Columns[1:-4]], dtype=float).reshape(-1, len(Dates))
+    Income = np.asarray(Output_dic[("Income", "Salary")], dtype=float) + np.asarray(Output_dic[("Income", "Bizums")], dtype=float)
+
+    # Expenses are negative, each curve lies below the previous one
+    Curves = np.vstack((Income, Expenses))
+    np.cumsum(Curves, axis=0, out=Curves)
+
+    return Dates, Curves
+
+
+
+def aggregate_curves (Dates, Curves, Level):
+
+    """
+    This function averages the months of each quarter or year, so that values stay monthly amounts.
+
+    Parameters
+    ----------
+    Dates : ndarray datetime64
+    Curves : ndarray
+        One row per curve and one column per date
+    Level : str
+        'quarter' or 'year'
+
+    Returns
+    -------
+    ndarray datetime64
+        Last date of each quarter or year
+    ndarray
+        Averaged curves
+    """
+
+    Periods = pd.PeriodIndex(Dates, freq='Q' if Level == 'quarter' else 'Y').asi8
+
+    Starts = np.flatnonzero(np.r_[True, Periods[1:] != Periods[:-1]])
+    Counts = np.diff(np.r_[Starts, len(Periods)])
+
+    return Dates[Starts + Counts - 1], np.add.reduceat(Curves, Starts, axis=1) / Counts
+
+
+
+def lttb_indices (X, Curves, Points):
+
+    """
+    This function picks the points to keep with Largest-Triangle-Three-Buckets: the first and last points
+    are kept, the rest are split into buckets and from each one the point forming the largest triangle with
+    the point kept before and the average of the next bucket is kept. Curves are stacked, so the area of the
+    triangles is summed over every curve and the same points are kept for all of them.
+
+    Parameters
+    ----------
+    X : ndarray
+        Horizontal coordinate of each point, increasing
+    Curves : ndarray
+        One row per curve and one column per point
+    Points : int
+        Points to keep, at least 3
+
+    Returns
+    -------
+    ndarray int
+        Positions of the points kept
+    """
+
+    Length = len(X)
+    if (Points >= Length or Points < 3):
+        return np.arange(Length)
+
+    Edges = np.linspace(1, Length - 1, Points - 1).astype(np.int64)
+
+    Kept = np.empty(Points, dtype=np.int64)
+    Kept[0], Kept[-1] = 0, Length - 1
+
+    for bucket in range(Points - 2):
+        Start, Stop = Edges[bucket], Edges[bucket + 1]
+        Next_stop = Edges[bucket + 2] if bucket + 2 < len(Edges) else Length
+
+        # Average of the next bucket, the last point for the last bucket
+        Next_x = X[Stop:Next_stop].mean()
+        Next_y = Curves[:, Stop:Next_stop].mean(axis=1, keepdims=True)
+
+        Previous = Kept[bucket]
+        Areas = np.abs((X[Previous] - Next_x) * (Curves[:, Start:Stop] - Curves[:, [Previous]])
+                       - (X[Previous] - X[Start:Stop]) * (Next_y - Curves[:, [Previous]])).sum(axis=0)
+
+        Kept[bucket + 1] = Start + np.argmax(Areas)
+
+    return Kept
+
+
+
+def downsample_curves (Dates, Curves, Resolution='auto', Max_points=Max_time_points):
+
+    """
+    This function brings the curves of the expenses vs time chart down to a resolution.
+
+    Parameters
+    ----------
+    Dates : ndarray datetime64
+        Date of each month
+    Curves : ndarray
+        Curves returned by stack_expenses()
+    Resolution : str
+        One of the 'Time_resolutions'
+    Max_points : int
+        Points kept at most, whatever the resolution
+
+    Returns
+    -------
+    ndarray datetime64
+    ndarray
+        Curves at the resolution
+    str
+        Level of each point: 'Months', 'Quarters' or 'Years'
+    """
+
+    if Resolution not in Time_resolutions:
+        raise ValueError(f'Unknown resolution "{Resolution}", expected one of {Time_resolutions}')
+
+    Level = Resolution
+    if (Resolution == 'auto'):
+        Months = len(pd.PeriodIndex(Dates, freq='M').unique())
+        Level = 'month' if Months <= Max_points else 'quarter' if Months <= 3 * Max_points else 'year'
+
+    if (Level in ('quarter', 'year')):
+        Dates, Curves = aggregate_curves(Dates, Curves, Level)
+
+    # Whatever is left above the limit is thinned out
+    Kept = lttb_indices(Dates.astype('datetime64[D]').astype(np.int64), Curves, Max_points)
+
+    return Dates[Kept], Curves[:, Kept], {'quarter': 'Quarters', 'year': 'Years'}.get(Level, 'Months')
+
+
+
+def plot_expenses_vs_time (Output_dic, labels_curated, colors, Resolution='auto', Max_points=Max_time_points):
+
+    """
+    This function draws the evolution of expenses over time: incomes on top and the expenses of every
+    category stacked downwards from them, to show the progressive drain of income.
+
+    Parameters
+    ----------
+    Output_dic : dict
+        {(Category, Subcategory): [values]} with one value per month
+    labels_curated, colors :
+        Palette returned by build_palette()
+    Resolution, Max_points :
+        See downsample_curves()
+
+    Returns
+    -------
+    Figure
+    """
+
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+
+    # Start to fill from the income line downwards to signify the progressive drain of income
+    dates, Balances = stack_expenses(Output_dic)
+    dates, Balances, Level = downsample_curves(dates, Balances, Resolution, Max_points)
+
+    # Compare expanses to income
+    Income = Balances[0]
+    ax.plot(dates, Income, color='k', label="Income")
+
+    # Emphasize zero crossing
+    ax.axhline(0, color='red', alpha=0.5)
+
+    # Set a balance objective for +200€ savings +350€ rents +100€ dinner at home
+    ax.axhline(Balance_objective, color='blue', alpha=0.5)
+
+    # Fill between each line
+    for i in range(0, len(Balances)-1):
+
+        # Dates are shared as a horizontal axis for all curves
+        ax.fill_between( dates , Balances[i], Balances[i+1], color=colors[i], label=labels_curated[i])
+
+    # Long histories get the ticks matplotlib picks
+    if (len(dates) <= Max_time_ticks):
+        ax.set_xticks(dates)
+
+    ax.set_xlabel(Level)
+    ax.set_ylabel('Balance [€]' if Level == 'Months' else 'Balance [€ per month]')
+    ax.legend()
+
+    return fig
+
+
+
+def show_charts ():
+
+    """
+    This function displays every chart drawn so far, blocks until they are closed and frees them.
+    """
+
+    import matplotlib.pyplot as plt
+
+    plt.show()
+    plt.close('all')
+
+
+
+def close_charts (Figure='all'):
+
+    """
+    This function frees charts without displaying them.
+
+    Parameters
+    ----------
+    Figure : Figure
+        Chart to free, every chart drawn so far by default
+    """
+
+    import matplotlib.pyplot as plt
+
+    plt.close(Figure)
+
+
+
+def use_agg_backend ():
+
+    """
+    This function switches matplotlib to the Agg backend, which draws into memory and needs no display.
+    Switching closes every open figure, so charts drawn to be displayed keep the backend they were drawn
+    with.
+    """
+
+    import matplotlib
+
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    if pyplot is not None and pyplot.get_fignums():
+        return
+
+    matplotlib.use('Agg')
+
+
+
+def start_render_worker ():
+
+    """
+    This function is the initializer of the rendering processes.
+    """
+
+    import tracemalloc
+
+    use_agg_backend()
+
+    # Forked workers inherit the memory tracing of a profiled run, which slows drawing down a lot
+    # and isn't reported anyway
+    tracemalloc.stop()
+
+
+
+def save_month_pie (Task):
+
+    """
+    This function draws the donut chart of one month into an image file.
+
+    Parameters
+    ----------
+    Task : tuple
+        (Row, labels_curated, colors, month, year, path), see plot_month_pie()
+
+    Returns
+    -------
+    str
+        Path to the image
+    """
+
+    import matplotlib.pyplot as plt
+
+    Row, labels_curated, colors, month, year, Path = Task
+
+    fig = plot_month_pie(Row, labels_curated, colors, month, year)
+    fig.savefig(Path)
+    plt.close(fig)
+
+    return Path
+
+
+
+def save_expenses_vs_time (Task):
+
+    """
+    This function draws the evolution of expenses over time into an image file.
+
+    Parameters
+    ----------
+    Task : tuple
+        (Output_dic, labels_curated, colors, resolution, max points, path), see plot_expenses_vs_time()
+
+    Returns
+    -------
+    str
+        Path to the image
+    """
+
+    import matplotlib.pyplot as plt
+
+    Output_dic, labels_curated, colors, Resolution, Max_points, Path = Task
+
+    fig = plot_expenses_vs_time(Output_dic, labels_curated, colors, Resolution, Max_points)
+    fig.savefig(Path)
+    plt.close(fig)
+
+    return Path
+
+
+
+def render_charts (Output_dic, Folder_path, Format='png', Workers=None, Palette=None, Months=None, Resolution='auto',
+                   Max_points=Max_time_points):
+
+    """
+    This function renders the donut chart of every month and the expenses vs time chart into image files,
+    named "Expenses_<year>-<month>.<format>" and "Expenses_vs_time.<format>".
+
+    The palette is built once and shipped with every chart. Charts are drawn in a pool of processes with
+    the Agg backend, each process getting a batch of months at once to keep the messaging overhead low.
+
+    Parameters
+    ----------
+    Output_dic : dict
+        {(Category, Subcategory): [values]} with one value per month
+    Folder_path : str
+        Folder to write the images into, created if missing
+    Format : str
+        Image format understood by matplotlib: 'png', 'svg', 'pdf'...
+    Workers : int
+        Number of processes, defaults to one per core. 1 draws in this process
+    Palette : tuple
+        (labels_curated, colors) returned by build_palette(), built from Output_dic when missing
+    Months : collection of Period
+        Only render the donut charts of these months, None renders every month
+    Resolution, Max_points :
+        Resolution of the expenses vs time chart, see downsample_curves()
+
+    Returns
+    -------
+    list str
+        Paths to the images, months first
+    """
+
+    os.makedirs(Folder_path, exist_ok=True)
+
+    Columns = list(Output_dic.keys())
+    labels_curated, colors = Palette if Palette is not None else build_palette(Columns)
+
+    # One row of values per month, in column order like the rows of the output dataframe
+    Rows = [list(row) for row in zip(*Output_dic.values())]
+
+    Pie_tasks = []
+    for Row in Rows:
+        if (Months is not None and pd.Timestamp(Row[0]).to_period('M') not in Months):
+            continue
+
+        month, year = Row[0].month, Row[0].year
+        Path = os.path.join(Folder_path, f'Expenses_{year}-{month:02d}.{Format}')
+        Pie_tasks.append((Row, labels_curated, colors, month, year, Path))
+
+    Time_task = (Output_dic, labels_curated, colors, Resolution, Max_points, os.path.join(Folder_path, f'Expenses_vs_time.{Format}'))
+
+    Workers = min(Workers or os.cpu_count() or 1, len(Pie_tasks) + 1)
+
+    # Spawning processes isn't worth it for a handful of charts
+    if (len(Pie_tasks) < 2 or Workers == 1):
+        use_agg_backend()
+        Paths = [save_month_pie(task) for task in Pie_tasks]
+        Paths.append(save_expenses_vs_time(Time_task))
+
+    else:
+        Chunksize = max(len(Pie_tasks) // (Workers * 4), 1)
+
+        with ProcessPoolExecutor(max_workers=Workers, initializer=start_render_worker) as executor:
+            # The time chart is the slowest one, start it first
+            Time_future = executor.submit(save_expenses_vs_time, Time_task)
+            Paths = list(executor.map(save_month_pie, Pie_tasks, chunksize=Chunksize))
+            Paths.append(Time_future.result())
+
+    return Paths
@@ -0,0 +1,188 @@
+'''
+Stage level profiling of a run
+
+In profile mode every stage of the pipeline records its wall time, the rows it processed and its peak memory,
+and every month its rows and the time spent visualizing it. The report is written as .json so that runs can be
+compared across releases, and the hot path can also be dumped with cProfile for a function level view.
+
+Peak memory is measured with tracemalloc, which slows the run down a bit, so it is only on in profile mode.
+It only sees this process: statements parsed by the ingestion workers count once their frames come back.
+Stages must not be nested, each one resets the traced peak.
+'''
+
+import os
+import json
+import time
+import cProfile
+import platform
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+
+
+########################################## Function definitions ##########################################
+
+def new_profile (Enabled, cProfile_path=None):
+
+    """
+    This function creates the record of a run.
+
+    Parameters
+    ----------
+    Enabled : Bool
+        Record metrics, when False every profiling call does nothing
+    cProfile_path : str
+        Where to dump the cProfile statistics of the run, None to skip cProfile
+
+    Returns
+    -------
+    dict
+        Profile to pass to the other functions of this module
+    """
+
+    Profile = {'enabled': Enabled, 'stages': [], 'months': [], 'cprofile_path': cProfile_path, 'profiler': None,
+               'peak_memory': 0}
+
+    if (Enabled):
+        Profile['started'] = datetime.now().isoformat(timespec='seconds')
+        Profile['start_time'] = time.perf_counter()
+        tracemalloc.start()
+
+        if cProfile_path:
+            Profile['profiler'] = cProfile.Profile()
+            Profile['profiler'].enable()
+
+    return Profile
+
+
+
+def peak_rss_mb ():
+
+    """
+    This function returns the peak resident memory of the process so far. Unlike tracemalloc it counts every
+    allocation, Arrow buffers and memory maps included, but it never goes down: a stage only shows in it
+    when it raises the peak.
+
+    Returns
+    -------
+    float
+        Peak resident memory in MB, None where it isn't available (only on Unix, kilobytes on Linux)
+    """
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+
+@contextmanager
+def profile_stage (Profile, Name):
+
+    """
+    This function records the wall time and peak memory of a stage. It is used as a context manager, the
+    stage can store the number of rows it processed in the dict it yields:
+
+        with profile_stage(Profile, 'categorization') as stage:
+            Movements_df = categorize_movements(Movements_df, Rule_table)
+            stage['rows'] = len(Movements_df)
+
+    Parameters
+    ----------
+    Profile : dict
+        Profile returned by new_profile()
+    Name : str
+        Name of the stage
+    """
+
+    Stage = {'stage': Name}
+
+    if not Profile['enabled']:
+        yield Stage
+        return
+
+    tracemalloc.reset_peak()
+    Memory_before = tracemalloc.get_traced_memory()[0]
+    Start = time.perf_counter()
+
+    try:
+        yield Stage
+
+    finally:
+        Stage['seconds'] = time.perf_counter() - Start
+        Memory_after, Memory_peak = tracemalloc.get_traced_memory()
+        Stage['peak_memory_mb'] = (Memory_peak - Memory_before) / 1e6
+        Stage['retained_memory_mb'] = (Memory_after - Memory_before) / 1e6
+        Stage['peak_rss_mb'] = peak_rss_mb()
+        Profile['stages'].append(Stage)
+
+        # Peaks are reset on every stage, keep the highest one of the run
+        Profile['peak_memory'] = max(Profile['peak_memory'], Memory_peak)
+
+
+
+def record_month (Profile, Month, Rows, Seconds):
+
+    """
+    This function records the metrics of one month.
+
+    Parameters
+    ----------
+    Profile : dict
+        Profile returned by new_profile()
+    Month : Period
+    Rows : int
+        Movements of the month
+    Seconds : float
+        Time spent on the month
+    """
+
+    if (Profile['enabled']):
+        Profile['months'].append({'month': str(Month), 'rows': int(Rows), 'seconds': Seconds})
+
+
+
+def write_profile (Profile, Report_path):
+
+    """
+    This function stops profiling and writes the report of the run as .json, plus the cProfile dump if
+    it was asked for.
+
+    Parameters
+    ----------
+    Profile : dict
+        Profile returned by new_profile()
+    Report_path : str
+        Path to the .json report
+    """
+
+    if not Profile['enabled']:
+        return
+
+    if Profile['profiler'] is not None:
+        Profile['profiler'].disable()
+        Profile['profiler'].dump_stats(Profile['cprofile_path'])
+
+    Peak_memory = max(Profile['peak_memory'], tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    Report = {
+        'started': Profile['started'],
+        'total_seconds': time.perf_counter() - Profile['start_time'],
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'stages': Profile['stages'],
+        'months': Profile['months'],
+        'cprofile': Profile['cprofile_path'],
+    }
+
+    Report['peak_rss_mb'] = peak_rss_mb()
+
+    Report['peak_traced_memory_mb'] = Peak_memory / 1e6
+
+    os.makedirs(os.path.dirname(os.path.abspath(Report_path)), exist_ok=True)
+    with open(Report_path, 'w', encoding='utf-8') as file:
+        json.dump(Report, file, indent=4)
@@ -0,0 +1,194 @@
+'''
+Monte Carlo budget projection
+
+Projects the months ahead out of the tracked history: every simulated month is a tracked month drawn at
+random (bootstrap), whole, so that the spending of its categories keeps the correlations it had. The first
+and last tracked months are left out of the draws: the history rarely starts on the 1st and the last month
+is usually still open, so both hold only part of a month's spending. Tens of
+thousands of paths are drawn at once as a matrix of month indices, and every curve of the expenses vs time
+chart (incomes, then incomes minus the expenses of each category stacked one after the other) is
+accumulated along them.
+
+A path ends a month above the objective when what it has left, accumulated since the projection started,
+is at least the balance objective times the months elapsed. For every curve and month ahead the projection
+reports the share of paths above the objective and percentile bands of the accumulated amount. The last
+curve is the balance: what is left once every expense is paid.
+
+Percentiles are read from a histogram of each month's paths, interpolated within its bins, which is much
+faster than sorting millions of values and precise to a small fraction of the spread of the paths.
+'''
+
+import numpy as np
+import pandas as pd
+
+from Plots import stack_expenses, Balance_objective
+
+
+
+############################################### Variables ###############################################
+
+Projection_horizon = 24
+Projection_paths = 100000
+
+# Percentile bands of each curve
+Percentiles = [5, 25, 50, 75, 95]
+
+# Bins of the histograms percentiles are read from
+Histogram_bins = 1024
+
+
+########################################## Function definitions ##########################################
+
+def curve_labels (Columns):
+
+    """
+    This function names the curves of the projection after the categories the expenses vs time chart stacks.
+
+    Parameters
+    ----------
+    Columns : list tuples
+        (Category, Subcategory) headers of the tracked output
+
+    Returns
+    -------
+    list str
+        'Income', then the subcategory of each stacked column, or its category if it has none, and
+        'Balance' for the last one, once every expense is paid
+    """
+
+    return ['Income'] + [column[1] if column[1] != '/' else column[0] for column in list(Columns)[1:-5]] + ['Balance']
+
+
+
+def histogram_percentiles (Values, Levels, Bins=Histogram_bins):
+
+    """
+    This function reads percentiles off a histogram of each row. The histogram is built in place, Values
+    is overwritten.
+
+    Parameters
+    ----------
+    Values : ndarray float
+        One row per month ahead and one column per path
+    Levels : ndarray
+        Percentiles to read, between 0 and 100
+    Bins : int
+
+    Returns
+    -------
+    ndarray
+        One row per row of Values and one column per level
+    """
+
+    Rows, Paths = Values.shape
+
+    Low = Values.min(axis=1, keepdims=True)
+    Scale = (Bins - 1) / np.maximum(Values.max(axis=1, keepdims=True) - Low, 1e-9)
+
+    # Bin of every value, each row gets its own range of bins
+    Values -= Low
+    Values *= Scale
+    Codes = Values.astype(np.int64)
+    Codes += (np.arange(Rows) * Bins)[:, None]
+
+    Counts = np.bincount(Codes.ravel(), minlength=Rows * Bins).reshape(Rows, Bins)
+    Cumulative = np.cumsum(Counts, axis=1)
+
+    # Bin where each level falls and how far into it
+    Targets = np.asarray(Levels) / 100 * Paths
+    Bin = (Cumulative[:, None, :] < Targets[None, :, None]).sum(axis=2)
+    Before = np.take_along_axis(Cumulative, Bin - 1, axis=1) * (Bin > 0)
+    Inside = (Targets - Before) / np.maximum(np.take_along_axis(Counts, Bin, axis=1), 1)
+
+    return Low + (Bin + Inside) / Scale
+
+
+
+def project_budget (Output_dic, Horizon=Projection_horizon, Paths=Projection_paths, Objective=Balance_objective, Seed=None):
+
+    """
+    This function simulates the months ahead by drawing tracked months at random.
+
+    Parameters
+    ----------
+    Output_dic : dict
+        {(Category, Subcategory): [values]} with one value per tracked month, oldest first
+    Horizon : int
+        Months ahead
+    Paths : int
+        Simulated paths
+    Objective : float
+        Balance objective of each month, in €
+    Seed : int
+        Seed of the random draws, for reproducible projections
+
+    Returns
+    -------
+    dataframe
+        One row per month ahead and, for every curve, columns (curve, 'Above objective') with the share of
+        paths above the objective and (curve, 'P<n>') with each percentile of the accumulated amount, in €
+    """
+
+    _, Curves = stack_expenses(Output_dic)
+
+    # Only whole months are drawn, unless there is nothing else to draw from
+    if Curves.shape[1] > 2:
+        Curves = Curves[:, 1:-1]
+
+    Labels = curve_labels(Output_dic.keys())
+
+    Months = pd.period_range(pd.Timestamp(Output_dic[("Month", "/")][-1]).to_period('M') + 1, periods=Horizon, freq='M', name='Month')
+    Columns = pd.MultiIndex.from_product([Labels, ['Above objective'] + [f'P{level}' for level in Percentiles]])
+
+    if not Curves.shape[1]:
+        return pd.DataFrame(index=Months, columns=Columns, dtype=float)
+
+    # Every path draws whole tracked months, shared by all curves
+    Generator = np.random.default_rng(Seed)
+    Drawn_months = Generator.integers(0, Curves.shape[1], size=(Horizon, Paths))
+    Targets = Objective * np.arange(1, Horizon + 1)
+
+    Results = np.empty((Horizon, len(Labels), len(Percentiles) + 1))
+    for curve in range(len(Labels)):
+
+        # Accumulate along each path, adding one whole row at a time is faster than a cumsum over the rows
+        Accumulated = Curves[curve].take(Drawn_months)
+        for month in range(1, Horizon):
+            Accumulated[month] += Accumulated[month - 1]
+
+        Results[:, curve, 0] = np.count_nonzero(Accumulated >= Targets[:, None], axis=1) / Paths
+        Results[:, curve, 1:] = histogram_percentiles(Accumulated, Percentiles)
+
+    return pd.DataFrame(Results.reshape(Horizon, -1), index=Months, columns=Columns)
+
+
+
+def print_projection_report (Projection_df, Objective=Balance_objective):
+
+    """
+    This function prints into the cmd the projected balance of each month ahead, and how likely each
+    category is to leave the last month above the objective.
+
+    Parameters
+    ----------
+    Projection_df : dataframe
+        Projection returned by project_budget()
+    Objective : float
+        Balance objective of each month, in €
+    """
+
+    if Projection_df.empty:
+        return
+
+    Labels = Projection_df.columns.get_level_values(0).unique()
+    Balance_df = Projection_df[Labels[-1]]
+
+    print(f'\n\n*************************************\n        BUDGET PROJECTION\n*************************************\n')
+    print(f'    Balance accumulated against {Objective:.2f} € per month:\n')
+    for month, row in Balance_df.iterrows():
+        print(f'    * {month}:  {row["Above objective"]:6.1%} above, '
+              f'{row[f"P{Percentiles[0]}"]:.2f} € to {row[f"P{Percentiles[-1]}"]:.2f} € (median {row["P50"]:.2f} €)')
+
+    print(f'\n    Above the objective after each category by {Projection_df.index[-1]}:\n')
+    for label in Labels:
+        print(f'    * {label}:  {Projection_df[(label, "Above objective")].iloc[-1]:.1%}')
@@ -0,0 +1,179 @@
+'''
+Running balance reconciliation
+
+Each movement states the balance it leaves the account with, so in time order every balance must be the
+previous one plus the movement's amount. The monthly balance is taken from those balances and anything the
+categories don't explain ends up in "Unaccounted/Unknown", so a missing, repeated or misplaced movement
+would silently skew that figure. This check goes over the whole history in a single vectorized pass and
+reports every break of the chain:
+    - Duplicate: the movement leaves the balance where the previous one left it, it was already counted
+    - Ordering: the balance chain is intact but the movement is listed out of place among those of its day
+    - Gap: movements are missing, the balance jumps by an amount no listed movement explains
+    - Balance: the balance stated by a movement is wrong, the chain resumes right after it
+'''
+
+import numpy as np
+import pandas as pd
+
+from Money import to_cents, from_cents, is_exact
+from Categorizer import month_bounds
+
+
+
+############################################### Variables ###############################################
+
+Report_columns = ['Kind', 'First row', 'Last row', 'First date', 'Last date', 'Movements', 'Missing (€)']
+
+
+########################################## Function definitions ##########################################
+
+def reconcile_balances (Movements_df):
+
+    """
+    This function checks that the balance of every movement is the previous balance plus its amount, and
+    classifies every break of the chain.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Merged movements, newest first. Amounts may be floats or integer cents (exact mode)
+
+    Returns
+    -------
+    dataframe
+        One row per run of consecutive breaks of the same kind: 'Kind' ('Duplicate', 'Ordering', 'Gap' or 'Balance'),
+        'First row' and 'Last row' (positions in Movements_df, newest first, both included), 'First date',
+        'Last date', 'Movements' and 'Missing (€)', the amount a gap is missing. Empty if the chain holds
+    """
+
+    if len(Movements_df) < 2:
+        return pd.DataFrame(columns=Report_columns)
+
+    # Oldest first, in cents so that comparisons are exact
+    Amounts = Movements_df['IMPORTE (€)'].to_numpy()[::-1]
+    Balances = Movements_df['SALDO (€)'].to_numpy()[::-1]
+    if not is_exact(Movements_df):
+        Amounts = to_cents(Amounts)
+        Balances = to_cents(Balances)
+
+    Dates = pd.to_datetime(Movements_df['F. VALOR']).to_numpy()[::-1]
+
+    # Balance each movement starts from, according to itself and according to the previous movement
+    Stated_previous = Balances[1:] - Amounts[1:]
+    Expected_previous = Balances[:-1]
+    Breaks = np.flatnonzero(Stated_previous != Expected_previous) + 1
+
+    if not len(Breaks):
+        return pd.DataFrame(columns=Report_columns)
+
+    Kinds = np.full(len(Breaks), 'Gap', dtype=object)
+
+    # The balance is left where the previous movement left it
+    Duplicates = (Balances[Breaks] == Balances[Breaks - 1]) & (Amounts[Breaks] != 0)
+    Kinds[Duplicates] = 'Duplicate'
+
+    # The balance it starts from is left by another movement of the same day (or of the day before, when the
+    # first movements of the day are swapped), only the order is wrong.
+    # Only the balances of the days with breaks are looked at
+    Days, Day_index = np.unique(Dates, return_inverse=True)
+    Break_day = np.zeros(len(Days) + 1, dtype=bool)
+    Break_day[Day_index[Breaks]] = True
+
+    Same_day = np.flatnonzero(Break_day[Day_index])
+    Day_before = np.flatnonzero(Break_day[Day_index + 1])
+    Day_balances = pd.MultiIndex.from_arrays([np.concatenate([Day_index[Same_day], Day_index[Day_before] + 1]),
+                                              np.concatenate([Balances[Same_day], Balances[Day_before]])])
+    Starting_points = pd.MultiIndex.from_arrays([Day_index[Breaks], Balances[Breaks] - Amounts[Breaks]])
+    Ordering = Starting_points.isin(Day_balances) & ~Duplicates
+    Kinds[Ordering] = 'Ordering'
+
+    Missing = np.where(Kinds == 'Gap', (Balances[Breaks] - Amounts[Breaks]) - Balances[Breaks - 1], 0)
+
+    # Group consecutive breaks of the same kind into runs
+    New_run = np.ones(len(Breaks), dtype=bool)
+    New_run[1:] = (np.diff(Breaks) != 1) | (Kinds[1:] != Kinds[:-1])
+    Run = np.cumsum(New_run) - 1
+
+    Breaks_df = pd.DataFrame({'Run': Run, 'Kind': Kinds, 'Position': Breaks, 'Date': Dates[Breaks], 'Missing': Missing})
+    Runs_df = Breaks_df.groupby('Run', sort=True).agg(**{'Kind': ('Kind', 'first'),
+                                                        'First': ('Position', 'min'),
+                                                        'Last': ('Position', 'max'),
+                                                        'First date': ('Date', 'min'),
+                                                        'Last date': ('Date', 'max'),
+                                                        'Movements': ('Position', 'size'),
+                                                        'Missing': ('Missing', 'sum')})
+
+    # Back to positions in the newest first order
+    Rows = len(Movements_df) - 1
+    Runs_df['First row'] = Rows - Runs_df['Last']
+    Runs_df['Last row'] = Rows - Runs_df['First']
+    Runs_df['Missing (€)'] = from_cents(Runs_df['Missing'])
+
+    # A gap closed right away by the opposite jump is a misstated balance, nothing is missing
+    Runs_df.loc[(Runs_df['Kind'] == 'Gap') & (Runs_df['Movements'] > 1) & (Runs_df['Missing'] == 0), 'Kind'] = 'Balance'
+
+    return Runs_df[Report_columns].reset_index(drop=True)
+
+
+
+def reconcile_months (Movements_df, Months):
+
+    """
+    This function checks the balance chain over some months only, for updates that leave the other months
+    untouched. Each run of consecutive months is checked along with the movement right before and right
+    after it, so that breaks at its edges are found too.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Merged movements, newest first, with a 'Month' column
+    Months : collection of Period
+        Months to check
+
+    Returns
+    -------
+    dataframe
+        Report in the layout of reconcile_balances(), rows being positions in the whole Movements_df
+    """
+
+    Month_list, Starts, Stops = month_bounds(Movements_df)
+    Checked = Month_list.isin(list(Months))
+
+    # Runs of consecutive checked months, as ranges of rows
+    Edges = np.diff(np.concatenate([[0], Checked.astype(np.int8), [0]]))
+    Run_starts = Starts[np.flatnonzero(Edges == 1)]
+    Run_stops = Stops[np.flatnonzero(Edges == -1) - 1]
+
+    Reports = []
+    for start, stop in zip(Run_starts, Run_stops):
+        First = max(start - 1, 0)
+        Report_df = reconcile_balances(Movements_df.iloc[First:stop + 1])
+        Reports.append(Report_df.assign(**{'First row': Report_df['First row'] + First, 'Last row': Report_df['Last row'] + First}))
+
+    Reports = [df for df in Reports if not df.empty]
+
+    return pd.concat(Reports, ignore_index=True) if Reports else pd.DataFrame(columns=Report_columns)
+
+
+
+def print_reconciliation_report (Report_df):
+
+    """
+    This function prints into the cmd the breaks of the balance chain.
+
+    Parameters
+    ----------
+    Report_df : dataframe
+        Report returned by reconcile_balances()
+    """
+
+    if Report_df.empty:
+        return
+
+    print(f'\n\n*************************************\n      BALANCE CHAIN BREAKS\n*************************************\n')
+    for row in Report_df.itertuples(index=False):
+        Dates = f'{row[3]:%d/%m/%Y}' if row[3] == row[4] else f'{row[3]:%d/%m/%Y} - {row[4]:%d/%m/%Y}'
+        Missing = f', {row[6]:.2f} € missing' if row.Kind == 'Gap' else ''
+        print(f'    * {row.Kind}:  rows {row[1]} - {row[2]} ({Dates}), {row.Movements} movement(s){Missing}')
+
+    print(f'\n    "Unaccounted/Unknown" absorbs these errors in the months above')
@@ -0,0 +1,231 @@
+'''
+Recurring payments
+
+Some payments can only be told apart by their amount: the psychologist is paid in cash, 70€ per visit, so
+it shows up as withdrawals of 70, 140, 210... €; Dystopia is a 15€ Bizum among all the other Bizums.
+These are described as (concept, base amount, allowed multiples) rules in Rules/Recurring_Rules.csv and
+resolved over the whole history at once, by looking up (concept, amount) pairs in an index of every amount
+the rules allow.
+
+There's also an automatic mode that lists payments repeated with the same amount over several months, to
+find subscriptions that haven't been added to the rules yet.
+'''
+
+import numpy as np
+import pandas as pd
+
+from Money import to_cents, is_exact
+
+
+
+############################################### Variables ###############################################
+
+# Columns of the statement a recurring rule can be matched against. 'ANY' matches both
+Recurring_columns = ['DESCRIPCIÓN', 'SUBCATEGORÍA']
+
+
+########################################## Function definitions ##########################################
+
+def parse_multiples (Multiples):
+
+    """
+    This function reads the allowed multiples of a rule, written either as a single number ('1') or
+    as an inclusive range ('1-5').
+
+    Parameters
+    ----------
+    Multiples : str
+
+    Returns
+    -------
+    range
+    """
+
+    First, _, Last = Multiples.partition('-')
+    First = int(First)
+    Last = int(Last) if Last else First
+
+    if (First < 1 or Last < First):
+        raise ValueError(f'Invalid multiples "{Multiples}", expected a positive number or range like "1-5"')
+
+    return range(First, Last + 1)
+
+
+
+def load_recurring_rules (Rules_path):
+
+    """
+    This function reads the table of recurring rules and expands every rule into the amounts it allows.
+
+    The table is a .csv with the columns:
+        - Concept: string as stated in the statement
+        - Column: 'DESCRIPCIÓN', 'SUBCATEGORÍA' or 'ANY' for both
+        - Amount: signed base amount in €
+        - Multiples: allowed multiples of the base amount, '1' or a range like '1-5'
+        - Category, Subcategory: target the movement is tagged with
+
+    Parameters
+    ----------
+    Rules_path : str
+        Path to the .csv rule table
+
+    Returns
+    -------
+    list tuples
+        [(column, concept, amount in cents, (Category, Subcategory))]
+    """
+
+    Rules_df = pd.read_csv(Rules_path, dtype=str, keep_default_na=False, encoding='utf-8')
+
+    Expanded_rules = []
+    for rule in Rules_df.itertuples(index=False):
+
+        if (rule.Column != 'ANY' and rule.Column not in Recurring_columns):
+            raise ValueError(f'Unknown column "{rule.Column}" for rule "{rule.Concept}" in {Rules_path}')
+
+        Base_cents = to_cents(float(rule.Amount))
+        for column in Recurring_columns:
+            if (rule.Column in (column, 'ANY')):
+                for multiple in parse_multiples(rule.Multiples):
+                    Expanded_rules.append((column, rule.Concept, Base_cents * multiple, (rule.Category, rule.Subcategory)))
+
+    return Expanded_rules
+
+
+
+def compile_recurring_rules (Expanded_rules, Target_codes):
+
+    """
+    This function builds the amount index of the recurring rules: for each column, a hash index of
+    (concept, amount in cents) pairs pointing at the target they are tagged with.
+
+    Parameters
+    ----------
+    Expanded_rules : list tuples
+        Rules as returned by load_recurring_rules()
+    Target_codes : dict
+        {(Category, Subcategory): target index}
+
+    Returns
+    -------
+    dict
+        {column: (MultiIndex of (concept, cents), ndarray of target indexes)}
+    """
+
+    Compiled = {}
+    for column in Recurring_columns:
+        Keys = {}
+        for rule_column, concept, cents, target in Expanded_rules:
+            if (rule_column == column):
+                Keys.setdefault((concept, cents), Target_codes[target])
+
+        if Keys:
+            Index = pd.MultiIndex.from_tuples(list(Keys.keys()))
+            Compiled[column] = (Index, np.array(list(Keys.values()), dtype=np.int64))
+
+    return Compiled
+
+
+
+def match_recurring_payments (Movements_df, Compiled_rules):
+
+    """
+    This function finds the recurring rule each movement matches, in one vectorized pass over the whole
+    history. Descriptions take precedence over subcategories.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements, amounts in € or in cents (exact mode)
+    Compiled_rules : dict
+        Amount index as returned by compile_recurring_rules()
+
+    Returns
+    -------
+    ndarray int
+        Target index for each movement, -1 when no rule matches
+    """
+
+    Codes = np.full(len(Movements_df), -1, dtype=np.int64)
+
+    # Amounts are compared in cents so that float amounts don't depend on exact equality
+    Amounts = Movements_df['IMPORTE (€)'].to_numpy()
+    Cents = Amounts if is_exact(Movements_df) else to_cents(Amounts)
+
+    for column in reversed(Recurring_columns):
+        if column not in Compiled_rules:
+            continue
+
+        Index, Targets = Compiled_rules[column]
+        Positions = Index.get_indexer(pd.MultiIndex.from_arrays([Movements_df[column].array, Cents]))
+
+        # Later columns have less precedence, so earlier ones overwrite them
+        Found = Positions >= 0
+        Codes[Found] = Targets[Positions[Found]]
+
+    return Codes
+
+
+
+def detect_recurring_payments (Movements_df, Min_months=3, Min_coverage=0.75):
+
+    """
+    This function lists the payments that repeat with the same description and amount over several
+    months, with a single groupby on (description, amount). Something is considered recurring when it
+    shows up in at least Min_months different months, covering most of the months between its first and
+    last appearance.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements tagged by categorize_movements()
+    Min_months : int
+        Minimum number of different months the payment has to show up in
+    Min_coverage : float
+        Minimum fraction of the months between the first and last payment that have one
+
+    Returns
+    -------
+    dataframe
+        One row per recurring payment, sorted by number of months: 'DESCRIPCIÓN', 'IMPORTE (€)', 'Months',
+        'First month', 'Last month', 'Category' and 'Subcategory' (NaN if no rule tags it yet)
+    """
+
+    Payments_df = Movements_df[Movements_df['IMPORTE (€)'] < 0]
+
+    Grouped = (Payments_df
+               .groupby(['DESCRIPCIÓN', 'IMPORTE (€)'], observed=True, sort=False)
+               .agg(**{'Months': ('Month', 'nunique'),
+                       'First month': ('Month', 'min'),
+                       'Last month': ('Month', 'max'),
+                       'Category': ('Category', 'first'),
+                       'Subcategory': ('Subcategory', 'first')})
+               .reset_index())
+
+    # Months spanned between the first and the last payment, both included
+    Span = Grouped['Last month'].array.asi8 - Grouped['First month'].array.asi8 + 1
+
+    Recurring_mask = (Grouped['Months'] >= Min_months) & (Grouped['Months'] >= Min_coverage * Span)
+
+    return Grouped[Recurring_mask].sort_values('Months', ascending=False, ignore_index=True)
+
+
+
+def print_recurring_report (Recurring_df):
+
+    """
+    This function prints into the cmd the recurring payments that no rule tags yet.
+
+    Parameters
+    ----------
+    Recurring_df : dataframe
+        Report returned by detect_recurring_payments(), amounts in €
+    """
+
+    Untracked_df = Recurring_df[Recurring_df['Category'].isna()]
+    if Untracked_df.empty:
+        return
+
+    print(f'\n\n*************************************\n    UNTRACKED RECURRING PAYMENTS\n*************************************\n')
+    for row in Untracked_df.itertuples(index=False):
+        print(f'    * {row[0]}:  {row[1]:.2f} € in {row.Months} months ({row[3]} - {row[4]})')
@@ -0,0 +1,245 @@
+'''
+Spending over arbitrary windows
+
+Monthly totals answer one question, spending per calendar month. To query any other window (weeks, rolling
+30 days, pay periods from one salary to the next or any custom range) the categorized movements are summed
+once per day and category, and the running sum of those daily totals is kept as an index. The spending of
+a window is then two binary searches over the days and a subtraction of two rows of the running sum, so
+hundreds of windows are answered at once without going through the movements again.
+
+Sums are kept in integer cents, so subtracting running sums doesn't accumulate rounding errors.
+'''
+
+import numpy as np
+import pandas as pd
+
+from Money import to_cents, from_cents, is_exact
+from Categorizer import Expense_columns
+
+
+
+############################################### Variables ###############################################
+
+# Columns of a window query: the tracked expenses, movements no rule tags and incomes.
+# Their totals and the net flow of all movements are appended to each query
+Window_columns = Expense_columns + [("Unaccounted", "Unknown"), ("Income", "Salary"), ("Income", "Bizums")]
+
+Window_kinds = ['weekly', 'monthly', 'rolling', 'pay-period']
+
+
+########################################## Function definitions ##########################################
+
+def build_spending_index (Movements_df):
+
+    """
+    This function builds the running sum index of a categorized history: the total of each window column
+    per day, accumulated from the first day on.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements tagged by Categorizer.categorize_movements(), newest first. Amounts may be floats or
+        integer cents (exact mode)
+
+    Returns
+    -------
+    dict
+        {'Days': datetime64[D] ndarray of the days with movements, oldest first,
+         'Cumsum': int64 ndarray with a row per day plus a leading row of zeros, so that the total of the
+         days i to j (both included) is Cumsum[j + 1] - Cumsum[i]. One column per 'Window_columns' and a last
+         one with the net flow of all movements}
+    """
+
+    Dates = pd.to_datetime(Movements_df['F. VALOR']).to_numpy().astype('datetime64[D]')
+
+    Amounts = Movements_df['IMPORTE (€)'].to_numpy()
+    Cents = Amounts.astype(np.int64) if is_exact(Movements_df) else to_cents(Amounts)
+
+    # Window column of each movement, untagged movements go to 'Unknown' and the rest (-1) aren't tracked
+    Tags = pd.MultiIndex.from_arrays([Movements_df['Category'].to_numpy(), Movements_df['Subcategory'].to_numpy()])
+    Columns = pd.Index(Window_columns).get_indexer(Tags)
+    Columns[Movements_df['Category'].isna().to_numpy()] = Window_columns.index(("Unaccounted", "Unknown"))
+
+    # Sum by (day, column) with a single bincount over the flattened table, the net flow being the last column
+    Days, Day_index = np.unique(Dates, return_inverse=True)
+    Width = len(Window_columns) + 1
+    Tracked = Columns >= 0
+
+    Cells = np.concatenate([Day_index[Tracked] * Width + Columns[Tracked], Day_index * Width + Width - 1])
+    Weights = np.concatenate([Cents[Tracked], Cents]).astype(float)
+    Daily = np.rint(np.bincount(Cells, weights=Weights, minlength=len(Days) * Width)).astype(np.int64)
+
+    Cumsum = np.zeros((len(Days) + 1, Width), dtype=np.int64)
+    np.cumsum(Daily.reshape(len(Days), Width), axis=0, out=Cumsum[1:])
+
+    return {'Days': Days, 'Cumsum': Cumsum}
+
+
+
+def window_totals (Index, Starts, Ends):
+
+    """
+    This function computes the spending of each window with the running sum index.
+
+    Parameters
+    ----------
+    Index : dict
+        Index returned by build_spending_index()
+    Starts, Ends : array-like of dates
+        First and last day of each window, both included
+
+    Returns
+    -------
+    dataframe
+        One row per window, indexed by ('Start', 'End'), and one column per 'Window_columns' followed by
+        ('Total Sum Acc', '/') with the tracked expenses and ('Balance', '/') with the net flow, in euros
+    """
+
+    Starts = pd.to_datetime(np.asarray(Starts)).to_numpy().astype('datetime64[D]')
+    Ends = pd.to_datetime(np.asarray(Ends)).to_numpy().astype('datetime64[D]')
+
+    # Days are sorted, each end of the window is a binary search away
+    First = np.searchsorted(Index['Days'], Starts, side='left')
+    After_last = np.searchsorted(Index['Days'], Ends, side='right')
+
+    Totals = Index['Cumsum'][np.maximum(After_last, First)] - Index['Cumsum'][First]
+
+    Windows_df = pd.DataFrame(from_cents(Totals[:, :-1]), columns=pd.MultiIndex.from_tuples(Window_columns),
+                              index=pd.MultiIndex.from_arrays([Starts, Ends], names=['Start', 'End']))
+
+    Windows_df[("Total Sum Acc", "/")] = Windows_df[Expense_columns].sum(axis=1)
+    Windows_df[("Balance", "/")] = from_cents(Totals[:, -1])
+
+    return Windows_df
+
+
+
+def calendar_windows (Index, Frequency='W'):
+
+    """
+    This function lists the calendar periods spanned by the history: weeks ('W', Monday to Sunday), months
+    ('M'), quarters ('Q')...
+
+    Parameters
+    ----------
+    Index : dict
+        Index returned by build_spending_index()
+    Frequency : str
+        Pandas period frequency
+
+    Returns
+    -------
+    ndarray datetime64[D]
+        First day of each window
+    ndarray datetime64[D]
+        Last day of each window
+    """
+
+    Periods = pd.period_range(Index['Days'][0], Index['Days'][-1], freq=Frequency)
+
+    return (Periods.start_time.to_numpy().astype('datetime64[D]'),
+            Periods.end_time.to_numpy().astype('datetime64[D]'))
+
+
+
+def rolling_windows (Index, Days=30, Step=1):
+
+    """
+    This function lists rolling windows of a fixed number of days over the history, the first one ending
+    once enough days have passed.
+
+    Parameters
+    ----------
+    Index : dict
+        Index returned by build_spending_index()
+    Days : int
+        Length of each window
+    Step : int
+        Days between the ends of consecutive windows
+
+    Returns
+    -------
+    ndarray datetime64[D]
+        First day of each window
+    ndarray datetime64[D]
+        Last day of each window
+    """
+
+    Ends = np.arange(Index['Days'][0] + np.timedelta64(Days - 1, 'D'), Index['Days'][-1] + np.timedelta64(1, 'D'),
+                     np.timedelta64(Step, 'D'))
+
+    return Ends - np.timedelta64(Days - 1, 'D'), Ends
+
+
+
+def pay_period_windows (Index):
+
+    """
+    This function lists the pay periods of the history: from the day a salary is received to the day
+    before the next one. The last period is still open and ends on the last day with movements. A history
+    without any salary is a single period, from the first day to the last one.
+
+    Parameters
+    ----------
+    Index : dict
+        Index returned by build_spending_index()
+
+    Returns
+    -------
+    ndarray datetime64[D]
+        First day of each window
+    ndarray datetime64[D]
+        Last day of each window
+    """
+
+    # Days where the salary column grows
+    Salary = np.diff(Index['Cumsum'][:, Window_columns.index(("Income", "Salary"))])
+    Starts = Index['Days'][Salary > 0]
+
+    if not len(Starts):
+        print('No salary received in the history, the pay period spans all of it')
+        return Index['Days'][:1], Index['Days'][-1:]
+
+    Ends = np.append(Starts[1:] - np.timedelta64(1, 'D'), Index['Days'][-1])
+
+    return Starts, Ends
+
+
+
+def spending_windows (Movements_df, Kind, Days=30):
+
+    """
+    This function computes the spending over every window of a kind.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements tagged by Categorizer.categorize_movements(), newest first
+    Kind : str
+        One of the 'Window_kinds': 'weekly', 'monthly', 'rolling' or 'pay-period'
+    Days : int
+        Length of the rolling windows
+
+    Returns
+    -------
+    dataframe
+        Totals as returned by window_totals()
+    """
+
+    Index = build_spending_index(Movements_df)
+
+    if not len(Index['Days']):
+        return window_totals(Index, [], [])
+
+    if (Kind == 'weekly'):
+        Starts, Ends = calendar_windows(Index, 'W')
+    elif (Kind == 'monthly'):
+        Starts, Ends = calendar_windows(Index, 'M')
+    elif (Kind == 'rolling'):
+        Starts, Ends = rolling_windows(Index, Days)
+    elif (Kind == 'pay-period'):
+        Starts, Ends = pay_period_windows(Index)
+    else:
+        raise ValueError(f'Unknown window kind "{Kind}", expected one of {Window_kinds}')
+
+    return window_totals(Index, Starts, Ends)
@@ -0,0 +1,278 @@
+'''
+Cache of parsed bank statements
+
+Parsing the legacy .xls exports is the slowest stage of a run and the exports rarely change, so the parsed
+and type-cast movements are stored as Parquet files in a '.cache' folder next to the statements.
+
+    - Entries are keyed by the content hash of the statement, so any change to the file invalidates them
+    - The modification time and size of each statement are remembered, so unchanged files aren't even re-hashed
+    - The folder is capped in size, the least recently used entries are evicted first
+
+Parquet needs pyarrow, if it isn't installed statements are simply parsed every time.
+Every source keeps its own small .json record, so several processes can use the cache at once.
+'''
+
+import os
+import json
+import hashlib
+import importlib.util
+
+
+
+############################################### Variables ###############################################
+
+Cache_folder_name = '.cache'
+
+# Bump whenever parsing or casting changes, so that old entries stop matching
+Cache_version = 2
+
+Default_max_cache_bytes = 256 * 1024 * 1024
+
+
+########################################## Function definitions ##########################################
+
+def cache_available ():
+
+    """
+    This function checks wether the Parquet engine the cache relies on is installed.
+
+    Returns
+    -------
+    Bool
+        True if pyarrow can be imported.
+    """
+
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+
+def hash_file (File_path):
+
+    """
+    This function computes the content hash of a file, reading it in chunks so that big exports don't
+    have to fit in memory.
+
+    Parameters
+    ----------
+    File_path : str
+
+    Returns
+    -------
+    str
+        Hexadecimal sha256 digest, salted with the cache version.
+    """
+
+    Digest = hashlib.sha256(f'v{Cache_version}'.encode())
+    with open(File_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            Digest.update(chunk)
+
+    return Digest.hexdigest()
+
+
+
+def write_atomically (Path, Write_function):
+
+    """
+    This function writes a file through a temporary name and renames it into place, so that a crashed run
+    or a concurrent reader never sees half a file.
+
+    Parameters
+    ----------
+    Path : str
+        Final location of the file
+    Write_function : callable
+        Called with the temporary path, it must write the file there
+    """
+
+    Temporary_path = f'{Path}.{os.getpid()}.tmp'
+    try:
+        Write_function(Temporary_path)
+        os.replace(Temporary_path, Path)
+
+    finally:
+        if os.path.exists(Temporary_path):
+            os.remove(Temporary_path)
+
+
+
+def evict_entries (Cache_folder, Max_cache_bytes, Keep=None):
+
+    """
+    This function deletes the least recently used entries until the cache fits in Max_cache_bytes.
+
+    Parameters
+    ----------
+    Cache_folder : str
+    Max_cache_bytes : int
+    Keep : str
+        Path of an entry that must not be evicted (the one that was just written)
+    """
+
+    Entries = []
+    for entry in os.scandir(Cache_folder):
+        if entry.name.endswith('.parquet'):
+            try:
+                Stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            Entries.append((Stat.st_mtime, Stat.st_size, entry.path))
+
+    # Entries are touched on every hit, so the oldest mtime is the least recently used
+    Entries.sort()
+    Total_bytes = sum(size for _, size, _ in Entries)
+
+    for _, size, path in Entries:
+        if (Total_bytes <= Max_cache_bytes):
+            break
+
+        if (path == Keep):
+            continue
+
+        # Another process may have evicted it already
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        Total_bytes -= size
+
+
+
+def cached_read (Source_path, Parser, Max_cache_bytes=Default_max_cache_bytes, Categorical_columns=None):
+
+    """
+    This function returns the dataframe Parser(Source_path) would return, reading it from the cache
+    whenever the statement hasn't changed since it was last parsed.
+
+    Parameters
+    ----------
+    Source_path : str
+        Path to the bank statement
+    Parser : callable
+        Function that parses the statement into a dataframe
+    Max_cache_bytes : int
+        Size cap of the cache folder
+    Categorical_columns : list str
+        Text columns read from the cache as Arrow dictionaries, which become categoricals without building a
+        string per row. Parsed statements are returned as parsed
+
+    Returns
+    -------
+    dataframe
+    """
+
+    if not cache_available():
+        return Parser(Source_path)
+
+    # Pandas is only needed to read back parquet files, import it here so the module stays light
+    import pandas as pd
+
+    Cache_folder = os.path.join(os.path.dirname(os.path.abspath(Source_path)), Cache_folder_name)
+    os.makedirs(Cache_folder, exist_ok=True)
+
+    # Each source remembers the hash it had for a given mtime and size
+    Source_key = hashlib.sha1(os.path.abspath(Source_path).encode()).hexdigest()
+    Record_path = os.path.join(Cache_folder, f'{Source_key}.json')
+
+    Stat = os.stat(Source_path)
+    Record = {}
+    if os.path.exists(Record_path):
+        try:
+            with open(Record_path, encoding='utf-8') as file:
+                Record = json.load(file)
+        except (OSError, ValueError):
+            Record = {}
+
+    if (Record.get('mtime_ns') == Stat.st_mtime_ns and Record.get('size') == Stat.st_size):
+        Content_hash = Record['hash']
+    else:
+        Content_hash = hash_file(Source_path)
+
+    Entry_path = os.path.join(Cache_folder, f'{Content_hash}.parquet')
+
+    # Cache hit: mark it as recently used and return it
+    if os.path.exists(Entry_path):
+        try:
+            Movements_df = pd.read_parquet(Entry_path, read_dictionary=Categorical_columns)
+            os.utime(Entry_path)
+        except (OSError, ValueError):
+            Movements_df = None
+
+        if Movements_df is not None:
+            if (Record.get('hash') != Content_hash or Record.get('mtime_ns') != Stat.st_mtime_ns):
+                write_record(Record_path, Stat, Content_hash)
+            return Movements_df
+
+    # Cache miss: parse and store the result
+    Movements_df = Parser(Source_path)
+    write_atomically(Entry_path, lambda path: Movements_df.to_parquet(path, index=False))
+
+    write_record(Record_path, Stat, Content_hash)
+
+    # The previous version of this statement won't be asked for again, unless another statement has the
+    # same content
+    Previous_hash = Record.get('hash')
+    if (Previous_hash is not None and Previous_hash != Content_hash and not entry_in_use(Cache_folder, Previous_hash)):
+        try:
+            os.remove(os.path.join(Cache_folder, f'{Previous_hash}.parquet'))
+        except FileNotFoundError:
+            pass
+
+    evict_entries(Cache_folder, Max_cache_bytes, Keep=Entry_path)
+
+    return Movements_df
+
+
+
+def entry_in_use (Cache_folder, Content_hash):
+
+    """
+    This function tells whether the record of any statement still points at a cache entry.
+
+    Parameters
+    ----------
+    Cache_folder : str
+    Content_hash : str
+        Hash naming the entry
+
+    Returns
+    -------
+    Bool
+    """
+
+    for entry in os.scandir(Cache_folder):
+        if not entry.name.endswith('.json'):
+            continue
+
+        try:
+            with open(entry.path, encoding='utf-8') as file:
+                if (json.load(file).get('hash') == Content_hash):
+                    return True
+        except (OSError, ValueError):
+            continue
+
+    return False
+
+
+
+def write_record (Record_path, Stat, Content_hash):
+
+    """
+    This function stores the mtime, size and hash of a statement so that next runs can skip hashing it.
+
+    Parameters
+    ----------
+    Record_path : str
+        Location of the .json record
+    Stat : os.stat_result
+        Stat of the statement
+    Content_hash : str
+    """
+
+    Record = {'mtime_ns': Stat.st_mtime_ns, 'size': Stat.st_size, 'hash': Content_hash}
+
+    def dump (path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(Record, file)
+
+    write_atomically(Record_path, dump)
@@ -0,0 +1,809 @@
+'''
+Parsers of bank statement exports
+
+Every supported export is turned into the movements layout the rest of the tracker works with, the one of
+the ING statements: 'F. VALOR', 'CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'IMPORTE (€)' and 'SALDO (€)',
+newest movement first, plus 'COMENTARIO' when the export has comments.
+
+Parsers are registered with register_parser() and each statement is given to the first parser that
+recognizes the start of the file, whatever its name. Built in parsers:
+    - excel: ING .xls/.xlsx exports, or any workbook with a recognizable header row. The header row is
+      found instead of assuming the 5 row preamble of the ING exports
+    - csv: ING .csv exports and generic CSV files. Delimiter, header row, decimal separator and date format
+      are detected from the first lines. Large files are read with pyarrow's multi-threaded CSV reader
+      when it is installed, with pandas otherwise
+    - ofx: OFX/QFX statements, SGML (1.x) or XML (2.x)
+    - camt: ISO 20022 CAMT.052/053/054 XML statements
+
+Exports that don't state a running balance get one rebuilt from their opening or closing balance, or from
+zero when they have neither: monthly totals only rely on differences between balances.
+'''
+
+import re
+import csv
+import itertools
+import importlib.util
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Pattern_Matching import normalize_text
+
+
+
+############################################### Variables ###############################################
+
+Canonical_columns = ['F. VALOR', 'CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'IMPORTE (€)', 'SALDO (€)']
+
+# Names each column goes by in other exports, compared without case, accents nor a trailing "(...)".
+# Exports splitting amounts into debit and credit columns are supported too
+Header_aliases = {
+    'F. VALOR': ['f. valor', 'fecha valor', 'value date', 'fecha', 'date', 'booking date', 'transaction date',
+                 'posted date', 'fecha operacion'],
+    'CATEGORÍA': ['categoria', 'category'],
+    'SUBCATEGORÍA': ['subcategoria', 'subcategory', 'type'],
+    'DESCRIPCIÓN': ['descripcion', 'concepto', 'description', 'details', 'payee', 'memo', 'name'],
+    'COMENTARIO': ['comentario', 'comment', 'notes'],
+    'IMPORTE (€)': ['importe', 'amount', 'cantidad'],
+    'SALDO (€)': ['saldo', 'balance'],
+    'Debit': ['debit', 'cargo', 'debe', 'withdrawal'],
+    'Credit': ['credit', 'abono', 'haber', 'deposit'],
+}
+
+# Lines (or rows) searched for the header
+Header_scan_lines = 20
+
+# Bytes read to recognize the format of a statement
+Sniff_bytes = 16384
+
+Csv_delimiters = [';', ',', '\t', '|']
+
+# Columns holding amounts of money
+Money_fields = ['IMPORTE (€)', 'SALDO (€)', 'Debit', 'Credit']
+
+# Date formats tried on CSV exports, day first ones before month first ones
+Date_formats = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d', '%d/%m/%y', '%m/%d/%Y', '%Y%m%d']
+
+# Values of the date column that take part in guessing its format
+Date_pattern = r'\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}|\d{8}'
+
+# Dates written year first, which are never read day first
+Iso_date_pattern = r'\d{4}-\d{1,2}-\d{1,2}'
+
+# Registered parsers, tried in order: {'Name', 'Extensions', 'Detect', 'Parse'}
+Parsers = []
+
+
+########################################## Function definitions ##########################################
+
+def register_parser (Name, Extensions, Detect, Parse):
+
+    """
+    This function adds a parser for another export format. Parsers registered later are tried after the
+    built in ones, and replace any parser with the same name.
+
+    Parameters
+    ----------
+    Name : str
+    Extensions : tuple str
+        Extensions of the files find_statements() picks up for this format, lower case with the dot
+    Detect : callable
+        Detect(Head) -> Bool, Head being the first Sniff_bytes bytes of the file
+    Parse : callable
+        Parse(Statement_path) -> dataframe in the canonical layout, see canonical_movements()
+    """
+
+    Parsers[:] = [parser for parser in Parsers if parser['Name'] != Name]
+    Parsers.append({'Name': Name, 'Extensions': tuple(Extensions), 'Detect': Detect, 'Parse': Parse})
+
+
+
+def parser_extensions ():
+
+    """
+    This function lists the file extensions of every registered format.
+
+    Returns
+    -------
+    tuple str
+    """
+
+    return tuple(sorted({extension for parser in Parsers for extension in parser['Extensions']}))
+
+
+
+def detect_parser (Statement_path):
+
+    """
+    This function finds the parser of a statement out of the start of the file.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dict
+        Registered parser
+    """
+
+    with open(Statement_path, 'rb') as file:
+        Head = file.read(Sniff_bytes)
+
+    for parser in Parsers:
+        if parser['Detect'](Head):
+            return parser
+
+    raise ValueError(f'Unknown statement format: {Statement_path}, expected one of {[parser["Name"] for parser in Parsers]}')
+
+
+
+def header_key (Field):
+
+    """
+    This function normalizes a column name for comparison with the aliases: "Importe (€)" -> "importe".
+
+    Parameters
+    ----------
+    Field : str
+
+    Returns
+    -------
+    str
+    """
+
+    return re.sub(r'\s*\(.*\)$', '', normalize_text(Field))
+
+
+
+def map_header (Fields):
+
+    """
+    This function finds the position of each known column in a header row.
+
+    Parameters
+    ----------
+    Fields : list
+        Cells of the row
+
+    Returns
+    -------
+    dict
+        {column: position}, None if the row lacks a date or an amount
+    """
+
+    Keys = [header_key(field) if isinstance(field, str) else '' for field in Fields]
+
+    Positions = {}
+    for column, aliases in Header_aliases.items():
+        for alias in aliases:
+            if alias in Keys and Keys.index(alias) not in Positions.values():
+                Positions[column] = Keys.index(alias)
+                break
+
+    if ('F. VALOR' in Positions and ('IMPORTE (€)' in Positions or {'Debit', 'Credit'} <= Positions.keys())):
+        return Positions
+
+    return None
+
+
+
+def to_amounts (Values, Decimal_comma=False):
+
+    """
+    This function casts amounts written as text into floats, "1.234,56 €" and "1,234.56" included. Blank
+    values are left missing.
+
+    Parameters
+    ----------
+    Values : series
+    Decimal_comma : Bool
+        The decimal separator is a comma and dots separate thousands, otherwise commas separate thousands
+
+    Returns
+    -------
+    series float
+    """
+
+    if pd.api.types.is_numeric_dtype(Values):
+        return Values.astype(float)
+
+    Text = Values.astype(str).str.replace(r'[^\d,.\-+]', '', regex=True)
+    if (Decimal_comma):
+        Text = Text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        Text = Text.str.replace(',', '', regex=False)
+
+    Amounts = pd.to_numeric(Text.replace('', np.nan), errors='coerce')
+
+    # A movement whose amount can't be read would silently be left out of every total
+    Unreadable = Amounts.isna() & Values.notna() & Values.astype(str).str.strip().ne('')
+    if Unreadable.any():
+        raise ValueError(f'{Unreadable.sum()} amounts can\'t be read, first ones: {Values[Unreadable].unique()[:5].tolist()}')
+
+    return Amounts
+
+
+
+def has_decimal_comma (Amounts):
+
+    """
+    This function finds out whether amounts are written with a decimal comma, "1.234,56" or "-7,48", or with
+    a decimal dot, "1,234.56". The last separator of an amount is its decimal one, unless three digits follow
+    it and it is the only separator, as in "1,234", which is left to the other amounts.
+
+    Parameters
+    ----------
+    Amounts : list str
+
+    Returns
+    -------
+    Bool
+    """
+
+    Votes = {',': 0, '.': 0}
+    for amount in Amounts:
+        Separators = re.findall(r'[.,]', amount)
+        if not Separators:
+            continue
+
+        Decimals = re.search(r'[.,](\d*)[^\d]*$', amount).group(1)
+        if (len(set(Separators)) > 1 or len(Separators) == 1 and len(Decimals) != 3):
+            Votes[Separators[-1]] += 1
+
+    return Votes[','] > Votes['.']
+
+
+
+def to_dates (Values):
+
+    """
+    This function casts dates written as text into datetimes when their format is unknown. Dates are read
+    day first, as Spanish exports write them, except those written year first ("2024-03-01"), which
+    dayfirst would read as the 3rd of January. Values that aren't dates are left missing.
+
+    Parameters
+    ----------
+    Values : series
+
+    Returns
+    -------
+    series datetime64
+    """
+
+    Text = Values.astype(str).str.strip()
+    Iso = Text.str.match(Iso_date_pattern).to_numpy()
+
+    Dates = pd.Series(pd.NaT, index=Values.index, dtype='datetime64[us]')
+    Dates[Iso] = pd.to_datetime(Text[Iso], format='ISO8601', errors='coerce')
+    Dates[~Iso] = pd.to_datetime(Text[~Iso], dayfirst=True, errors='coerce')
+
+    return Dates
+
+
+
+def running_balance (Amounts, Opening=None, Closing=None):
+
+    """
+    This function rebuilds the balance left by each movement.
+
+    Parameters
+    ----------
+    Amounts : ndarray
+        Amounts, oldest first
+    Opening, Closing : float
+        Balance before the first movement or after the last one. Zero is taken when both are missing
+
+    Returns
+    -------
+    ndarray
+        Balances, oldest first
+    """
+
+    Balances = np.cumsum(Amounts)
+    if Closing is not None:
+        return np.round(Balances + (Closing - Balances[-1] if len(Balances) else 0), 2)
+
+    return np.round(Balances + (Opening or 0), 2)
+
+
+
+def canonical_movements (Columns, Opening=None, Closing=None):
+
+    """
+    This function builds the canonical movements out of the columns an export provides.
+
+    Parameters
+    ----------
+    Columns : dict
+        {column: series} with at least 'F. VALOR' and either 'IMPORTE (€)' or 'Debit' and 'Credit'. Missing
+        text columns are left empty and a missing 'SALDO (€)' is rebuilt, see running_balance()
+    Opening, Closing : float
+        Balances stated by the export, used when it has no balance column
+
+    Returns
+    -------
+    dataframe
+        Movements, newest first
+    """
+
+    Movements_df = pd.DataFrame({column: pd.Series(values).reset_index(drop=True) for column, values in Columns.items()})
+
+    if not pd.api.types.is_datetime64_any_dtype(Movements_df['F. VALOR']):
+        Movements_df['F. VALOR'] = to_dates(Movements_df['F. VALOR'])
+
+    if 'IMPORTE (€)' not in Movements_df.columns:
+        Movements_df['IMPORTE (€)'] = (Movements_df.pop('Credit').fillna(0).abs() - Movements_df.pop('Debit').fillna(0).abs())
+    Movements_df = Movements_df.drop(columns=['Debit', 'Credit'], errors='ignore')
+
+    # Totals and blank lines at the end of the exports have no date or no amount
+    Movements_df['IMPORTE (€)'] = Movements_df['IMPORTE (€)'].astype(float)
+    Movements_df = Movements_df[Movements_df['F. VALOR'].notna() & Movements_df['IMPORTE (€)'].notna()]
+
+    # Oldest first exports are turned around, movements of a day keep their relative order
+    Dates = Movements_df['F. VALOR'].to_numpy()
+    if (len(Dates) > 1 and Dates[0] < Dates[-1]):
+        Movements_df = Movements_df.iloc[::-1]
+    Movements_df = Movements_df.reset_index(drop=True)
+
+    if 'SALDO (€)' in Movements_df.columns:
+        Movements_df['SALDO (€)'] = Movements_df['SALDO (€)'].astype(float)
+    else:
+        Amounts = Movements_df['IMPORTE (€)'].to_numpy()[::-1]
+        Movements_df['SALDO (€)'] = running_balance(Amounts, Opening, Closing)[::-1]
+
+    for column in ('CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN'):
+        if column not in Movements_df.columns:
+            Movements_df[column] = ''
+
+    return Movements_df[Canonical_columns + (['COMENTARIO'] if 'COMENTARIO' in Movements_df.columns else [])]
+
+
+
+###################################################### Excel ######################################################
+
+def detect_excel (Head):
+
+    """
+    This function recognizes .xls (OLE2) and .xlsx (zip) workbooks.
+    """
+
+    return Head.startswith(b'\xd0\xcf\x11\xe0') or Head.startswith(b'PK\x03\x04')
+
+
+
+def parse_excel (Statement_path):
+
+    """
+    This function parses an Excel export: the 'Movimientos' sheet of the ING statements, or the first sheet
+    of other workbooks, below the first row that looks like a header.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dataframe
+        Movements in the canonical layout, newest first
+    """
+
+    with pd.ExcelFile(Statement_path) as Workbook:
+        Sheet = 'Movimientos' if 'Movimientos' in Workbook.sheet_names else Workbook.sheet_names[0]
+
+        Preamble_df = Workbook.parse(Sheet, header=None, nrows=Header_scan_lines)
+        for Header_row, row in enumerate(Preamble_df.itertuples(index=False, name=None)):
+            Positions = map_header(list(row))
+            if Positions is not None:
+                break
+        else:
+            raise ValueError(f'No header row found in the first {Header_scan_lines} rows of {Statement_path}')
+
+        Movements_df = Workbook.parse(Sheet, header=Header_row)
+
+    return canonical_movements({column: Movements_df.iloc[:, position] for column, position in Positions.items()})
+
+
+
+####################################################### CSV #######################################################
+
+def decode_head (Head):
+
+    """
+    This function decodes the start of a text export.
+
+    Parameters
+    ----------
+    Head : bytes
+
+    Returns
+    -------
+    list str
+        Complete lines
+    str
+        Encoding of the file: UTF-8, or Windows-1252 when it isn't valid UTF-8
+    """
+
+    for Encoding in ('utf-8-sig', 'cp1252'):
+        try:
+            Text = Head.decode(Encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+
+    # The last line may be cut in half
+    Lines = Text.splitlines()
+    if (len(Head) >= Sniff_bytes and len(Lines) > 1):
+        Lines = Lines[:-1]
+
+    return Lines, 'utf-8' if Encoding == 'utf-8-sig' else Encoding
+
+
+
+def find_csv_layout (Lines):
+
+    """
+    This function finds the header row, delimiter, decimal separator and date format of a CSV export.
+
+    Parameters
+    ----------
+    Lines : list str
+        First lines of the file
+
+    Returns
+    -------
+    dict
+        {'Header_row', 'Delimiter', 'Positions': {column: position}, 'Fields': fields per row,
+         'Decimal_comma', 'Date_format'}, None if no header is found
+    """
+
+    for Header_row, line in enumerate(Lines[:Header_scan_lines]):
+        for delimiter in Csv_delimiters:
+            if delimiter not in line:
+                continue
+
+            Positions = map_header(next(csv.reader([line], delimiter=delimiter)))
+            if Positions is not None:
+                break
+        else:
+            continue
+        break
+    else:
+        return None
+
+    Sample = [row for row in csv.reader(Lines[Header_row + 1:Header_row + 1 + Header_scan_lines], delimiter=delimiter) if row]
+    Fields = max([len(row) for row in Sample] + [len(next(csv.reader([Lines[Header_row]], delimiter=delimiter)))])
+
+    Money_positions = [Positions[column] for column in Money_fields if column in Positions]
+    Decimal_comma = has_decimal_comma([row[position].strip() for row in Sample for position in Money_positions if position < len(row)])
+
+    # Only values that look like dates vote, footers and totals ("Total", blank) would rule out every format
+    Dates = [row[Positions['F. VALOR']].strip() for row in Sample if Positions['F. VALOR'] < len(row)]
+    Dates = [date for date in Dates if re.fullmatch(Date_pattern, date)]
+    Date_format = None
+    for candidate in Date_formats:
+        try:
+            for date in Dates:
+                datetime.strptime(date, candidate)
+        except ValueError:
+            continue
+        Date_format = candidate
+        break
+
+    return {'Header_row': Header_row, 'Delimiter': delimiter, 'Positions': Positions, 'Fields': Fields,
+            'Decimal_comma': Decimal_comma, 'Date_format': Date_format}
+
+
+
+def count_fields (Statement_path, Layout, Encoding):
+
+    """
+    This function counts the fields of the longest row of a CSV export, for files whose rows past the
+    sampled lines are longer than those.
+
+    Parameters
+    ----------
+    Statement_path : str
+    Layout : dict
+        Layout returned by find_csv_layout()
+    Encoding : str
+
+    Returns
+    -------
+    int
+    """
+
+    with open(Statement_path, newline='', encoding=Encoding) as file:
+        Rows = csv.reader(itertools.islice(file, Layout['Header_row'] + 1, None), delimiter=Layout['Delimiter'])
+        return max(Layout['Fields'], max((len(row) for row in Rows), default=0))
+
+
+
+def detect_csv (Head):
+
+    """
+    This function recognizes text exports with a header row holding at least a date and an amount.
+    """
+
+    if b'\x00' in Head:
+        return False
+
+    Lines, _ = decode_head(Head)
+
+    return find_csv_layout(Lines) is not None
+
+
+
+def parse_csv (Statement_path):
+
+    """
+    This function parses a CSV export, with pyarrow's multi-threaded reader when it is installed.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dataframe
+        Movements in the canonical layout, newest first
+    """
+
+    with open(Statement_path, 'rb') as file:
+        Lines, Encoding = decode_head(file.read(Sniff_bytes))
+
+    Layout = find_csv_layout(Lines)
+    if Layout is None:
+        raise ValueError(f'No header row found in the first {Header_scan_lines} lines of {Statement_path}')
+
+    # Columns are named after their position, headers may repeat names or lack a few
+    Positions = Layout['Positions']
+    Names = {column: f'column_{position}' for column, position in Positions.items()}
+    Date_column = Names['F. VALOR']
+
+    Money_columns = [Names[column] for column in Money_fields if column in Names]
+    Text_columns = [name for column, name in Names.items() if column not in Money_fields and column != 'F. VALOR']
+
+    Table = None
+    if importlib.util.find_spec('pyarrow') is not None:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from pyarrow import csv as arrow_csv
+
+        # Amounts are read as text and converted in Arrow without their thousands separators, "1.234,56" ->
+        # "1234.56" and "1,234.56" -> "1234.56". Inferring them would fail on the first separator past the sample.
+        # Dates are read as text too, footers and totals below the movements aren't dates
+        Column_types = {name: pa.string() for name in Text_columns + Money_columns + [Date_column]}
+
+        try:
+            Table = arrow_csv.read_csv(
+                Statement_path,
+                read_options=arrow_csv.ReadOptions(skip_rows=Layout['Header_row'] + 1, encoding=Encoding, use_threads=True,
+                                                   column_names=[f'column_{position}' for position in range(Layout['Fields'])]),
+                parse_options=arrow_csv.ParseOptions(delimiter=Layout['Delimiter']),
+                convert_options=arrow_csv.ConvertOptions(include_columns=list(Names.values()), column_types=Column_types,
+                                                         strings_can_be_null=True))
+        except pa.ArrowInvalid:
+            # Arrow needs every row to have as many fields as the sampled ones, pandas reads the others
+            Table = None
+
+    if Table is not None:
+        if Layout['Date_format'] is not None:
+            Dates = pc.strptime(pc.utf8_trim_whitespace(Table[Date_column]), format=Layout['Date_format'], unit='us', error_is_null=True)
+            Table = Table.set_column(Table.schema.get_field_index(Date_column), Date_column, Dates)
+
+        for name in Money_columns:
+            if (Layout['Decimal_comma']):
+                Digits = pc.replace_substring(pc.replace_substring(Table[name], '.', ''), ',', '.')
+            else:
+                Digits = pc.replace_substring(Table[name], ',', '')
+            try:
+                Table = Table.set_column(Table.schema.get_field_index(name), name, pc.cast(Digits, pa.float64()))
+            except pa.ArrowInvalid:
+                # Amounts with currency symbols or spaces are left as text for to_amounts()
+                pass
+
+        Read_df = Table.to_pandas()
+
+    else:
+        # Rows may have more fields than the sampled ones, names are given for the longest row of the file
+        Read_df = pd.read_csv(Statement_path, sep=Layout['Delimiter'], skiprows=Layout['Header_row'] + 1, header=None,
+                              names=[f'column_{position}' for position in range(count_fields(Statement_path, Layout, Encoding))], usecols=list(Names.values()),
+                              dtype={name: str for name in Text_columns + [Date_column]}, encoding=Encoding,
+                              decimal=',' if Layout['Decimal_comma'] else '.', thousands='.' if Layout['Decimal_comma'] else ',')
+
+        if Layout['Date_format'] is not None:
+            Read_df[Date_column] = pd.to_datetime(Read_df[Date_column].str.strip(), format=Layout['Date_format'], errors='coerce')
+
+    Columns = {}
+    for column, name in Names.items():
+        Columns[column] = to_amounts(Read_df[name], Layout['Decimal_comma']) if column in Money_fields else Read_df[name]
+
+    return canonical_movements(Columns)
+
+
+
+####################################################### OFX #######################################################
+
+def detect_ofx (Head):
+
+    """
+    This function recognizes OFX and QFX statements.
+    """
+
+    return b'OFXHEADER' in Head or b'<OFX>' in Head.upper()
+
+
+
+def ofx_value (Block, Tag):
+
+    """
+    This function reads an element of an OFX block, closed (XML) or not (SGML).
+
+    Parameters
+    ----------
+    Block : str
+    Tag : str
+
+    Returns
+    -------
+    str
+        Value of the element, None if it is missing
+    """
+
+    Match = re.search(rf'<{Tag}>([^<\r\n]*)', Block, re.IGNORECASE)
+
+    return Match.group(1).strip() if Match else None
+
+
+
+def parse_ofx (Statement_path):
+
+    """
+    This function parses an OFX statement. Balances are rebuilt from the ledger balance of the statement.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dataframe
+        Movements in the canonical layout, newest first
+    """
+
+    with open(Statement_path, 'rb') as file:
+        Raw = file.read()
+
+    try:
+        Text = Raw.decode('utf-8')
+    except UnicodeDecodeError:
+        Text = Raw.decode('cp1252')
+
+    Blocks = re.findall(r'<STMTTRN>(.*?)</STMTTRN>', Text, re.IGNORECASE | re.DOTALL)
+
+    Columns = {
+        'F. VALOR': [pd.to_datetime((ofx_value(block, 'DTPOSTED') or '')[:8], format='%Y%m%d', errors='coerce') for block in Blocks],
+        'SUBCATEGORÍA': [ofx_value(block, 'TRNTYPE') or '' for block in Blocks],
+        'DESCRIPCIÓN': [ofx_value(block, 'NAME') or ofx_value(block, 'MEMO') or '' for block in Blocks],
+        'COMENTARIO': [ofx_value(block, 'MEMO') or '' for block in Blocks],
+        'IMPORTE (€)': to_amounts(pd.Series([(ofx_value(block, 'TRNAMT') or '').replace(',', '.') for block in Blocks], dtype=object)),
+    }
+
+    Ledger = re.search(r'<LEDGERBAL>(.*?)(?:</LEDGERBAL>|$)', Text, re.IGNORECASE | re.DOTALL)
+    Closing = ofx_value(Ledger.group(1), 'BALAMT') if Ledger else None
+
+    # Statements list movements in any order, the balance is rebuilt in date order
+    Movements_df = pd.DataFrame(Columns).sort_values('F. VALOR', kind='stable')
+
+    return canonical_movements({column: Movements_df[column] for column in Movements_df.columns},
+                               Closing=float(Closing.replace(',', '.')) if Closing else None)
+
+
+
+####################################################### CAMT ######################################################
+
+def detect_camt (Head):
+
+    """
+    This function recognizes ISO 20022 CAMT statements.
+    """
+
+    return b'camt.05' in Head
+
+
+
+def local_name (Tag):
+
+    """
+    This function drops the namespace of an XML tag: '{urn:iso:...}Ntry' -> 'Ntry'.
+    """
+
+    return Tag.rsplit('}', 1)[-1]
+
+
+
+def camt_text (Element, *Path):
+
+    """
+    This function reads the text at a path of local names below an element.
+
+    Parameters
+    ----------
+    Element : Element
+    *Path : str
+        Local names of the nested elements
+
+    Returns
+    -------
+    str
+        Text of the element, None if it is missing
+    """
+
+    for name in Path:
+        Element = next((child for child in Element if local_name(child.tag) == name), None)
+        if Element is None:
+            return None
+
+    return (Element.text or '').strip()
+
+
+
+def parse_camt (Statement_path):
+
+    """
+    This function parses a CAMT statement, entry by entry so that large files aren't held in memory as a
+    tree. Balances are rebuilt from the opening booked balance, or the closing one.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dataframe
+        Movements in the canonical layout, newest first
+    """
+
+    Columns = {'F. VALOR': [], 'SUBCATEGORÍA': [], 'DESCRIPCIÓN': [], 'IMPORTE (€)': []}
+    Balances = {}
+
+    for _, element in ElementTree.iterparse(Statement_path, events=('end',)):
+        name = local_name(element.tag)
+
+        if (name == 'Ntry'):
+            Amount = float(camt_text(element, 'Amt') or 'nan')
+            Date = (camt_text(element, 'ValDt', 'Dt') or camt_text(element, 'ValDt', 'DtTm')
+                    or camt_text(element, 'BookgDt', 'Dt') or camt_text(element, 'BookgDt', 'DtTm') or '')
+
+            Columns['F. VALOR'].append(Date[:10])
+            Columns['IMPORTE (€)'].append(-Amount if camt_text(element, 'CdtDbtInd') == 'DBIT' else Amount)
+            Columns['SUBCATEGORÍA'].append(camt_text(element, 'BkTxCd', 'Prtry', 'Cd')
+                                           or camt_text(element, 'BkTxCd', 'Domn', 'Fmly', 'SubFmlyCd') or '')
+            Columns['DESCRIPCIÓN'].append(camt_text(element, 'NtryDtls', 'TxDtls', 'RmtInf', 'Ustrd')
+                                          or camt_text(element, 'AddtlNtryInf') or '')
+            element.clear()
+
+        elif (name == 'Bal'):
+            Code = camt_text(element, 'Tp', 'CdOrPrtry', 'Cd')
+            Amount = float(camt_text(element, 'Amt') or 'nan')
+            if (Code in ('OPBD', 'CLBD') and Code not in Balances):
+                Balances[Code] = -Amount if camt_text(element, 'CdtDbtInd') == 'DBIT' else Amount
+
+    Movements_df = pd.DataFrame(Columns)
+    Movements_df['F. VALOR'] = pd.to_datetime(Movements_df['F. VALOR'], format='%Y-%m-%d', errors='coerce')
+    Movements_df = Movements_df.sort_values('F. VALOR', kind='stable')
+
+    return canonical_movements({column: Movements_df[column] for column in Movements_df.columns},
+                               Opening=Balances.get('OPBD'), Closing=None if 'OPBD' in Balances else Balances.get('CLBD'))
+
+
+
+################################################## Built in parsers ###############################################
+
+register_parser('excel', ('.xls', '.xlsx'), detect_excel, parse_excel)
+register_parser('ofx', ('.ofx', '.qfx'), detect_ofx, parse_ofx)
+register_parser('camt', ('.xml',), detect_camt, parse_camt)
+register_parser('csv', ('.csv',), detect_csv, parse_csv)
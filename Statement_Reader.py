@@ -0,0 +1,234 @@
+'''
+Reading of the bank statements stored in "Bank_Monthly_Movements"
+
+Statements are ING exports: an .xls whose 'Movimientos' sheet holds the movements below a 5 row preamble,
+newest movement first. CSV, OFX and CAMT exports are read too, see Statement_Parsers.py. Every statement in
+the folder is read, in parallel, and merged into a single table.
+'''
+
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from Statement_Cache import cached_read, Default_max_cache_bytes
+from Statement_Parsers import detect_parser, parser_extensions
+
+
+
+############################################### Variables ###############################################
+
+# Text columns with few distinct values, they are stored as categoricals in compact mode
+Categorical_columns = ['CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'Source']
+
+
+
+########################################## Function definitions ##########################################
+
+def parse_statement (Movements_path):
+
+    """
+    This function parses a statement into a dataframe, with the parser of its format.
+
+    Parameters
+    ----------
+    Movements_path : str
+        Path to the statement
+
+    Returns
+    -------
+    dataframe
+        Movements in the layout of the ING statements, newest first, numerical values cast to floats
+    """
+
+    # The format is told by the content of the file, not by its name
+    Parser = detect_parser(Movements_path)
+
+    return Parser['Parse'](Movements_path)
+
+
+
+def read_statement (Movements_path, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Compact=False):
+
+    """
+    This function reads a statement, going through the parsed statement cache unless told otherwise.
+
+    Parameters
+    ----------
+    Movements_path : str
+        Path to the statement
+    Use_cache : Bool
+        Reuse the previous parse of the statement if it hasn't changed
+    Max_cache_bytes : int
+        Size cap of the cache folder
+    Compact : Bool
+        Return the compact layout, see compact_movements(). Cached statements are read straight into
+        categoricals, parsed ones are compacted before being merged with the others
+
+    Returns
+    -------
+    dataframe
+        Movements as listed in the statement
+    """
+
+    if (Use_cache):
+        Statement_df = cached_read(Movements_path, parse_statement, Max_cache_bytes,
+                                   Categorical_columns=Categorical_columns if Compact else None)
+    else:
+        Statement_df = parse_statement(Movements_path)
+
+    return compact_movements(Statement_df) if Compact else Statement_df
+
+
+
+def find_statements (Folder_path):
+
+    """
+    This function lists the statements stored in a folder. Hidden files, like the cache folder or the lock
+    files office suites leave behind ('.~lock.Movements.xls#'), are skipped.
+
+    Parameters
+    ----------
+    Folder_path : str
+
+    Returns
+    -------
+    list str
+        Paths to the statements, sorted by name
+    """
+
+    Extensions = parser_extensions()
+
+    Statements = []
+    for entry in os.scandir(Folder_path):
+        if (entry.is_file() and not entry.name.startswith(('.', '~'))
+                and entry.name.lower().endswith(Extensions)):
+            Statements.append(entry.path)
+
+    return sorted(Statements)
+
+
+
+def merge_statements (Statement_dfs):
+
+    """
+    This function merges the movements of several statements into one table, newest movement first.
+    Movements sharing a value date keep the order they had in their statement.
+
+    Parameters
+    ----------
+    Statement_dfs : list dataframe
+        Movements of each statement, newest first
+
+    Returns
+    -------
+    dataframe
+        All movements, newest first
+    """
+
+    Statement_dfs = [df for df in Statement_dfs if not df.empty]
+    if not Statement_dfs:
+        return pd.DataFrame(columns=['F. VALOR', 'CATEGORÍA', 'SUBCATEGORÍA', 'DESCRIPCIÓN', 'IMPORTE (€)', 'SALDO (€)', 'Source'])
+
+    # Start with the newest statement so that ties across files are also kept newest first
+    Statement_dfs = sorted(Statement_dfs, key=lambda df: df['F. VALOR'].max(), reverse=True)
+
+    # Categoricals with different categories would be expanded into strings by the concatenation, they are
+    # concatenated on their own into a categorical holding every category
+    Categoricals = [column for column in Categorical_columns
+                    if all(column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype) for df in Statement_dfs)]
+
+    Columns = list(dict.fromkeys(column for df in Statement_dfs for column in df.columns))
+
+    Movements_df = pd.concat([df.drop(columns=Categoricals) for df in Statement_dfs], ignore_index=True)
+    for column in Categoricals:
+        Movements_df[column] = union_categoricals([df[column] for df in Statement_dfs])
+    Movements_df = Movements_df[Columns]
+    Movements_df = Movements_df.sort_values('F. VALOR', ascending=False, kind='stable', ignore_index=True)
+
+    return Movements_df
+
+
+
+def read_statement_folder (Folder_path, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Workers=None, Compact=False):
+
+    """
+    This function reads every statement in a folder and merges them into a single table.
+    Excel parsing is CPU bound and single threaded, so statements are parsed in a pool of processes.
+
+    Parameters
+    ----------
+    Folder_path : str
+        Folder holding the statements
+    Use_cache : Bool
+        Reuse the previous parse of the statements that haven't changed
+    Max_cache_bytes : int
+        Size cap of the cache folder
+    Workers : int
+        Number of processes, defaults to one per core
+    Compact : Bool
+        Read every statement into the compact layout, see compact_movements(). Statements are compacted one
+        by one, so the text columns of the whole history are never held as strings at once
+
+    Returns
+    -------
+    dataframe
+        All movements, newest first, with a 'Source' column naming the statement they come from.
+        Statements may overlap, see Deduplication.drop_duplicate_movements()
+    """
+
+    Statements = find_statements(Folder_path)
+    if not Statements:
+        raise FileNotFoundError(f'No bank statements found in {Folder_path}')
+
+    Reader = partial(read_statement, Use_cache=Use_cache, Max_cache_bytes=Max_cache_bytes, Compact=Compact)
+
+    # Spawning processes isn't worth it for a single file
+    if (len(Statements) == 1 or Workers == 1):
+        Statement_dfs = [Reader(path) for path in Statements]
+
+    else:
+        Workers = min(Workers or os.cpu_count() or 1, len(Statements))
+        with ProcessPoolExecutor(max_workers=Workers) as executor:
+            Statement_dfs = list(executor.map(Reader, Statements))
+
+    # Remember where each movement comes from, to report overlapping statements
+    for path, Statement_df in zip(Statements, Statement_dfs):
+        Source = os.path.basename(path)
+        Statement_df['Source'] = pd.Categorical.from_codes(np.zeros(len(Statement_df), dtype=np.int8), [Source]) if Compact else Source
+
+    return merge_statements(Statement_dfs)
+
+
+
+def compact_movements (Movements_df):
+
+    """
+    This function shrinks the in-memory layout of the movements: text columns with few distinct values
+    (categories, merchants, statement names) become categoricals, which store one small integer code per
+    movement instead of one Python string, and value dates become datetime64.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Merged movements, newest first
+
+    Returns
+    -------
+    dataframe
+        Movements with the compact layout, in the same order
+    """
+
+    Movements_df = Movements_df.copy(deep=False)
+
+    if not pd.api.types.is_datetime64_any_dtype(Movements_df['F. VALOR']):
+        Movements_df['F. VALOR'] = pd.to_datetime(Movements_df['F. VALOR'])
+
+    for column in Categorical_columns:
+        if column in Movements_df.columns:
+            Movements_df[column] = Movements_df[column].astype('category')
+
+    return Movements_df
@@ -0,0 +1,11 @@
+'''
+Test configuration
+
+The modules of the tracker live at the root of the repository, next to Finance_Tracker.py, and are imported
+from there.
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,125 @@
+'''
+Tests of the consolidation of several accounts
+'''
+
+import os
+import shutil
+
+import pandas as pd
+
+from Accounts import track_account, match_internal_transfers, consolidate_accounts
+from Categorizer import monthly_totals
+
+
+
+############################################### Variables ###############################################
+
+Rules_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Rules')
+
+
+
+########################################## Function definitions ##########################################
+
+def account_result (Name, Movements):
+
+    """
+    This function builds the result of Accounts.track_account() for a few categorized movements.
+
+    Parameters
+    ----------
+    Name : str
+    Movements : list tuples
+        (date, description, category, subcategory, amount, balance), newest first
+
+    Returns
+    -------
+    dict
+    """
+
+    Movements_df = pd.DataFrame(Movements, columns=['F. VALOR', 'DESCRIPCIÓN', 'Category', 'Subcategory', 'IMPORTE (€)', 'SALDO (€)'])
+    Movements_df['F. VALOR'] = pd.to_datetime(Movements_df['F. VALOR'])
+    Movements_df['SUBCATEGORÍA'] = ''
+    Movements_df['Month'] = Movements_df['F. VALOR'].dt.to_period('M')
+
+    return {'Name': Name, 'Movements': Movements_df, 'Monthly': monthly_totals(Movements_df), 'Breaks': pd.DataFrame()}
+
+
+
+def test_transfer_oldest_in_its_month ():
+
+    """
+    A transfer arriving as the oldest movement of its month isn't part of that month's balance, so it must
+    not be netted out of the consolidated one.
+    """
+
+    Alice = account_result('Alice', [
+        ('2024-02-10', 'Compra', 'Recreational', 'Bazar', -30.0, 820.0),
+        ('2024-02-05', 'Compra', 'Recreational', 'Bazar', -50.0, 850.0),
+        ('2024-01-31', 'Transferencia emitida a Bob', 'Unaccounted', 'Unknown', -100.0, 900.0),
+        ('2024-01-10', 'Nomina', 'Income', 'Salary', 1000.0, 1000.0),
+    ])
+    Bob = account_result('Bob', [
+        ('2024-02-20', 'Compra', 'Recreational', 'Bazar', -20.0, 570.0),
+        ('2024-02-01', 'Transferencia recibida de Alice', 'Unaccounted', 'Unknown', 100.0, 590.0),
+        ('2024-01-15', 'Compra', 'Recreational', 'Bazar', -10.0, 490.0),
+    ])
+
+    Transfers_df = match_internal_transfers([Alice, Bob])
+    assert len(Transfers_df) == 1
+
+    _, Monthly_df = consolidate_accounts([Alice, Bob], Transfers_df)
+
+    # Each account leaves the oldest movement of February out of its balance: -30 and -20
+    February = Monthly_df.loc[pd.Period('2024-02', 'M')]
+    assert February[("Balance", "/")] == -50.0
+
+    # Nothing is left unaccounted that the accounts didn't leave unaccounted themselves
+    Unknown = sum(result['Monthly'].loc[pd.Period('2024-02', 'M'), ("Unaccounted", "Unknown")] for result in (Alice, Bob))
+    assert February[("Unaccounted", "Unknown")] == Unknown
+
+    # The transfer leaving Alice in January is within her balance and is netted out
+    assert Monthly_df.loc[pd.Period('2024-01', 'M'), ("Balance", "/")] == 0.0
+
+
+
+def test_bizum_is_not_an_internal_transfer ():
+
+    """
+    Bizum payments are described as transfers, but go to people outside the tracked accounts.
+    """
+
+    Alice = account_result('Alice', [
+        ('2024-02-10', 'Compra', 'Recreational', 'Bazar', -30.0, 955.0),
+        ('2024-02-05', 'Transferencia Bizum emitida', 'Recreational', 'Bizum', -15.0, 985.0),
+        ('2024-02-01', 'Nomina', 'Income', 'Salary', 1000.0, 1000.0),
+    ])
+    Bob = account_result('Bob', [
+        ('2024-02-20', 'Compra', 'Recreational', 'Bazar', -20.0, 495.0),
+        ('2024-02-05', 'Transferencia recibida de Carol', 'Unaccounted', 'Unknown', 15.0, 515.0),
+        ('2024-02-01', 'Compra', 'Recreational', 'Bazar', -10.0, 500.0),
+    ])
+
+    assert match_internal_transfers([Alice, Bob]).empty
+
+
+
+def test_balances_reconciled_on_request (tmp_path):
+
+    """
+    The balance chain of an account is only checked when reconciling, a missing movement is then reported.
+    """
+
+    Account_path = tmp_path / 'Alice'
+    (Account_path / 'Bank_Monthly_Movements').mkdir(parents=True)
+    shutil.copytree(Rules_folder, tmp_path / 'Rules')
+
+    # 10 € are missing between the two oldest movements
+    (Account_path / 'Bank_Monthly_Movements' / 'March.csv').write_text('\n'.join([
+        'Date,Description,Amount,Balance',
+        '2024-03-20,Compra,-5.00,945.00',
+        '2024-03-10,Compra,-40.00,950.00',
+        '2024-03-01,Compra,-20.00,1000.00',
+    ]) + '\n', encoding='utf-8')
+
+    assert track_account(str(Account_path), Use_cache=False)['Breaks'].empty
+    assert len(track_account(str(Account_path), Use_cache=False, Reconcile=True)['Breaks']) == 1
@@ -0,0 +1,97 @@
+'''
+Tests of the removal of movements repeated across statements
+'''
+
+import pandas as pd
+
+from Statement_Reader import merge_statements, compact_movements
+from Deduplication import drop_duplicate_movements
+
+
+
+########################################## Function definitions ##########################################
+
+def statement (Source, Movements):
+
+    """
+    This function builds the movements of a statement.
+
+    Parameters
+    ----------
+    Source : str
+        Name of the statement
+    Movements : list tuples
+        (date, description, amount, balance), newest first
+
+    Returns
+    -------
+    dataframe
+    """
+
+    Statement_df = pd.DataFrame(Movements, columns=['F. VALOR', 'DESCRIPCIÓN', 'IMPORTE (€)', 'SALDO (€)'])
+    Statement_df['F. VALOR'] = pd.to_datetime(Statement_df['F. VALOR'])
+    Statement_df['Source'] = Source
+
+    return Statement_df
+
+
+
+def test_overlapping_statements ():
+
+    """
+    Movements listed by two statements are kept once, and the overlap is reported.
+    """
+
+    February = statement('February.xlsx', [
+        ('2024-03-02', 'Compra', -10.0, 960.0),
+        ('2024-02-20', 'Compra', -30.0, 970.0),
+        ('2024-02-01', 'Nomina', 1000.0, 1000.0),
+    ])
+    March = statement('March.xlsx', [
+        ('2024-03-15', 'Compra', -5.0, 955.0),
+        ('2024-03-02', 'Compra', -10.0, 960.0),
+    ])
+
+    Movements_df, Report_df = drop_duplicate_movements(merge_statements([February, March]))
+
+    assert list(Movements_df['SALDO (€)']) == [955.0, 960.0, 970.0, 1000.0]
+    assert Movements_df['Source'].iloc[1] == 'March.xlsx'
+
+    assert len(Report_df) == 1
+    assert Report_df.iloc[0]['Source'] == 'February.xlsx'
+    assert Report_df.iloc[0]['Duplicate_of'] == 'March.xlsx'
+    assert Report_df.iloc[0]['Movements'] == 1
+
+
+
+def test_repeated_payments_within_a_statement ():
+
+    """
+    The same key listed twice by one statement is two movements, only the copies of another statement
+    are dropped.
+    """
+
+    Movements = [('2024-03-02', 'Cafe', -2.0, 980.0), ('2024-03-02', 'Cafe', -2.0, 980.0)]
+
+    Movements_df, _ = drop_duplicate_movements(merge_statements([statement('A.xlsx', Movements), statement('B.xlsx', Movements)]))
+    assert len(Movements_df) == 2
+
+    Movements_df, _ = drop_duplicate_movements(merge_statements([statement('A.xlsx', Movements[:1]), statement('B.xlsx', Movements)]))
+    assert len(Movements_df) == 2
+
+
+
+def test_compact_layout_drops_the_same_movements ():
+
+    """
+    Categorical columns give the same result as strings.
+    """
+
+    February = statement('February.xlsx', [('2024-03-02', 'Compra', -10.0, 960.0), ('2024-02-20', 'Compra', -30.0, 970.0)])
+    March = statement('March.xlsx', [('2024-03-15', 'Compra', -5.0, 955.0), ('2024-03-02', 'Compra', -10.0, 960.0)])
+
+    Movements_df, Report_df = drop_duplicate_movements(merge_statements([February, March]))
+    Compact_df, Compact_report_df = drop_duplicate_movements(merge_statements([compact_movements(February), compact_movements(March)]))
+
+    assert list(Compact_df['SALDO (€)']) == list(Movements_df['SALDO (€)'])
+    assert list(Compact_report_df['Movements']) == list(Report_df['Movements'])
@@ -0,0 +1,37 @@
+'''
+Tests of the memory-mapped history
+'''
+
+import pandas as pd
+
+from Categorizer import monthly_totals
+from History_Store import write_history, load_history
+
+
+
+########################################## Function definitions ##########################################
+
+def test_range_covers_whole_months (tmp_path):
+
+    """
+    A range starting and ending within a month reads the movements and totals of the months it touches
+    whole, as the store does.
+    """
+
+    Movements_df = pd.DataFrame({
+        'F. VALOR': pd.to_datetime(['2024-04-10', '2024-03-25', '2024-03-05', '2024-02-20', '2024-02-02']),
+        'DESCRIPCIÓN': 'Compra',
+        'Category': ['Recreational', 'Recreational', 'Recreational', 'Recreational', 'Income'],
+        'Subcategory': ['Bazar', 'Bazar', 'Bazar', 'Bazar', 'Salary'],
+        'IMPORTE (€)': [-5.0, -20.0, -30.0, -40.0, 970.0],
+        'SALDO (€)': [875.0, 880.0, 900.0, 930.0, 970.0],
+    })
+    Movements_df['Month'] = Movements_df['F. VALOR'].dt.to_period('M')
+
+    write_history(Movements_df, monthly_totals(Movements_df), str(tmp_path / 'History'))
+
+    Range_df, Monthly_df = load_history(str(tmp_path / 'History'), '2024-02-15', '2024-03-10')
+
+    assert len(Range_df) == 4
+    assert list(Monthly_df.index) == [pd.Period('2024-02', 'M'), pd.Period('2024-03', 'M')]
+    assert list(Monthly_df[("Recreational", "Bazar")]) == [-40.0, -50.0]
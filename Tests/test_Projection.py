@@ -0,0 +1,53 @@
+'''
+Tests of the Monte Carlo budget projection
+'''
+
+import pandas as pd
+
+from Categorizer import Output_columns
+from Projection import project_budget
+
+
+
+########################################## Function definitions ##########################################
+
+def output_dic (Salaries, Bazar):
+
+    """
+    This function builds a tracked output with a salary and a single expense per month.
+
+    Parameters
+    ----------
+    Salaries, Bazar : list float
+        One value per month, oldest first
+
+    Returns
+    -------
+    dict
+    """
+
+    Output_dic = {column: [0.0] * len(Salaries) for column in Output_columns}
+    Output_dic[("Month", "/")] = list(pd.date_range('2024-01-01', periods=len(Salaries), freq='MS'))
+    Output_dic[("Income", "Salary")] = Salaries
+    Output_dic[("Recreational", "Bazar")] = Bazar
+
+    return Output_dic
+
+
+
+def test_edge_months_left_out ():
+
+    """
+    The first and last months only hold part of their spending and aren't drawn, the last curve being the
+    balance.
+    """
+
+    Projection_df = project_budget(output_dic([100.0, 1000.0, 1000.0, 0.0], [0.0, -300.0, -300.0, -5000.0]),
+                                   Horizon=3, Paths=1000, Seed=0)
+
+    assert Projection_df.columns.get_level_values(0)[-1] == 'Balance'
+    assert list(Projection_df.index.astype(str)) == ['2024-05', '2024-06', '2024-07']
+
+    # Every drawn month leaves 700 €, every path is the same
+    assert abs(Projection_df[("Balance", "P50")].iloc[-1] - 2100.0) < 1.0
+    assert Projection_df[("Balance", "Above objective")].iloc[-1] == 1.0
@@ -0,0 +1,93 @@
+'''
+Tests of the spending over arbitrary windows
+'''
+
+import pandas as pd
+
+from Spending_Windows import spending_windows
+
+
+
+########################################## Function definitions ##########################################
+
+def categorized_movements (Movements):
+
+    """
+    This function builds a few categorized movements.
+
+    Parameters
+    ----------
+    Movements : list tuples
+        (date, category, subcategory, amount), newest first
+
+    Returns
+    -------
+    dataframe
+    """
+
+    Movements_df = pd.DataFrame(Movements, columns=['F. VALOR', 'Category', 'Subcategory', 'IMPORTE (€)'])
+    Movements_df['F. VALOR'] = pd.to_datetime(Movements_df['F. VALOR'])
+
+    return Movements_df
+
+
+
+def test_pay_periods_between_salaries ():
+
+    """
+    A pay period runs from a salary to the day before the next one, the last one until the last movement.
+    """
+
+    Movements_df = categorized_movements([
+        ('2024-03-05', 'Recreational', 'Bazar', -20.0),
+        ('2024-02-28', 'Income', 'Salary', 1000.0),
+        ('2024-02-10', 'Recreational', 'Bazar', -30.0),
+        ('2024-01-31', 'Income', 'Salary', 1000.0),
+        ('2024-01-20', 'Recreational', 'Bazar', -50.0),
+    ])
+
+    Windows_df = spending_windows(Movements_df, 'pay-period')
+
+    assert list(Windows_df.index.get_level_values('Start')) == [pd.Timestamp('2024-01-31'), pd.Timestamp('2024-02-28')]
+    assert list(Windows_df.index.get_level_values('End')) == [pd.Timestamp('2024-02-27'), pd.Timestamp('2024-03-05')]
+    assert list(Windows_df[("Balance", "/")]) == [970.0, 980.0]
+
+
+
+def test_pay_period_without_salary (capsys):
+
+    """
+    A history without any salary is a single pay period, and the user is told why.
+    """
+
+    Movements_df = categorized_movements([
+        ('2024-02-10', 'Recreational', 'Bazar', -30.0),
+        ('2024-01-20', 'Unaccounted', 'Unknown', -50.0),
+    ])
+
+    Windows_df = spending_windows(Movements_df, 'pay-period')
+
+    assert len(Windows_df) == 1
+    assert Windows_df.index[0] == (pd.Timestamp('2024-01-20'), pd.Timestamp('2024-02-10'))
+    assert Windows_df[("Balance", "/")].iloc[0] == -80.0
+    assert 'No salary' in capsys.readouterr().out
+
+
+
+def test_weekly_windows_add_up_to_the_history ():
+
+    """
+    Calendar weeks cover every movement once.
+    """
+
+    Movements_df = categorized_movements([
+        ('2024-01-15', 'Recreational', 'Bazar', -5.0),
+        ('2024-01-14', 'Recreational', 'Bazar', -7.0),
+        ('2024-01-08', 'Recreational', 'Bazar', -11.0),
+        ('2024-01-02', 'Income', 'Salary', 100.0),
+    ])
+
+    Windows_df = spending_windows(Movements_df, 'weekly')
+
+    assert len(Windows_df) == 3
+    assert list(Windows_df[("Balance", "/")]) == [100.0, -18.0, -5.0]
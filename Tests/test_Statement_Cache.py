@@ -0,0 +1,61 @@
+'''
+Tests of the parsed statement cache
+'''
+
+import os
+
+import pandas as pd
+import pytest
+
+from Statement_Cache import cached_read, cache_available, Cache_folder_name
+
+
+
+########################################## Function definitions ##########################################
+
+def parse_lines (Statement_path):
+
+    """
+    This function stands for a statement parser: one movement per line of the file.
+
+    Parameters
+    ----------
+    Statement_path : str
+
+    Returns
+    -------
+    dataframe
+    """
+
+    with open(Statement_path, encoding='utf-8') as file:
+        return pd.DataFrame({'DESCRIPCIÓN': file.read().split()})
+
+
+
+@pytest.mark.skipif(not cache_available(), reason='the cache needs pyarrow')
+def test_shared_entry_kept_while_in_use (tmp_path):
+
+    """
+    Two statements with the same content share a cache entry. Editing one of them must not remove the entry
+    the other one still reads.
+    """
+
+    January, Copy = tmp_path / 'January.csv', tmp_path / 'Copy.csv'
+    January.write_text('Compra\nNomina\n', encoding='utf-8')
+    Copy.write_text('Compra\nNomina\n', encoding='utf-8')
+
+    cached_read(str(January), parse_lines)
+    cached_read(str(Copy), parse_lines)
+
+    Entries = [name for name in os.listdir(tmp_path / Cache_folder_name) if name.endswith('.parquet')]
+    assert len(Entries) == 1
+
+    # Copy still points at the shared entry
+    January.write_text('Compra\nNomina\nCafe\n', encoding='utf-8')
+    cached_read(str(January), parse_lines)
+    assert os.path.exists(tmp_path / Cache_folder_name / Entries[0])
+
+    # Once no statement points at it, the entry is removed
+    Copy.write_text('Bazar\n', encoding='utf-8')
+    cached_read(str(Copy), parse_lines)
+    assert not os.path.exists(tmp_path / Cache_folder_name / Entries[0])
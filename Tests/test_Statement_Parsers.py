@@ -0,0 +1,104 @@
+'''
+Tests of the parsers of bank exports
+'''
+
+import pandas as pd
+
+from Statement_Parsers import parse_csv, to_dates
+
+
+
+########################################## Function definitions ##########################################
+
+def write_statement (Folder, Lines, Name='Statement.csv'):
+
+    """
+    This function writes the lines of a CSV export into a file.
+
+    Parameters
+    ----------
+    Folder : pathlib.Path
+    Lines : list str
+    Name : str
+
+    Returns
+    -------
+    str
+    """
+
+    Statement_path = Folder / Name
+    Statement_path.write_text('\n'.join(Lines) + '\n', encoding='utf-8')
+
+    return str(Statement_path)
+
+
+
+def test_footer_row_with_year_first_dates (tmp_path):
+
+    """
+    A total below the movements doesn't keep the format of the dates from being found, and dates written
+    year first aren't read day first.
+    """
+
+    Statement_path = write_statement(tmp_path, [
+        'Date,Description,Amount,Balance',
+        '2024-03-02,Coffee,-2.50,985.00',
+        '2024-03-01,Salary,"1,000.00",987.50',
+        'Total,,997.50,',
+    ])
+
+    Movements_df = parse_csv(Statement_path)
+
+    assert list(Movements_df['F. VALOR']) == [pd.Timestamp('2024-03-02'), pd.Timestamp('2024-03-01')]
+    assert list(Movements_df['IMPORTE (€)']) == [-2.5, 1000.0]
+
+
+
+def test_row_longer_than_the_sampled_ones (tmp_path):
+
+    """
+    A row with more fields than those of the first lines is read along with the others.
+    """
+
+    Lines = ['Date,Description,Amount,Balance']
+    Lines += [f'2024-03-{day:02d},Shop,-1.00,{100 + day:.2f}' for day in range(30, 0, -1)]
+    Lines += ['2024-02-28,Shop,-1.00,100.00,,note']
+
+    Movements_df = parse_csv(write_statement(tmp_path, Lines))
+
+    assert len(Movements_df) == 31
+    assert Movements_df['F. VALOR'].iloc[-1] == pd.Timestamp('2024-02-28')
+    assert Movements_df['SALDO (€)'].iloc[-1] == 100.0
+
+
+
+def test_decimal_comma_with_thousands_separator (tmp_path):
+
+    """
+    Spanish exports write amounts as "1.000,00", separated by semicolons.
+    """
+
+    Statement_path = write_statement(tmp_path, [
+        'Fecha;Concepto;Importe',
+        '02/03/2024;Cafe;-2,50',
+        '01/03/2024;Nomina;1.000,00',
+        'Total;;997,50',
+    ])
+
+    Movements_df = parse_csv(Statement_path)
+
+    assert list(Movements_df['F. VALOR']) == [pd.Timestamp('2024-03-02'), pd.Timestamp('2024-03-01')]
+    assert list(Movements_df['IMPORTE (€)']) == [-2.5, 1000.0]
+
+
+
+def test_dates_of_unknown_format ():
+
+    """
+    Only dates written day first are read day first, and values that aren't dates are left missing.
+    """
+
+    Dates = to_dates(pd.Series(['2024-03-01', '02/03/2024', 'Total', None]))
+
+    assert list(Dates[:2]) == [pd.Timestamp('2024-03-01'), pd.Timestamp('2024-03-02')]
+    assert Dates[2:].isna().all()
@@ -0,0 +1,104 @@
+'''
+Tests of the incremental update of the tracked output
+'''
+
+import os
+import shutil
+
+import pandas as pd
+
+from Finance_Tracker import main
+from Tracked_Output import load_tracked_output, first_open_month, select_open_movements
+
+
+
+############################################### Variables ###############################################
+
+Rules_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Rules')
+
+
+########################################## Function definitions ##########################################
+
+def write_statement (Folder, Name, Lines):
+
+    """
+    This function writes a CSV export into the statement folder of a tracker folder.
+
+    Parameters
+    ----------
+    Folder : pathlib.Path
+        Tracker folder
+    Name : str
+    Lines : list str
+        Movements as "date,description,amount,balance", newest first
+    """
+
+    (Folder / 'Bank_Monthly_Movements' / Name).write_text('\n'.join(['Date,Description,Amount,Balance'] + Lines) + '\n',
+                                                          encoding='utf-8')
+
+
+
+def track (Folder, *Options):
+
+    """
+    This function runs the tracker on a folder without drawing anything, and reads its output back.
+
+    Parameters
+    ----------
+    Folder : pathlib.Path
+        Tracker folder
+    Options : str
+        Other command line options
+
+    Returns
+    -------
+    dataframe
+        Tracked output, see load_tracked_output()
+    """
+
+    main(['--folder', str(Folder), '--headless', '--no-print', '--excel', '--no-cache', '--no-reconcile', *Options])
+
+    return load_tracked_output(str(Folder / 'Output' / 'Tracked_expenses.xlsx'))
+
+
+
+def test_select_open_movements ():
+
+    """
+    Only the movements from the first open month onwards are computed again.
+    """
+
+    Movements_df = pd.DataFrame({'F. VALOR': pd.to_datetime(['2024-03-02', '2024-03-01', '2024-02-28', '2024-01-10'])})
+
+    assert len(select_open_movements(Movements_df, pd.Period('2024-03', 'M'))) == 2
+    assert len(select_open_movements(Movements_df, None)) == 4
+    assert first_open_month(None) is None
+
+
+
+def test_incremental_update_matches_a_full_run (tmp_path):
+
+    """
+    Updating the output with a new statement gives the output of a run over every statement, while the
+    closed months are kept as they were tracked.
+    """
+
+    for name in ('Bank_Monthly_Movements', 'Output'):
+        (tmp_path / name).mkdir()
+    shutil.copytree(Rules_folder, tmp_path / 'Rules')
+
+    write_statement(tmp_path, 'February.csv', ['2024-02-20,Compra,-30.00,940.00', '2024-02-10,Compra,-30.00,970.00',
+                                               '2024-02-01,Nomina,1000.00,1000.00'])
+    write_statement(tmp_path, 'March.csv', ['2024-03-05,Compra,-20.00,920.00'])
+    Tracked_df = track(tmp_path)
+    assert list(Tracked_df.index.astype(str)) == ['2024-02', '2024-03']
+
+    # The rest of March and April arrive, March was still open
+    write_statement(tmp_path, 'April.csv', ['2024-04-02,Compra,-5.00,880.00', '2024-03-25,Compra,-35.00,885.00'])
+    Incremental_df = track(tmp_path, '--incremental')
+
+    Full_df = track(tmp_path)
+
+    assert list(Incremental_df.index.astype(str)) == ['2024-02', '2024-03', '2024-04']
+    pd.testing.assert_frame_equal(Incremental_df, Full_df)
+    pd.testing.assert_frame_equal(Incremental_df.loc[:'2024-02'], Tracked_df.loc[:'2024-02'])
@@ -0,0 +1,63 @@
+'''
+Tests of the SQLite transaction store
+'''
+
+import pandas as pd
+
+from Categorizer import monthly_totals
+from Transaction_Store import open_store, store_movements, load_movements, store_monthly_totals
+
+
+
+########################################## Function definitions ##########################################
+
+def categorized_movements (Movements):
+
+    """
+    This function builds a few categorized movements.
+
+    Parameters
+    ----------
+    Movements : list tuples
+        (date, category, subcategory, amount, balance), newest first
+
+    Returns
+    -------
+    dataframe
+    """
+
+    Movements_df = pd.DataFrame(Movements, columns=['F. VALOR', 'Category', 'Subcategory', 'IMPORTE (€)', 'SALDO (€)'])
+    Movements_df['F. VALOR'] = pd.to_datetime(Movements_df['F. VALOR'])
+    Movements_df['DESCRIPCIÓN'] = 'Compra'
+    Movements_df['Month'] = Movements_df['F. VALOR'].dt.to_period('M')
+
+    return Movements_df
+
+
+
+def test_range_covers_whole_months (tmp_path):
+
+    """
+    A range starting and ending within a month reads the months it touches whole, as the history does.
+    """
+
+    Movements_df = categorized_movements([
+        ('2024-04-10', 'Recreational', 'Bazar', -5.0, 875.0),
+        ('2024-03-25', 'Recreational', 'Bazar', -20.0, 880.0),
+        ('2024-03-05', 'Recreational', 'Bazar', -30.0, 900.0),
+        ('2024-02-20', 'Recreational', 'Bazar', -40.0, 930.0),
+        ('2024-02-02', 'Income', 'Salary', 970.0, 970.0),
+    ])
+
+    Store = open_store(str(tmp_path / 'Movements.sqlite'))
+    store_movements(Store, Movements_df)
+
+    assert len(load_movements(Store, '2024-02-15', '2024-03-10')) == 4
+
+    Monthly_df = store_monthly_totals(Store, '2024-02-15', '2024-03-10')
+    Store.close()
+
+    Expected_df = monthly_totals(Movements_df.iloc[1:])
+    assert list(Monthly_df.index) == list(Expected_df.index)
+    assert list(Monthly_df[("Recreational", "Bazar")]) == [-40.0, -50.0]
+    assert list(Monthly_df[("Balance", "/")]) == list(Expected_df[("Balance", "/")])
@@ -0,0 +1,86 @@
+'''
+Tests of the updates of watch mode
+'''
+
+import os
+
+import pandas as pd
+
+from Categorizer import load_rules
+from Watcher import update_state, write_outputs
+
+
+
+############################################### Variables ###############################################
+
+Rules_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Rules')
+
+
+########################################## Function definitions ##########################################
+
+def write_statement (Folder, Name, Lines):
+
+    """
+    This function writes a CSV export into a folder.
+
+    Parameters
+    ----------
+    Folder : pathlib.Path
+    Name : str
+    Lines : list str
+        Movements as "date,description,amount,balance", newest first
+
+    Returns
+    -------
+    str
+    """
+
+    Statement_path = Folder / Name
+    Statement_path.write_text('\n'.join(['Date,Description,Amount,Balance'] + Lines) + '\n', encoding='utf-8')
+
+    return str(Statement_path)
+
+
+
+def test_outputs_removed_with_every_statement (tmp_path):
+
+    """
+    Removing the last statement removes the outputs written out of it.
+    """
+
+    Rule_table = load_rules(os.path.join(Rules_folder, 'Movement_Rules.csv'))
+    State = {'Statements': {}, 'Movements': None, 'Monthly': None}
+
+    Statement_path = write_statement(tmp_path, 'March.csv', ['2024-03-02,Coffee,-2.50,997.50', '2024-03-01,Shop,-10.00,1000.00'])
+
+    update_state(State, [Statement_path], Rule_table, Use_cache=False)
+    write_outputs(State, str(tmp_path), Excel=False, Export_formats=['csv'])
+    assert os.path.exists(tmp_path / 'Tracked_expenses.csv')
+
+    os.remove(Statement_path)
+    update_state(State, [Statement_path], Rule_table, Use_cache=False)
+    write_outputs(State, str(tmp_path), Excel=False, Export_formats=['csv'])
+    assert not os.path.exists(tmp_path / 'Tracked_expenses.csv')
+
+
+
+def test_compact_state_keeps_categoricals (tmp_path):
+
+    """
+    With the compact layout, the text columns stay categoricals as statements are added.
+    """
+
+    Rule_table = load_rules(os.path.join(Rules_folder, 'Movement_Rules.csv'))
+    State = {'Statements': {}, 'Movements': None, 'Monthly': None}
+
+    March = write_statement(tmp_path, 'March.csv', ['2024-03-02,Coffee,-2.50,997.50', '2024-03-01,Shop,-10.00,1000.00'])
+    April = write_statement(tmp_path, 'April.csv', ['2024-04-02,Coffee,-2.50,985.00', '2024-04-01,Shop,-10.00,987.50'])
+
+    update_state(State, [March], Rule_table, Use_cache=False, Compact=True)
+    update_state(State, [April], Rule_table, Use_cache=False, Compact=True)
+
+    Movements_df = State['Movements']
+    assert len(Movements_df) == 4
+    assert isinstance(Movements_df['Source'].dtype, pd.CategoricalDtype)
+    assert isinstance(Movements_df['DESCRIPCIÓN'].dtype, pd.CategoricalDtype)
+    assert list(Movements_df['Source']) == ['April.csv', 'April.csv', 'March.csv', 'March.csv']
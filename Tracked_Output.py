@@ -0,0 +1,127 @@
+'''
+Reading and updating of the tracked output "Output/Tracked_expenses.xlsx"
+
+In incremental mode the months that are already tracked and closed are kept as they are, only movements
+from the newest tracked month onwards are categorized again and merged back into the output.
+'''
+
+import os
+import pandas as pd
+
+from Categorizer import Output_columns
+
+
+
+########################################## Function definitions ##########################################
+
+def load_tracked_output (Tracked_expenses_path):
+
+    """
+    This function reads the tracked output back into the monthly totals structure returned by
+    Categorizer.monthly_totals().
+
+    Parameters
+    ----------
+    Tracked_expenses_path : str
+        Path to "Tracked_expenses.xlsx"
+
+    Returns
+    -------
+    dataframe
+        One row per tracked month, indexed by month period. None if there is no output yet
+    """
+
+    if not os.path.exists(Tracked_expenses_path):
+        return None
+
+    Tracked_df = pd.read_excel(Tracked_expenses_path, header=[0, 1], index_col=0)
+
+    # Outputs written by older versions may miss some columns, they are worth 0
+    Tracked_df = Tracked_df.reindex(columns=pd.MultiIndex.from_tuples(Output_columns), fill_value=0.0)
+    Tracked_df[("Month", "/")] = pd.to_datetime(Tracked_df[("Month", "/")])
+    Tracked_df.index = pd.PeriodIndex(Tracked_df[("Month", "/")].dt.to_period('M'), name='Month')
+
+    return Tracked_df.sort_index()
+
+
+
+def first_open_month (Tracked_df):
+
+    """
+    This function finds the first month that still has to be computed. The newest tracked month may have
+    been exported before it ended, so it is considered open; every month before it is closed.
+
+    Parameters
+    ----------
+    Tracked_df : dataframe
+        Tracked output as returned by load_tracked_output()
+
+    Returns
+    -------
+    Period
+        First open month, None if nothing is tracked yet
+    """
+
+    if Tracked_df is None or Tracked_df.empty:
+        return None
+
+    return Tracked_df.index.max()
+
+
+
+def select_open_movements (Movements_df, Open_month):
+
+    """
+    This function keeps only the movements that belong to an open month.
+
+    Parameters
+    ----------
+    Movements_df : dataframe
+        Bank movements, newest first
+    Open_month : Period
+        First open month, None to keep every movement
+
+    Returns
+    -------
+    dataframe
+        Movements from Open_month onwards, newest first
+    """
+
+    if Open_month is None:
+        return Movements_df
+
+    # Movements are sorted newest first, so the open ones are a leading block of rows
+    Open_rows = int((pd.to_datetime(Movements_df['F. VALOR']) >= Open_month.start_time).sum())
+
+    return Movements_df.iloc[:Open_rows]
+
+
+
+def merge_tracked_output (Tracked_df, Monthly_df):
+
+    """
+    This function merges the freshly computed months into the tracked output. Recomputed months replace
+    the tracked ones, closed months are kept untouched.
+
+    Parameters
+    ----------
+    Tracked_df : dataframe
+        Tracked output as returned by load_tracked_output(), may be None
+    Monthly_df : dataframe
+        Monthly totals computed from the open movements
+
+    Returns
+    -------
+    dataframe
+        One row per month, oldest first
+    """
+
+    if Tracked_df is None or Tracked_df.empty:
+        return Monthly_df
+
+    if Monthly_df.empty:
+        return Tracked_df
+
+    Closed_df = Tracked_df[Tracked_df.index < Monthly_df.index.min()]
+
+    return pd.concat([Closed_df, Monthly_df]).sort_index()
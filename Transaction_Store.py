@@ -0,0 +1,287 @@
+'''
+SQLite transaction store
+
+An optional persistent backend: categorized movements are kept in a local SQLite database, indexed by value
+date, subcategory and description, so that reports over any date range only read the rows in that range and
+the tracked output can be rebuilt without parsing the Excel statements again. Monthly totals are computed
+by aggregate queries inside the database.
+
+Amounts and balances are stored as integer cents, sums in SQL are therefore exact. Rows are numbered in
+chronological order (oldest movement first), the row number is the primary key of the table.
+'''
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from Money import to_cents, from_cents, is_exact
+from Categorizer import tally_monthly_totals, month_range
+
+
+
+############################################### Variables ###############################################
+
+Schema = '''
+CREATE TABLE IF NOT EXISTS movements (
+    position        INTEGER PRIMARY KEY,
+    value_date      TEXT NOT NULL,
+    month           TEXT NOT NULL,
+    ing_category    TEXT,
+    ing_subcategory TEXT,
+    description     TEXT,
+    comment         TEXT,
+    amount          INTEGER NOT NULL,
+    balance         INTEGER NOT NULL,
+    source          TEXT,
+    category        TEXT,
+    subcategory     TEXT
+);
+CREATE INDEX IF NOT EXISTS movements_value_date ON movements (value_date);
+CREATE INDEX IF NOT EXISTS movements_ing_subcategory ON movements (ing_subcategory);
+CREATE INDEX IF NOT EXISTS movements_description ON movements (description);
+'''
+
+# Statement columns and the store columns they are kept in
+Stored_columns = {
+    'CATEGORÍA': 'ing_category',
+    'SUBCATEGORÍA': 'ing_subcategory',
+    'DESCRIPCIÓN': 'description',
+    'COMENTARIO': 'comment',
+    'Source': 'source',
+    'Category': 'category',
+    'Subcategory': 'subcategory',
+}
+
+
+########################################## Function definitions ##########################################
+
+def open_store (Store_path):
+
+    """
+    This function opens the store, creating the database and its indexes if they don't exist yet.
+
+    Parameters
+    ----------
+    Store_path : str
+        Path to the .sqlite database
+
+    Returns
+    -------
+    Connection
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(Store_path)), exist_ok=True)
+
+    Connection = sqlite3.connect(Store_path)
+    Connection.executescript(Schema)
+
+    return Connection
+
+
+
+def text_values (Column):
+
+    """
+    This function converts a column into a list of python strings, empty values become NULL.
+
+    Parameters
+    ----------
+    Column : series
+
+    Returns
+    -------
+    list
+    """
+
+    Values = Column.to_numpy(dtype=object, copy=True)
+    Values[pd.isna(Values)] = None
+
+    return Values.tolist()
+
+
+
+def store_movements (Connection, Movements_df):
+
+    """
+    This function writes categorized movements into the store. Every stored movement from the oldest date
+    of Movements_df onwards is replaced, so the whole history can be stored again after an edit of the
+    rules, and the open months of an incremental run replace their older copy.
+
+    Parameters
+    ----------
+    Connection : Connection
+        Store returned by open_store()
+    Movements_df : dataframe
+        Bank movements tagged by Categorizer.categorize_movements(), newest first. Amounts may be floats or
+        integer cents (exact mode)
+
+    Returns
+    -------
+    int
+        Number of movements stored
+    """
+
+    if Movements_df.empty:
+        return 0
+
+    # Oldest movement first, so that row numbers follow time
+    Movements_df = Movements_df.iloc[::-1]
+
+    Dates = pd.to_datetime(Movements_df['F. VALOR']).to_numpy().astype('datetime64[D]')
+    Value_dates = Dates.astype(str)
+    Months = Dates.astype('datetime64[M]').astype(str)
+
+    if (is_exact(Movements_df)):
+        Amounts = Movements_df['IMPORTE (€)'].to_numpy(dtype=np.int64)
+        Balances = Movements_df['SALDO (€)'].to_numpy(dtype=np.int64)
+    else:
+        Amounts = to_cents(Movements_df['IMPORTE (€)'].to_numpy())
+        Balances = to_cents(Movements_df['SALDO (€)'].to_numpy())
+
+    Texts = [text_values(Movements_df[column]) if column in Movements_df.columns else [None] * len(Movements_df)
+             for column in Stored_columns]
+
+    Rows = zip(Value_dates.tolist(), Months.tolist(), *Texts, Amounts.tolist(), Balances.tolist())
+
+    # A single transaction, either every movement is replaced or none
+    with Connection:
+        Connection.execute('DELETE FROM movements WHERE value_date >= ?', (Value_dates[0],))
+        Connection.executemany(
+            f'INSERT INTO movements (value_date, month, {", ".join(Stored_columns.values())}, amount, balance) '
+            f'VALUES (?, ?, {", ".join("?" * len(Stored_columns))}, ?, ?)', Rows)
+
+    return len(Movements_df)
+
+
+
+def date_range_filter (Start=None, End=None):
+
+    """
+    This function builds the WHERE clause that restricts a query to the whole months a range of value
+    dates touches, which the value date index resolves without scanning the table.
+
+    Parameters
+    ----------
+    Start, End : str
+        First and last value dates, 'YYYY-MM-DD', see Categorizer.month_range(). None leaves that side open
+
+    Returns
+    -------
+    str
+        Clause, empty if the range is open
+    tuple
+        Parameters of the clause
+    """
+
+    Conditions = []
+    Parameters = []
+
+    First_day, Last_day = month_range(Start, End)
+
+    if First_day is not None:
+        Conditions.append('value_date >= ?')
+        Parameters.append(str(First_day.date()))
+
+    if Last_day is not None:
+        Conditions.append('value_date <= ?')
+        Parameters.append(str(Last_day.date()))
+
+    Clause = ('WHERE ' + ' AND '.join(Conditions)) if Conditions else ''
+
+    return Clause, tuple(Parameters)
+
+
+
+def load_movements (Connection, Start=None, End=None, Exact=False):
+
+    """
+    This function reads the stored movements of a date range back into a categorized dataframe.
+
+    Parameters
+    ----------
+    Connection : Connection
+        Store returned by open_store()
+    Start, End : str
+        First and last value dates, 'YYYY-MM-DD'. Every month they touch is read whole, None leaves that
+        side open
+    Exact : Bool
+        Return amounts and balances as integer cents instead of euros
+
+    Returns
+    -------
+    dataframe
+        Movements in the layout of Categorizer.categorize_movements(), newest first
+    """
+
+    Clause, Parameters = date_range_filter(Start, End)
+
+    Stored_df = pd.read_sql_query(
+        f'SELECT value_date, {", ".join(Stored_columns.values())}, amount, balance FROM movements '
+        f'{Clause} ORDER BY position DESC', Connection, params=Parameters)
+
+    Movements_df = pd.DataFrame({'F. VALOR': pd.to_datetime(Stored_df['value_date'])})
+    for column, stored_column in Stored_columns.items():
+        Movements_df[column] = Stored_df[stored_column]
+
+    for column, stored_column in (('IMPORTE (€)', 'amount'), ('SALDO (€)', 'balance')):
+        Movements_df[column] = Stored_df[stored_column] if Exact else from_cents(Stored_df[stored_column])
+
+    Movements_df['Category'] = Movements_df['Category'].astype('category')
+    Movements_df['Subcategory'] = Movements_df['Subcategory'].astype('category')
+    Movements_df['Month'] = Movements_df['F. VALOR'].dt.to_period('M')
+
+    return Movements_df
+
+
+
+def store_monthly_totals (Connection, Start=None, End=None):
+
+    """
+    This function computes the tracked values for each month with aggregate queries over the store, the
+    SQL counterpart of Categorizer.monthly_totals(). When a range is given, every month it touches is
+    totalled whole, like the monthly totals of the history.
+
+    Parameters
+    ----------
+    Connection : Connection
+        Store returned by open_store()
+    Start, End : str
+        First and last value dates, 'YYYY-MM-DD'. None leaves that side open
+
+    Returns
+    -------
+    dataframe
+        One row per month (oldest first) and one column for each of the 'Output_columns', in euros
+    """
+
+    Clause, Parameters = date_range_filter(Start, End)
+
+    # Sum of every (Category, Subcategory) pair of every month
+    Sums_df = pd.read_sql_query(
+        f'SELECT month, category, subcategory, SUM(amount) AS amount FROM movements {Clause} '
+        f'{"AND" if Clause else "WHERE"} category IS NOT NULL GROUP BY month, category, subcategory',
+        Connection, params=Parameters)
+
+    # Rows are numbered in time order, the newest movement of each month closes it
+    Bounds_df = pd.read_sql_query(
+        f'''WITH bounds AS (
+                SELECT month, MIN(position) AS oldest, MAX(position) AS newest
+                FROM movements {Clause} GROUP BY month)
+            SELECT bounds.month, last.value_date AS last_day, last.balance - first.balance AS balance
+            FROM bounds
+            JOIN movements AS last ON last.position = bounds.newest
+            JOIN movements AS first ON first.position = bounds.oldest''',
+        Connection, params=Parameters)
+
+    Months = pd.PeriodIndex(Bounds_df['month'], freq='M', name='Month')
+    Balance = pd.Series(Bounds_df['balance'].to_numpy(), index=Months)
+    Last_day_month = pd.Series(pd.to_datetime(Bounds_df['last_day']).to_numpy(), index=Months)
+
+    Sums_df = (Sums_df
+               .assign(month=pd.PeriodIndex(Sums_df['month'], freq='M'))
+               .set_index(['month', 'category', 'subcategory'])['amount']
+               .unstack(['category', 'subcategory'], fill_value=0))
+
+    return tally_monthly_totals(Sums_df, Balance, Last_day_month, Exact=True)
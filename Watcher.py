@@ -0,0 +1,410 @@
+'''
+Watch mode
+
+Instead of starting a new process for every update, the tracker can keep running and watch the statement
+folder. The parsed and categorized statements and the monthly totals stay in memory: when an export is
+added, replaced or removed only that file is parsed, only the months it spans are merged, deduplicated,
+reconciled and aggregated again, and only their outputs are written again.
+
+The folder is watched with inotify on Linux, called straight from libc so that no extra package is needed,
+and polled every second anywhere else. Either way, a change is confirmed by comparing the modification time
+and size of every statement, so missed or repeated events don't matter.
+'''
+
+import os
+import sys
+import time
+import ctypes
+import select
+
+import numpy as np
+import pandas as pd
+
+from Statement_Reader import read_statement, find_statements, merge_statements, compact_movements, Default_max_cache_bytes
+from Deduplication import drop_duplicate_movements, print_overlap_report
+from Reconciliation import reconcile_months, print_reconciliation_report
+from Money import amounts_to_cents
+from Categorizer import categorize_movements, monthly_totals, build_output_dic
+from Exports import export_output, Export_formats as Output_extensions
+from Plots import render_charts, use_agg_backend
+
+
+
+############################################### Variables ###############################################
+
+# inotify events that may change a statement: written, moved in or out, deleted
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+Inotify_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+# Wait after an event before reading, a statement being copied raises several of them
+Debounce_seconds = 0.2
+
+# Time between two looks at the folder when polling
+Poll_seconds = 1.0
+
+
+########################################## Function definitions ##########################################
+
+def statement_snapshot (Folder_path):
+
+    """
+    This function records the modification time and size of every statement of a folder.
+
+    Parameters
+    ----------
+    Folder_path : str
+
+    Returns
+    -------
+    dict
+        {path: (mtime in ns, size)}
+    """
+
+    Snapshot = {}
+    for path in find_statements(Folder_path):
+        try:
+            Stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        Snapshot[path] = (Stat.st_mtime_ns, Stat.st_size)
+
+    return Snapshot
+
+
+
+def open_inotify (Folder_path):
+
+    """
+    This function starts watching a folder with inotify.
+
+    Parameters
+    ----------
+    Folder_path : str
+
+    Returns
+    -------
+    int
+        Non blocking inotify file descriptor, None if inotify isn't available
+    """
+
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        Descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+
+    if Descriptor < 0:
+        return None
+
+    if libc.inotify_add_watch(Descriptor, os.fsencode(os.path.abspath(Folder_path)), Inotify_mask) < 0:
+        os.close(Descriptor)
+        return None
+
+    return Descriptor
+
+
+
+def wait_for_changes (Folder_path, Snapshot, Inotify_descriptor=None):
+
+    """
+    This function blocks until the statements of a folder differ from a snapshot.
+
+    Parameters
+    ----------
+    Folder_path : str
+    Snapshot : dict
+        Snapshot returned by statement_snapshot()
+    Inotify_descriptor : int
+        Descriptor returned by open_inotify(), None to poll
+
+    Returns
+    -------
+    dict
+        New snapshot
+    list str
+        Statements added, modified or removed
+    """
+
+    while True:
+        if Inotify_descriptor is not None:
+            # Look at the folder anyway once in a while, in case events were lost
+            Ready, _, _ = select.select([Inotify_descriptor], [], [], 60)
+            if Ready:
+                time.sleep(Debounce_seconds)
+                try:
+                    while os.read(Inotify_descriptor, 65536):
+                        pass
+                except BlockingIOError:
+                    pass
+        else:
+            time.sleep(Poll_seconds)
+
+        New_snapshot = statement_snapshot(Folder_path)
+        Changed = sorted(path for path in set(Snapshot) | set(New_snapshot) if Snapshot.get(path) != New_snapshot.get(path))
+
+        if Changed:
+            return New_snapshot, Changed
+
+
+
+def load_statement (Statement_path, Rule_table, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Exact=False,
+                    Compact=False):
+
+    """
+    This function reads and categorizes a single statement.
+
+    Parameters
+    ----------
+    Statement_path : str
+    Rule_table : dict
+        Rules compiled by Categorizer.load_rules()
+    Use_cache, Max_cache_bytes :
+        See Statement_Reader.read_statement()
+    Exact : Bool
+        Work with integer cents
+    Compact : Bool
+        Keep text columns as categoricals, see Statement_Reader.compact_movements()
+
+    Returns
+    -------
+    dataframe
+        Categorized movements of the statement, newest first, with a 'Source' column
+    """
+
+    Statement_df = read_statement(Statement_path, Use_cache=Use_cache, Max_cache_bytes=Max_cache_bytes, Compact=Compact)
+    Source = os.path.basename(Statement_path)
+    Statement_df['Source'] = pd.Categorical.from_codes(np.zeros(len(Statement_df), dtype=np.int8), [Source]) if Compact else Source
+
+    if (Exact):
+        Statement_df = amounts_to_cents(Statement_df)
+
+    return categorize_movements(Statement_df, Rule_table)
+
+
+
+def update_state (State, Changed, Rule_table, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes, Exact=False,
+                  Compact=False, Reconcile=False):
+
+    """
+    This function brings the state up to date with the statements that changed: they are read again, and
+    only the months they span are merged, deduplicated, reconciled and aggregated again. Movements repeated
+    across statements share their value date, so deduplicating month by month drops the same movements as
+    deduplicating the whole history.
+
+    Parameters
+    ----------
+    State : dict
+        {'Statements': {path: categorized movements}, 'Movements': merged movements, 'Monthly': monthly totals},
+        updated in place. Start with empty dicts and None
+    Changed : list str
+        Statements added, modified or removed
+    Rule_table, Use_cache, Max_cache_bytes, Exact, Compact :
+        See load_statement()
+    Reconcile : Bool
+        Check the running balance of the affected months and report its breaks
+
+    Returns
+    -------
+    set Period
+        Months aggregated again
+    list str
+        Changed statements that couldn't be read, a copy may still be in progress
+    """
+
+    Affected = set()
+    Failed = []
+
+    for path in Changed:
+        Old_df = State['Statements'].pop(path, None)
+        if Old_df is not None:
+            Affected.update(Old_df['Month'].unique())
+
+        if not os.path.exists(path):
+            continue
+
+        try:
+            New_df = load_statement(path, Rule_table, Use_cache, Max_cache_bytes, Exact, Compact)
+        except Exception as error:
+            print(f'    Couldn\'t read {os.path.basename(path)} yet: {error}')
+            Failed.append(path)
+            continue
+
+        State['Statements'][path] = New_df
+        Affected.update(New_df['Month'].unique())
+
+    # Movements of the affected months, out of the statements spanning any of them. Statements keep the order
+    # of a full merge, newest one first
+    Affected_ordinals = np.sort([month.ordinal for month in Affected])
+    Statement_dfs = sorted((df for df in State['Statements'].values() if not df.empty),
+                           key=lambda df: df['F. VALOR'].max(), reverse=True)
+
+    Month_dfs = []
+    for df in Statement_dfs:
+        # Newest first, the statement spans an affected month if one falls between its last and first month
+        Ordinals = df['Month'].array.asi8
+        if Affected_ordinals.searchsorted(Ordinals[-1]) < Affected_ordinals.searchsorted(Ordinals[0], 'right'):
+            Month_dfs.append(df[np.isin(Ordinals, Affected_ordinals)])
+
+    if Month_dfs:
+        Month_movements_df = pd.concat(Month_dfs, ignore_index=True).sort_values('F. VALOR', ascending=False, kind='stable',
+                                                                                 ignore_index=True)
+    else:
+        Month_movements_df = merge_statements([])
+
+    # Statements have categoricals of their own, which the concatenation expands into strings
+    if (Compact and not Month_movements_df.empty):
+        Month_movements_df = compact_movements(Month_movements_df)
+
+    Month_movements_df, Overlap_report = drop_duplicate_movements(Month_movements_df)
+    print_overlap_report(Overlap_report)
+
+    # The other months are kept as they were, months are whole blocks of rows so no date is shared
+    Movements_df = State['Movements']
+    if Movements_df is not None and not Movements_df.empty:
+        Kept_df = Movements_df[~np.isin(Movements_df['Month'].array.asi8, Affected_ordinals)]
+        Movements_df = merge_statements([Kept_df, Month_movements_df])
+    else:
+        Movements_df = Month_movements_df
+
+    State['Movements'] = Movements_df
+
+    # Months are contiguous blocks of rows, only the affected ones are reconciled and aggregated
+    if (Movements_df.empty or not Affected):
+        Recomputed_df = None
+    else:
+        if (Reconcile):
+            print_reconciliation_report(reconcile_months(Movements_df, Affected))
+        Recomputed_df = monthly_totals(Movements_df[np.isin(Movements_df['Month'].array.asi8, Affected_ordinals)])
+
+    Monthly_df = State['Monthly']
+    if Monthly_df is not None:
+        Monthly_df = Monthly_df[~Monthly_df.index.isin(list(Affected))]
+
+    Parts = [df for df in (Monthly_df, Recomputed_df) if df is not None and not df.empty]
+    State['Monthly'] = pd.concat(Parts).sort_index() if Parts else Recomputed_df
+
+    return Affected, Failed
+
+
+
+def write_outputs (State, Output_path, Excel=True, Export_formats=(), Render=False, Chart_format='png', Months=None):
+
+    """
+    This function writes the outputs of the state: the tracked output in each requested format and the
+    charts of the given months. Once every statement is removed, the outputs are removed too.
+
+    Parameters
+    ----------
+    State : dict
+        State kept by update_state()
+    Output_path : str
+        "Output" folder
+    Excel : Bool
+        Write "Tracked_expenses.xlsx"
+    Export_formats : list str
+        Other formats, see Exports.py
+    Render : Bool
+        Render the charts into "Output/Charts"
+    Chart_format : str
+    Months : collection of Period
+        Months whose donut chart is rendered again, None for every month
+    """
+
+    # Outputs of the removed statements would be left behind
+    if State['Monthly'] is None:
+        Formats = (['xlsx'] if Excel else []) + list(Export_formats)
+        Paths = [os.path.join(Output_path, f'Tracked_expenses.{Output_extensions[Format]}') for Format in Formats]
+
+        Charts_path = os.path.join(Output_path, 'Charts')
+        if (Render and os.path.isdir(Charts_path)):
+            Paths += [entry.path for entry in os.scandir(Charts_path)
+                      if entry.name.startswith('Expenses_') and entry.name.endswith(f'.{Chart_format}')]
+
+        for path in Paths:
+            if os.path.exists(path):
+                os.remove(path)
+        return
+
+    Output_dic = build_output_dic(State['Monthly'])
+    Output_df = pd.DataFrame.from_dict(Output_dic)
+
+    if (Excel):
+        export_output(Output_df, Output_path, 'xlsx')
+
+    for Format in Export_formats:
+        export_output(Output_df, Output_path, Format)
+
+    if (Render and not Output_df.empty):
+        render_charts(Output_dic, os.path.join(Output_path, 'Charts'), Format=Chart_format, Months=Months)
+
+
+
+def watch_statements (Folder_path, Rule_table, Output_path, Use_cache=True, Max_cache_bytes=Default_max_cache_bytes,
+                      Exact=False, Compact=False, Reconcile=False, Excel=True, Export_formats=(), Render=False,
+                      Chart_format='png'):
+
+    """
+    This function tracks a statement folder until interrupted (Ctrl+C): every statement is read once, then
+    outputs are updated whenever a statement is added, replaced or removed.
+
+    Parameters
+    ----------
+    Folder_path : str
+        "Bank_Monthly_Movements" folder
+    Rule_table : dict
+        Rules compiled by Categorizer.load_rules()
+    Output_path : str
+        "Output" folder
+    Use_cache, Max_cache_bytes, Exact, Compact, Reconcile :
+        See update_state()
+    Excel, Export_formats, Render, Chart_format :
+        See write_outputs()
+    """
+
+    # Charts are only ever written to files
+    if (Render):
+        use_agg_backend()
+
+    Inotify_descriptor = open_inotify(Folder_path)
+    State = {'Statements': {}, 'Movements': None, 'Monthly': None}
+
+    # The first update reads every statement and writes every output
+    Snapshot = statement_snapshot(Folder_path)
+    Changed = sorted(Snapshot)
+    First_update = True
+
+    print(f'Watching {Folder_path} ({"inotify" if Inotify_descriptor is not None else "polling"}), Ctrl+C to stop')
+
+    try:
+        while True:
+            Start = time.perf_counter()
+
+            Affected, Failed = update_state(State, Changed, Rule_table, Use_cache, Max_cache_bytes, Exact, Compact, Reconcile)
+            write_outputs(State, Output_path, Excel, Export_formats, Render, Chart_format,
+                          Months=None if First_update else Affected)
+            First_update = False
+
+            # Statements that couldn't be read keep their modification time in the snapshot, so they are only
+            # read again once they change, when the copy in progress ends or the file is replaced
+            if Failed:
+                print(f'    {len(Failed)} statement(s) skipped until they change')
+
+            Months = sorted(Affected)
+            print(f'    {len(Changed)} statement(s) changed, {len(State["Movements"])} movements, '
+                  f'{len(Months)} month(s) updated' + (f' ({Months[0]} - {Months[-1]})' if Months else '')
+                  + f' in {time.perf_counter() - Start:.2f} s')
+
+            Snapshot, Changed = wait_for_changes(Folder_path, Snapshot, Inotify_descriptor)
+
+    except KeyboardInterrupt:
+        print('Stopped watching')
+
+    finally:
+        if Inotify_descriptor is not None:
+            os.close(Inotify_descriptor)